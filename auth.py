@@ -1,14 +1,17 @@
 import os
+import time
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 
 from models import User
+from hashing import pwd_context, hashing_pool, _hash, _verify
+from cache import principal_cache, token_cache
+from metrics import span
 
 # Load .env from the same directory as this file
 env_path = Path(__file__).parent / ".env"
@@ -18,7 +21,6 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 def verify_password(plain_password, hashed_password):
@@ -27,6 +29,16 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# Async variants for request handlers: bcrypt runs in the hashing pool so the
+# event loop keeps serving other requests while a login is being checked.
+async def verify_password_async(plain_password, hashed_password):
+    with span("password.verify"):
+        return await hashing_pool.run(_verify, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    with span("password.hash"):
+        return await hashing_pool.run(_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -37,22 +49,50 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
+def decode_access_token(token: str) -> dict:
+    """Decode and verify a JWT, memoizing the payload until the token expires.
+
+    Raises JWTError for invalid or expired tokens; failures are not cached.
+    """
+    payload = token_cache.get(token)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return payload
+        token_cache.invalidate(token)
+        raise JWTError("Signature has expired.")
+
+    with span("jwt.decode"):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+    ttl = payload["exp"] - time.time() if "exp" in payload else None
+    token_cache.set(token, payload, ttl=ttl)
+    return payload
+
+async def authenticate(token: str) -> Optional[User]:
+    """The user a bearer token belongs to, or None if the token is invalid or the user is gone."""
+    try:
+        email = decode_access_token(token).get("sub")
     except JWTError:
-        raise credentials_exception
-    
-    user = await User.find_one(User.email == email)
-    
+        return None
+    if email is None:
+        return None
+
+    # Cached principals are dropped by the User save/update hooks in models.py
+    user = principal_cache.get(email)
+    if user is not None:
+        return user
+
+    with span("auth.load_user"):
+        user = await User.find_one(User.email == email)
+    if user is not None:
+        principal_cache.set(email, user)
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    user = await authenticate(token)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
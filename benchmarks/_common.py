@@ -0,0 +1,82 @@
+"""Small helpers shared by the benchmark scripts."""
+import math
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List
+
+# Benchmarks drive the app from a single address at rates far above the
+# production limits; opt back in with RATE_LIMIT_ENABLED=true.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+# The scripted chat traffic repeats the same prompts, which the LLM reply
+# cache would answer without generating; benchmarks/llm_cache.py measures it.
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+# Tokens are minted and checked in-process, so any key will do without a .env
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(samples: Iterable[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    values = list(samples)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(max(values, default=0.0) * 1000, 3),
+    }
+
+
+def rss_mb() -> float:
+    # Current (not peak) resident set size; Linux only, 0 elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return 0.0
+
+
+def add_mongo_args(parser, default_db: str) -> None:
+    """--url/--db/--mock options shared by the scripts that need a database."""
+    parser.add_argument("--url", default=os.getenv("BENCH_DATABASE_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=default_db, help="throwaway database, dropped afterwards")
+    parser.add_argument("--mock", action="store_true", help="use mongomock-motor instead of a real mongod")
+
+
+def mongo_client(args, event_listeners=()):
+    if args.mock:
+        from mongomock_motor import AsyncMongoMockClient
+        return AsyncMongoMockClient()
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return AsyncIOMotorClient(args.url, serverSelectionTimeoutMS=5000, event_listeners=list(event_listeners))
+
+
+@asynccontextmanager
+async def running_app(client, db_name: str, drop: bool = True):
+    """Run main.app's lifespan against `client` and yield an in-process HTTP client.
+
+    Requests go straight into the ASGI app (no sockets), so numbers reflect
+    the application and the database, not the network stack.
+    """
+    import httpx
+
+    import database
+    from main import app, lifespan
+
+    database.use_client(client)
+    database.MONGO_DB_NAME = db_name
+    try:
+        async with lifespan(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+                yield http
+    finally:
+        if drop:
+            await client.drop_database(db_name)
@@ -0,0 +1,94 @@
+"""App start-up: /api/bootstrap versus the separate calls it replaces.
+
+After login the app needs the dashboard, college matches and the newest page
+of chat history. This times three ways of getting them:
+
+  sequential  /api/dashboard/family, /api/colleges/matches, /api/chat/history one after another
+  parallel    the same three requests issued concurrently
+  bootstrap   one GET /api/bootstrap
+
+Requests go straight into the ASGI app, so --rtt-ms adds a client-side delay
+per request to stand in for the network round trip a phone would pay. With
+--mock the Mongo queries complete synchronously, which understates the gain
+from running them concurrently against a real server.
+
+    python -m benchmarks.bootstrap --mock --iterations 200 --rtt-ms 0,50,150
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from benchmarks._common import add_mongo_args, mongo_client, running_app, summarize
+from benchmarks.loadtest import seed
+
+SEPARATE_CALLS = ("/api/dashboard/family", "/api/colleges/matches", "/api/chat/history")
+
+
+async def _get(http, path: str, headers: Dict[str, str], rtt: float):
+    await asyncio.sleep(rtt)
+    response = await http.get(path, headers=headers)
+    response.raise_for_status()
+    return response
+
+
+async def sequential(http, headers, rtt):
+    for path in SEPARATE_CALLS:
+        await _get(http, path, headers, rtt)
+
+
+async def parallel(http, headers, rtt):
+    await asyncio.gather(*(_get(http, path, headers, rtt) for path in SEPARATE_CALLS))
+
+
+async def bootstrap(http, headers, rtt):
+    await _get(http, "/api/bootstrap", headers, rtt)
+
+
+STRATEGIES = {"sequential": sequential, "parallel": parallel, "bootstrap": bootstrap}
+
+
+async def run(args) -> dict:
+    client = mongo_client(args)
+    async with running_app(client, args.db) as http:
+        accounts = await seed(args.families, args.messages, args.colleges)
+        # Warm the dashboard snapshot and the matching engine
+        await bootstrap(http, accounts[0]["headers"], 0)
+
+        results: List[dict] = []
+        for rtt_ms in args.rtt_ms:
+            level = {"rtt_ms": rtt_ms}
+            for name, strategy in STRATEGIES.items():
+                latencies = []
+                for i in range(args.iterations):
+                    headers = accounts[i % len(accounts)]["headers"]
+                    started = time.perf_counter()
+                    await strategy(http, headers, rtt_ms / 1000)
+                    latencies.append(time.perf_counter() - started)
+                level[name] = summarize(latencies)
+            results.append(level)
+
+        headers = accounts[0]["headers"]
+        separate = [await _get(http, path, headers, 0) for path in SEPARATE_CALLS]
+        sizes = {
+            "separate_bytes": sum(len(r.content) for r in separate),
+            "bootstrap_bytes": len((await _get(http, "/api/bootstrap", headers, 0)).content),
+        }
+    return {"iterations": args.iterations, "payload": sizes, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, "emma_bench_bootstrap")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=lambda s: [float(x) for x in s.split(",")], default=[0, 50, 150])
+    parser.add_argument("--families", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=100, help="chat messages per family")
+    parser.add_argument("--colleges", type=int, default=500, help="synthetic colleges on top of the seed catalog")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
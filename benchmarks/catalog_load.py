@@ -0,0 +1,63 @@
+"""Bulk catalog loader throughput and memory.
+
+Generates a synthetic JSONL catalog, loads it with load_catalog.load(),
+then loads it again to show the re-run is a no-op. Peak RSS should not
+grow with --records, since input is streamed in chunks.
+
+    python -m benchmarks.catalog_load --records 100000
+    python -m benchmarks.catalog_load --mock --records 5000
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+from pathlib import Path
+
+from beanie import init_beanie
+
+from benchmarks._common import add_mongo_args, mongo_client
+from models import DOCUMENT_MODELS
+
+
+def write_catalog(path: Path, records: int, seed: int = 3) -> None:
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for i in range(records):
+            f.write(json.dumps({
+                "name": f"Bench College {i:07d}",
+                "acceptance_rate": f"{rng.randint(3, 95)}%",
+                "tuition": f"${rng.randint(5, 85)},{rng.randint(0, 999):03d}/year",
+                "emotional_tagline": "A place to grow, explore and build something that matters.",
+                "default_fit_reason": "Strong academics with a supportive, collaborative community.",
+                "rich_media_links": [{"type": "Campus Tour", "url": "#"}],
+            }) + "\n")
+
+
+async def run(args):
+    import load_catalog
+
+    client = mongo_client(args)
+    await init_beanie(database=client[args.db], document_models=DOCUMENT_MODELS)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "catalog.jsonl"
+            write_catalog(source, args.records)
+            first = await load_catalog.load(source, chunk_size=args.chunk_size)
+            second = await load_catalog.load(source, chunk_size=args.chunk_size)
+        return {"records": args.records, "chunk_size": args.chunk_size, "initial_load": first, "rerun": second}
+    finally:
+        await client.drop_database(args.db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, default_db="emma_bench_catalog_load")
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
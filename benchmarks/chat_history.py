@@ -0,0 +1,109 @@
+"""Chat history page-fetch latency vs. conversation length.
+
+Seeds one family per size with that many messages, then times keyset page
+fetches at random depths (plus the old load-everything query for contrast).
+Against a real mongod, page latency should stay flat as size grows; the
+explain output shows how many index keys/documents a page touches.
+
+    python -m benchmarks.chat_history --sizes 1000,10000,100000
+    python -m benchmarks.chat_history --mock --sizes 1000,5000   # no mongod needed
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from beanie import PydanticObjectId, init_beanie
+
+import chat
+from benchmarks._common import add_mongo_args, mongo_client, summarize
+from models import ChatMessage
+
+BATCH = 10_000
+
+
+async def seed_family(size: int) -> PydanticObjectId:
+    family_id = PydanticObjectId()
+    collection = ChatMessage.get_motor_collection()
+    start = datetime.utcnow() - timedelta(seconds=size)
+    for offset in range(0, size, BATCH):
+        await collection.insert_many(
+            [
+                {
+                    "family_id": family_id,
+                    "sender_role": "ai" if i % 2 else "parent",
+                    "content": f"message {i}",
+                    "timestamp": start + timedelta(seconds=i),
+                    "metadata": {},
+                }
+                for i in range(offset, min(size, offset + BATCH))
+            ],
+            ordered=False,
+        )
+    return family_id
+
+
+async def bench_size(size: int, pages: int, limit: int, legacy: bool, explain: bool):
+    family_id = await seed_family(size)
+    collection = ChatMessage.get_motor_collection()
+    sample = await collection.find({"family_id": family_id}, {"_id": 1, "timestamp": 1}).sort("timestamp", 1).to_list(None)
+    cursors = [chat.encode_cursor(ChatMessage.model_construct(id=d["_id"], timestamp=d["timestamp"])) for d in random.sample(sample, min(pages, len(sample)))]
+
+    latest = []
+    for _ in range(pages):
+        started = time.perf_counter()
+        await chat.fetch_history(family_id, limit=limit)
+        latest.append(time.perf_counter() - started)
+
+    deep = []
+    for cursor in cursors:
+        started = time.perf_counter()
+        await chat.fetch_history(family_id, before=cursor, limit=limit)
+        deep.append(time.perf_counter() - started)
+
+    result = {"messages": size, "limit": limit, "latest_page": summarize(latest), "random_before_page": summarize(deep)}
+
+    if legacy:
+        started = time.perf_counter()
+        await ChatMessage.find(ChatMessage.family_id == family_id).sort(+ChatMessage.timestamp).to_list()
+        result["legacy_full_load_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    if explain:
+        ts, oid = chat.decode_cursor(cursors[0])
+        plan = await collection.find(
+            {"family_id": family_id, "$or": [{"timestamp": {"$lt": ts}}, {"timestamp": ts, "_id": {"$lt": oid}}]}
+        ).sort([("timestamp", -1), ("_id", -1)]).limit(limit).explain()
+        stats = plan.get("executionStats", {})
+        result["explain"] = {"keys_examined": stats.get("totalKeysExamined"), "docs_examined": stats.get("totalDocsExamined")}
+    return result
+
+
+async def run(args):
+    client = mongo_client(args)
+    database = client[args.db]
+    await init_beanie(database=database, document_models=[ChatMessage])
+    try:
+        results = []
+        for size in args.sizes:
+            results.append(await bench_size(size, args.pages, args.limit, args.legacy, explain=not args.mock))
+        return results
+    finally:
+        if not args.mock:
+            await client.drop_database(args.db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, default_db="emma_bench_chat_history")
+    parser.add_argument("--sizes", type=lambda v: [int(x) for x in v.split(",")], default=[1_000, 10_000, 100_000])
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=chat.DEFAULT_HISTORY_LIMIT)
+    parser.add_argument("--no-legacy", dest="legacy", action="store_false", help="skip the load-everything comparison")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
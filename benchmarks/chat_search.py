@@ -0,0 +1,154 @@
+"""/api/chat/search latency over a large message store.
+
+Generates --messages synthetic messages (Zipf-distributed vocabulary) spread
+over --families families, then times ranked searches of 1-3 words, each
+picked from the common, mid-frequency or rare part of the vocabulary:
+
+  --backend memory  search.FamilyIndex, the in-process inverted index; no
+                    database needed. Also reports build time and memory.
+  --backend mongo   $text over the chat_messages text index (needs a real
+                    mongod; mongomock has no text search)
+
+Every query includes snippet and highlight extraction for the page returned.
+
+    python -m benchmarks.chat_search --backend memory --messages 1000000 --families 1000
+    python -m benchmarks.chat_search --backend mongo --url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Dict, List
+
+from beanie import PydanticObjectId, init_beanie
+
+from benchmarks._common import add_mongo_args, mongo_client, rss_mb, summarize
+from models import DOCUMENT_MODELS, ChatMessage
+from search import FamilyIndex, _mongo_search, snippet, terms
+
+def vocabulary(size: int) -> List[str]:
+    syllables = ["ad", "mis", "col", "lege", "es", "say", "aid", "fi", "nan", "cial", "tour", "camp", "us", "ma", "jor", "dead", "line"]
+    rng = random.Random(0)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def synthetic_messages(count: int, families: List[PydanticObjectId], words: List[str], rng: random.Random) -> List[ChatMessage]:
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(words))))
+    start = datetime.utcnow() - timedelta(days=365)
+    messages = []
+    for i in range(count):
+        content = " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(5, 60)))
+        messages.append(ChatMessage.model_construct(
+            id=PydanticObjectId(),
+            family_id=families[i % len(families)],
+            sender_id=None,
+            sender_role="ai" if i % 2 else "parent",
+            content=content,
+            timestamp=start + timedelta(seconds=i),
+            metadata={},
+        ))
+    return messages
+
+
+def queries(words: List[str], count: int, rng: random.Random) -> Dict[str, List[str]]:
+    third = len(words) // 3
+    pools = {"common": words[:50], "mid": words[third:2 * third], "rare": words[2 * third:]}
+    return {band: [" ".join(rng.sample(pool, rng.randint(1, 3))) for _ in range(count)] for band, pool in pools.items()}
+
+
+def page_with_snippets(hits, query: str, limit: int):
+    query_terms = set(terms(query))
+    return [snippet(message.content, query_terms) for _, message in hits[:limit]]
+
+
+async def bench_memory(args, messages, families, query_sets, rng) -> dict:
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    indexes = {family_id: FamilyIndex() for family_id in families}
+    for message in messages:
+        indexes[message.family_id].add(message)
+    build_s = time.perf_counter() - started
+    report = {
+        "build_s": round(build_s, 3),
+        "build_messages_per_s": round(len(messages) / build_s),
+        "rss_mb": round(rss_mb() - baseline_rss, 1),
+    }
+    for band, band_queries in query_sets.items():
+        latencies = []
+        for query in band_queries:
+            index = indexes[rng.choice(families)]
+            t0 = time.perf_counter()
+            hits = index.search(set(terms(query)), args.limit + 1)
+            page_with_snippets(hits, query, args.limit)
+            latencies.append(time.perf_counter() - t0)
+        report[band] = summarize(latencies)
+    return report
+
+
+async def bench_mongo(args, messages, families, query_sets, rng) -> dict:
+    client = mongo_client(args)
+    await init_beanie(database=client[args.db], document_models=DOCUMENT_MODELS)
+    try:
+        started = time.perf_counter()
+        for offset in range(0, len(messages), 10_000):
+            await ChatMessage.insert_many(messages[offset:offset + 10_000])
+        report = {"load_s": round(time.perf_counter() - started, 3)}
+        try:
+            coll_stats = await client[args.db].command("collStats", ChatMessage.get_settings().name)
+            report["text_index_bytes"] = coll_stats["indexSizes"].get("family_content_text")
+        except Exception:
+            pass
+        for band, band_queries in query_sets.items():
+            latencies = []
+            for query in band_queries:
+                t0 = time.perf_counter()
+                hits = await _mongo_search(rng.choice(families), query, args.limit, 0)
+                page_with_snippets(hits, query, args.limit)
+                latencies.append(time.perf_counter() - t0)
+            report[band] = summarize(latencies)
+        return report
+    finally:
+        await client.drop_database(args.db)
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    words = vocabulary(args.vocabulary)
+    families = [PydanticObjectId() for _ in range(args.families)]
+    started = time.perf_counter()
+    messages = synthetic_messages(args.messages, families, words, rng)
+    query_sets = queries(words, args.queries, rng)
+    report = {
+        "backend": args.backend,
+        "messages": args.messages,
+        "families": args.families,
+        "messages_per_family": args.messages // args.families,
+        "generate_s": round(time.perf_counter() - started, 3),
+    }
+    bench = bench_memory if args.backend == "memory" else bench_mongo
+    report.update(await bench(args, messages, families, query_sets, rng))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, "emma_bench_chat_search")
+    parser.add_argument("--backend", choices=["memory", "mongo"], default="memory")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--families", type=int, default=1000)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=300, help="per frequency band")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Chat storage layouts: one document per message versus time buckets + archive.
+
+Loads the same synthetic history (--families x --messages, in conversations
+of --session messages spread over --days) into both layouts from chat_store,
+then reports for each:
+
+  storage   documents, data size and index size (collStats; estimated on --mock)
+  writes    latency of storing one new message
+  reads     history-page latency: newest page, a page deep in the past
+            (before=<cursor>) and an empty poll (after=<newest cursor>)
+
+The bucket layout is then compacted with CHAT_ARCHIVE_AFTER_DAYS=--archive-after
+and the deep read repeated, now served from the compressed archive.
+
+Before timing anything it checks that both layouts return the same pages
+through chat.fetch_history, including `since` polls given as naive and as
+timezone-aware timestamps, and exits with status 1 if they don't.
+
+    python -m benchmarks.chat_storage --mock --families 200 --messages 200
+    python -m benchmarks.chat_storage --families 5000 --messages 200   # 1M messages
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import bson
+from beanie import PydanticObjectId, init_beanie
+
+from benchmarks._common import add_mongo_args, mongo_client, summarize
+from chat import decode_cursor, encode_cursor, fetch_history
+from chat_store import BucketStore, ChatStore, DocumentStore, set_chat_store
+from models import DOCUMENT_MODELS, ChatArchive, ChatBucket, ChatMessage
+
+TEXT = "We visited three campuses this spring and want to compare financial aid and essay deadlines. "
+
+
+def synthetic_history(families: List[PydanticObjectId], per_family: int, days: float, session: int, rng: random.Random) -> List[ChatMessage]:
+    """Conversations of `session` messages a minute apart, at random times over `days`."""
+    start = datetime.utcnow() - timedelta(days=days)
+    messages = []
+    for family_id in families:
+        conversation_starts = sorted(rng.uniform(0, days) for _ in range(-(-per_family // session)))
+        for i in range(per_family):
+            messages.append(ChatMessage(
+                id=PydanticObjectId(),
+                family_id=family_id,
+                sender_role="ai" if i % 2 else "parent",
+                content=TEXT * rng.randint(1, 4),
+                timestamp=start + timedelta(days=conversation_starts[i // session], minutes=i % session),
+            ))
+    return messages
+
+
+async def storage_stats(db, models) -> Dict[str, float]:
+    stats = {"documents": 0, "data_bytes": 0, "index_bytes": 0, "indexes": 0}
+    for model in models:
+        name = model.get_settings().name
+        try:
+            coll_stats = await db.command("collStats", name)
+            stats["documents"] += coll_stats["count"]
+            stats["data_bytes"] += coll_stats["size"]
+            stats["index_bytes"] += coll_stats["totalIndexSize"]
+            stats["indexes"] += coll_stats["nindexes"]
+        except Exception:
+            # mongomock has no collStats: measure BSON sizes, and leave index size unknown
+            docs = await db[name].find().to_list(None)
+            stats["documents"] += len(docs)
+            stats["data_bytes"] += sum(len(bson.encode(doc)) for doc in docs)
+            stats["index_bytes"] = None
+            stats["indexes"] += len(await db[name].index_information())
+    return stats
+
+
+async def check_pages(stores: Dict[str, ChatStore], history: List[ChatMessage], families, per_family: int, samples: int, rng: random.Random) -> List[str]:
+    """Compare the pages fetch_history returns from each store; lists the mismatches."""
+    failures = []
+    for i in rng.sample(range(len(families)), min(samples, len(families))):
+        family_id = families[i]
+        since = history[i * per_family + per_family // 2].timestamp
+        # The three `since` forms name the same instant, so must return the same page
+        queries = {
+            "newest": (None, {}),
+            "since": (None, {"since": since}),
+            "since_utc": ("since", {"since": since.replace(tzinfo=timezone.utc)}),
+            "since_offset": ("since", {"since": (since + timedelta(hours=2)).replace(tzinfo=timezone(timedelta(hours=2)))}),
+        }
+        expected = {}
+        for query, (same_as, kwargs) in queries.items():
+            for name, store in stores.items():
+                set_chat_store(store)
+                try:
+                    page = [m.id for m in await fetch_history(family_id, limit=50, **kwargs)]
+                except Exception as e:
+                    failures.append(f"{name} {query} for family {family_id}: {e!r}")
+                    continue
+                finally:
+                    set_chat_store(None)
+                reference = expected.setdefault(same_as or query, page)
+                if page != reference:
+                    failures.append(f"{name} {query} for family {family_id}: {len(page)} messages, expected {len(reference)}")
+    return failures
+
+
+async def time_reads(store: ChatStore, families, deep_cursors, newest_cursors, samples: int, rng: random.Random) -> Dict[str, dict]:
+    results = {}
+    cases = {
+        "newest_page": lambda f: store.find(f, 50),
+        "deep_page": lambda f: store.find(f, 50, before=decode_cursor(deep_cursors[f])),
+        "empty_poll": lambda f: store.find(f, 50, after=decode_cursor(newest_cursors[f])),
+    }
+    for name, read in cases.items():
+        latencies = []
+        for _ in range(samples):
+            family_id = rng.choice(families)
+            started = time.perf_counter()
+            await read(family_id)
+            latencies.append(time.perf_counter() - started)
+        results[name] = summarize(latencies)
+    return results
+
+
+async def time_writes(store: ChatStore, families, samples: int) -> dict:
+    latencies = []
+    for i in range(samples):
+        message = ChatMessage(family_id=families[i % len(families)], sender_role="parent", content=TEXT)
+        started = time.perf_counter()
+        await store.insert(message)
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+async def run(args) -> dict:
+    client = mongo_client(args)
+    db = client[args.db]
+    await init_beanie(database=db, document_models=DOCUMENT_MODELS)
+    rng = random.Random(args.seed)
+    families = [PydanticObjectId() for _ in range(args.families)]
+    try:
+        history = synthetic_history(families, args.messages, args.days, args.session, rng)
+        # A cursor half-way back, and the newest one, per family
+        deep_cursors = {f: encode_cursor(history[i * args.messages + args.messages // 2]) for i, f in enumerate(families)}
+        newest_cursors = {f: encode_cursor(history[(i + 1) * args.messages - 1]) for i, f in enumerate(families)}
+
+        documents, buckets = DocumentStore(), BucketStore(archive_after_days=args.archive_after)
+        await documents.insert_many(history)
+        await buckets.insert_many(history)
+
+        failures = await check_pages({"documents": documents, "buckets": buckets}, history, families, args.messages, args.check_families, rng)
+        if failures:
+            print("\n".join(failures), file=sys.stderr)
+            sys.exit(1)
+
+        report = {"messages": len(history), "families": args.families, "days": args.days}
+        for name, store, models in (("documents", documents, [ChatMessage]), ("buckets", buckets, [ChatBucket])):
+            report[name] = {
+                "storage": await storage_stats(db, models),
+                "reads": await time_reads(store, families, deep_cursors, newest_cursors, args.samples, rng),
+                "writes": await time_writes(store, families, args.samples),
+            }
+
+        started = time.perf_counter()
+        archived = 0
+        while True:
+            moved = await buckets.compact()
+            archived += moved
+            if moved < buckets.compaction_batch:
+                break
+        report["archived"] = {
+            "buckets_moved": archived,
+            "compaction_s": round(time.perf_counter() - started, 3),
+            "hot": await storage_stats(db, [ChatBucket]),
+            "archive": await storage_stats(db, [ChatArchive]),
+            "reads": await time_reads(buckets, families, deep_cursors, newest_cursors, args.samples, rng),
+        }
+        return report
+    finally:
+        await client.drop_database(args.db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, "emma_bench_chat_storage")
+    parser.add_argument("--families", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200, help="messages per family")
+    parser.add_argument("--days", type=float, default=365, help="history spans this many days")
+    parser.add_argument("--session", type=int, default=10, help="messages per conversation")
+    parser.add_argument("--archive-after", type=float, default=90, help="days")
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--check-families", type=int, default=20, help="families whose pages are compared across layouts")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Dashboard cost as the user base grows: materialized cohort stats versus live aggregation.
+
+Grows the users and families collections through --users (one parent per
+family, --linked of them with a student, --active of them with chat history)
+and at each size times:
+
+  materialized  build_dashboard_data() with its dashboard cache bypassed,
+                i.e. milestones, tips and the single cohort_stats _id lookup
+  aggregate     count_cohort_stats(), the full-collection aggregations the
+                SupportCircle would need per page view without the
+                materialized collection (also what reconciliation costs)
+
+    python -m benchmarks.cohort_stats --mock --users 500,2000,8000   # mongomock loads slowly
+    python -m benchmarks.cohort_stats --users 1000,10000,100000,1000000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List
+
+from beanie import PydanticObjectId, init_beanie
+
+from benchmarks._common import add_mongo_args, mongo_client, summarize
+from cohort import CohortStatsMaintainer, count_cohort_stats
+from dashboard import build_dashboard_data
+from models import DOCUMENT_MODELS, Family, User
+from seed import seed_catalog
+
+BATCH = 10_000
+
+
+def synthetic_accounts(count: int, offset: int, linked: float, active: float, rng: random.Random):
+    """`count` users as raw documents: parents with a family each, plus their linked students."""
+    users, families = [], []
+    while len(users) < count:
+        n = offset + len(users)
+        parent_id, family_id = PydanticObjectId(), PydanticObjectId()
+        family = {"_id": family_id, "parent_id": parent_id, "memory": {"message_count": 0}}
+        users.append({"_id": parent_id, "email": f"parent{n}@bench.test", "hashed_password": "x", "role": "parent", "family_id": family_id, "profile": {}})
+        if rng.random() < linked and len(users) < count:
+            student_id = PydanticObjectId()
+            family["student_id"] = student_id
+            users.append({"_id": student_id, "email": f"student{n}@bench.test", "hashed_password": "x", "role": "student", "family_id": family_id, "profile": {}})
+        if rng.random() < active:
+            family["memory"]["message_count"] = 2 * rng.randint(1, 50)
+        families.append(family)
+    return users, families
+
+
+async def insert_batched(collection, docs: List[dict]) -> None:
+    for start in range(0, len(docs), BATCH):
+        await collection.insert_many(docs[start:start + BATCH], ordered=False)
+
+
+async def timed(fn, samples: int) -> dict:
+    latencies = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        await fn()
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+async def run(args) -> dict:
+    client = mongo_client(args)
+    await init_beanie(database=client[args.db], document_models=DOCUMENT_MODELS)
+    rng = random.Random(args.seed)
+    maintainer = CohortStatsMaintainer(flush_interval=0, reconcile_interval=0)
+    sizes = sorted(int(size) for size in args.users.split(","))
+    try:
+        await seed_catalog()
+        report = {"linked": args.linked, "active": args.active, "sizes": []}
+        loaded = 0
+        for size in sizes:
+            started = time.perf_counter()
+            users, families = synthetic_accounts(size - loaded, loaded, args.linked, args.active, rng)
+            await insert_batched(User.get_motor_collection(), users)
+            await insert_batched(Family.get_motor_collection(), families)
+            loaded = size
+            load_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            counts = await maintainer.reconcile()
+            report["sizes"].append({
+                "users": size,
+                "load_s": round(load_s, 3),
+                "reconcile_s": round(time.perf_counter() - started, 3),
+                "counts": counts,
+                "materialized": await timed(build_dashboard_data, args.samples),
+                "aggregate": await timed(count_cohort_stats, args.aggregate_samples),
+            })
+        return report
+    finally:
+        await client.drop_database(args.db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, "emma_bench_cohort_stats")
+    parser.add_argument("--users", default="1000,10000,100000,1000000", help="comma-separated user counts")
+    parser.add_argument("--linked", type=float, default=0.6, help="fraction of families with a student")
+    parser.add_argument("--active", type=float, default=0.4, help="fraction of families with chat history")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--aggregate-samples", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Cold-start cost: import time and time-to-first-response.
+
+Import time is measured in fresh interpreters (`python -X importtime -c
+"import main"`), with the slowest modules listed. Time-to-first-response
+spawns uvicorn per INDEX_CREATION mode and polls GET / until it answers;
+point it at a real mongod via DATABASE_URL so the Beanie init (and, in
+"startup" mode, the index build) is included.
+
+    python -m benchmarks.cold_start --runs 5 --modes startup,background,skip
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_profile(top: int):
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            rows.append((int(match.group(2)), match.group(4)))
+    total = next((us for us, name in rows if name == "main"), 0)
+    slowest = sorted((r for r in rows if r[1] != "main" and "." not in r[1]), reverse=True)[:top]
+    return total / 1e6, [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in slowest]
+
+
+def import_wall_time() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], check=True, capture_output=True)
+    return time.perf_counter() - started
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_response(mode: str, timeout: float) -> float:
+    port = _free_port()
+    env = {**os.environ, "INDEX_CREATION": mode, "LOG_LEVEL": "WARNING"}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"no response within {timeout}s (mode={mode})")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default="startup,background,skip")
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    import_total, slowest = import_profile(args.top)
+    walls = [import_wall_time() for _ in range(args.runs)]
+    result = {
+        "import_main_ms": round(import_total * 1000, 1),
+        "interpreter_plus_import_ms": {"median": round(statistics.median(walls) * 1000, 1), "min": round(min(walls) * 1000, 1)},
+        "slowest_imports": slowest,
+        "time_to_first_response_ms": {},
+    }
+    for mode in args.modes.split(","):
+        samples = [time_to_first_response(mode, args.timeout) for _ in range(args.runs)]
+        result["time_to_first_response_ms"][mode] = {
+            "median": round(statistics.median(samples) * 1000, 1),
+            "min": round(min(samples) * 1000, 1),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Matching-engine latency vs. catalog size (in memory, no Mongo needed).
+
+Builds synthetic catalogs, then times top-k matches for random student
+profiles, a full matrix build and single-college incremental updates.
+
+    python -m benchmarks.college_matching --sizes 1000,5000,20000
+"""
+import argparse
+import json
+import random
+import time
+
+from beanie import PydanticObjectId
+
+from benchmarks._common import summarize
+from matching import TRAIT_EXPANSIONS, MatchingEngine, profile_vector
+from models import College, RichMediaLink
+
+VOCABULARY = sorted({w for words in TRAIT_EXPANSIONS.values() for w in words.split()}) + [
+    "campus", "students", "faculty", "city", "outdoors", "engineering", "music", "athletics",
+    "service", "global", "liberal", "science", "business", "medicine", "writing", "theater",
+]
+TRAITS = list(TRAIT_EXPANSIONS)
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def synthetic_college(rng: random.Random, i: int) -> College:
+    return College.model_construct(
+        id=PydanticObjectId(),
+        name=f"College {i}",
+        acceptance_rate=f"{rng.randint(4, 90)}%",
+        tuition=f"${rng.randint(8, 80)},000/year",
+        emotional_tagline=_sentence(rng, 8),
+        default_fit_reason=_sentence(rng, 20),
+        default_fit_reason_student=_sentence(rng, 10),
+        rich_media_links=[RichMediaLink(type="Campus Tour", url="#")],
+    )
+
+
+def synthetic_profile(rng: random.Random) -> dict:
+    return {"traits": rng.sample(TRAITS, 4), "interests": _sentence(rng, 6)}
+
+
+def bench_size(size: int, queries: int, k: int, seed: int):
+    rng = random.Random(seed)
+    colleges = [synthetic_college(rng, i) for i in range(size)]
+    engine = MatchingEngine()
+
+    started = time.perf_counter()
+    engine.build(colleges)
+    build_seconds = time.perf_counter() - started
+
+    profiles = [profile_vector(synthetic_profile(rng)) for _ in range(queries)]
+    match_times = []
+    for query in profiles:
+        started = time.perf_counter()
+        engine.match(query, k)
+        match_times.append(time.perf_counter() - started)
+
+    update_times = []
+    for i in range(min(queries, 200)):
+        college = synthetic_college(rng, size + i)
+        if i % 2:
+            college.id = colleges[rng.randrange(size)].id
+        started = time.perf_counter()
+        engine.upsert(college)
+        update_times.append(time.perf_counter() - started)
+
+    return {
+        "colleges": size,
+        "dim": engine.dim,
+        "k": k,
+        "build_ms": round(build_seconds * 1000, 3),
+        "match": summarize(match_times),
+        "incremental_upsert": summarize(update_times),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=lambda v: [int(x) for x in v.split(",")], default=[1_000, 5_000, 20_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps([bench_size(size, args.queries, args.k, args.seed) for size in args.sizes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Job queue throughput, retries, lease recovery and idempotency.
+
+Runs jobs.JobQueue against Mongo (or mongomock with --mock) with a handler
+that sleeps for --work-ms, standing in for an LLM call:
+
+  throughput   drain --jobs jobs with 1..N workers; jobs/s and enqueue-to-done latency
+  retries      every job fails its first --failures attempts, then succeeds
+  recovery     a worker claims jobs and "crashes"; a second worker re-runs them
+               once their lease expires
+  idempotency  the same key enqueued concurrently yields a single job
+
+    python -m benchmarks.job_queue --mock --jobs 200 --workers 1,4,16
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+
+from beanie import init_beanie
+
+import jobs
+from benchmarks._common import add_mongo_args, mongo_client, summarize
+from jobs import JobQueue, job_handler
+from models import DOCUMENT_MODELS, Job
+
+_config = {"work_seconds": 0.05, "failures": 0}
+_attempts = {}
+
+
+@job_handler("bench.work")
+async def _work(job: Job):
+    await asyncio.sleep(_config["work_seconds"])
+    seen = _attempts[job.id] = _attempts.get(job.id, 0) + 1
+    if seen <= _config["failures"]:
+        raise RuntimeError(f"simulated failure {seen}")
+    return {"done_at": datetime.utcnow()}
+
+
+async def _drain(queue: JobQueue, count: int, timeout: float = 300) -> float:
+    started = time.perf_counter()
+    queue.start()
+    deadline = started + timeout
+    while await Job.find({"status": {"$in": ["succeeded", "failed"]}}).count() < count:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("queue did not drain")
+        await asyncio.sleep(0.02)
+    elapsed = time.perf_counter() - started
+    await queue.stop()
+    return elapsed
+
+
+async def _reset():
+    await Job.find_all().delete()
+    _attempts.clear()
+
+
+async def throughput(count: int, workers: int) -> dict:
+    await _reset()
+    _config["failures"] = 0
+    queue = JobQueue(workers=workers, poll_interval=0.05)
+    for i in range(count):
+        await queue.enqueue("bench.work", {"i": i})
+    elapsed = await _drain(queue, count)
+    done = await Job.find_all().to_list()
+    latencies = [(j.result["done_at"] - j.created_at).total_seconds() for j in done if j.result]
+    return {
+        "workers": workers,
+        "jobs": count,
+        "elapsed_s": round(elapsed, 3),
+        "jobs_per_s": round(count / elapsed, 1),
+        "enqueue_to_done": summarize(latencies),
+    }
+
+
+async def retries(count: int, failures: int, workers: int) -> dict:
+    await _reset()
+    _config["failures"] = failures
+    queue = JobQueue(workers=workers, poll_interval=0.05)
+    for i in range(count):
+        await queue.enqueue("bench.work", {"i": i}, max_attempts=failures + 1)
+    elapsed = await _drain(queue, count)
+    statuses = [j.status for j in await Job.find_all().to_list()]
+    return {
+        "jobs": count,
+        "failures_per_job": failures,
+        "elapsed_s": round(elapsed, 3),
+        "succeeded": statuses.count("succeeded"),
+        "failed": statuses.count("failed"),
+        "retried": queue.retried,
+    }
+
+
+async def recovery(count: int, lease: float) -> dict:
+    await _reset()
+    _config["failures"] = 0
+    crashed = JobQueue(workers=0, lease_seconds=lease)
+    for i in range(count):
+        await crashed.enqueue("bench.work", {"i": i})
+    # Claim everything and never finish, as if the process died mid-job
+    while await crashed.claim() is not None:
+        pass
+    survivor = JobQueue(workers=4, poll_interval=0.05, lease_seconds=lease)
+    elapsed = await _drain(survivor, count)
+    done = await Job.find_all().to_list()
+    return {
+        "jobs": count,
+        "lease_s": lease,
+        "recovered_in_s": round(elapsed, 3),
+        "succeeded": sum(j.status == "succeeded" for j in done),
+        "attempts": sorted({j.attempts for j in done}),
+    }
+
+
+async def idempotency(concurrent: int) -> dict:
+    await _reset()
+    queue = JobQueue(workers=0)
+    results = await asyncio.gather(*(queue.enqueue("bench.work", {}, idempotency_key="same-key") for _ in range(concurrent)))
+    return {
+        "concurrent_enqueues": concurrent,
+        "created": sum(created for _, created in results),
+        "distinct_job_ids": len({str(job.id) for job, _ in results}),
+        "jobs_stored": await Job.find_all().count(),
+    }
+
+
+async def run(args) -> dict:
+    client = mongo_client(args)
+    await init_beanie(database=client[args.db], document_models=DOCUMENT_MODELS)
+    _config["work_seconds"] = args.work_ms / 1000
+    jobs.JOB_BACKOFF_SECONDS = 0.05
+    # The retry scenario fails on purpose; keep its warnings out of the report
+    logging.getLogger("jobs").setLevel(logging.ERROR)
+    try:
+        return {
+            "throughput": [await throughput(args.jobs, w) for w in args.workers],
+            "retries": await retries(max(args.jobs // 4, 1), args.failures, max(args.workers)),
+            "recovery": await recovery(max(args.jobs // 4, 1), args.lease),
+            "idempotency": await idempotency(50),
+        }
+    finally:
+        await client.drop_database(args.db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, "emma_bench_jobs")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--workers", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4, 16])
+    parser.add_argument("--work-ms", type=float, default=50)
+    parser.add_argument("--failures", type=int, default=2)
+    parser.add_argument("--lease", type=float, default=0.5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
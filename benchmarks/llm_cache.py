@@ -0,0 +1,99 @@
+"""LLM reply cache: hit rate, upstream calls saved and latency.
+
+Replays --requests chat prompts at --concurrency against a FakeProvider with
+simulated model latency, once uncached and once through llm.CachingProvider.
+Questions are drawn Zipf-style from --questions distinct ones, with random
+changes in case, spacing and trailing punctuation, and --double-submit of
+the requests are sent twice at once, as a double-clicked send button would.
+
+    python -m benchmarks.llm_cache --requests 2000 --questions 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from itertools import accumulate
+from typing import List
+
+from benchmarks._common import summarize
+from chat import build_prompt
+from llm import CachingProvider, FakeProvider, LLMProvider
+
+TOPICS = ["essays", "campus visits", "financial aid", "early decision", "recommendation letters", "test scores", "interviews", "scholarships"]
+
+
+def questions(count: int) -> List[str]:
+    return [f"When should we start on {TOPICS[i % len(TOPICS)]} (question {i})?" for i in range(count)]
+
+
+def variant(question: str, rng: random.Random) -> str:
+    text = question.lower() if rng.random() < 0.3 else question
+    text = text.replace(" ", "  ", 1) if rng.random() < 0.2 else text
+    return text.rstrip("?") if rng.random() < 0.3 else text
+
+
+async def run_workload(provider: LLMProvider, prompts: List[str], double_submit: float, concurrency: int, rng: random.Random) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, first_tokens = [], []
+
+    async def one(content: str):
+        async with semaphore:
+            started = time.perf_counter()
+            first = None
+            async for _ in provider.stream(build_prompt(content)):
+                first = first or time.perf_counter()
+            latencies.append(time.perf_counter() - started)
+            first_tokens.append((first or time.perf_counter()) - started)
+
+    tasks = []
+    for content in prompts:
+        tasks.append(one(content))
+        if rng.random() < double_submit:
+            tasks.append(one(content))
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(tasks),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(tasks) / elapsed, 1),
+        "latency": summarize(latencies),
+        "first_token": summarize(first_tokens),
+    }
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    pool = questions(args.questions)
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(pool))))
+    prompts = [variant(q, rng) for q in rng.choices(pool, cum_weights=cum_weights, k=args.requests)]
+
+    uncached = FakeProvider(first_token_delay=args.first_token_ms / 1000, token_delay=args.token_ms / 1000)
+    report = {"uncached": await run_workload(uncached, prompts, args.double_submit, args.concurrency, random.Random(args.seed))}
+    report["uncached"]["upstream_calls"] = uncached.calls
+
+    inner = FakeProvider(first_token_delay=args.first_token_ms / 1000, token_delay=args.token_ms / 1000)
+    cached = CachingProvider(inner, maxsize=args.cache_size, ttl=3600)
+    report["cached"] = await run_workload(cached, prompts, args.double_submit, args.concurrency, random.Random(args.seed))
+    report["cached"]["upstream_calls"] = inner.calls
+    report["cached"]["cache"] = cached.stats()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=200, help="distinct questions")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--double-submit", type=float, default=0.05, help="fraction of requests sent twice at once")
+    parser.add_argument("--cache-size", type=int, default=1000)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
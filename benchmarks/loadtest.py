@@ -0,0 +1,223 @@
+"""Mixed-workload load test that drives main.app in-process.
+
+Seeds a throwaway database (catalog via seed.py, plus synthetic families
+with chat history), then runs a weighted mix of logins, chat posts, history
+reads, dashboards and college matches at each concurrency level, reporting
+throughput and p50/p95/p99 per operation.
+
+    python -m benchmarks.loadtest --mock --concurrency 1,8,32 --duration 10
+    python -m benchmarks.loadtest --url mongodb://localhost:27017 --output run.json
+    python -m benchmarks.loadtest --mock --output run.json --compare baseline.json
+
+With --compare, any operation whose p95/p99 rose, or whose throughput fell,
+by more than --threshold (fractional) versus the baseline is reported as a
+regression and the exit status is 1.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from beanie import PydanticObjectId
+
+from benchmarks._common import add_mongo_args, mongo_client, running_app, summarize
+
+DEFAULT_MIX = "login=1,chat=2,history=6,dashboard=4,matches=3"
+PASSWORD = "loadtest-password"
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown operations: {sorted(unknown)}")
+    return mix
+
+
+async def seed(families: int, messages_per_family: int, extra_colleges: int) -> List[dict]:
+    """Create parent accounts (sharing one bcrypt hash) with chat history."""
+    from auth import create_access_token, get_password_hash
+    from models import ChatMessage, Family, User
+    from chat_store import get_chat_store
+    from seed import seed_catalog
+
+    await seed_catalog(extra_colleges)
+
+    hashed = get_password_hash(PASSWORD)
+    accounts, users, family_docs, messages = [], [], [], []
+    start = datetime.utcnow() - timedelta(days=30)
+    for i in range(families):
+        user_id, family_id = PydanticObjectId(), PydanticObjectId()
+        email = f"loadtest-{i}@example.com"
+        users.append(User(id=user_id, email=email, hashed_password=hashed, role="parent", family_id=family_id))
+        family_docs.append(Family(id=family_id, parent_id=user_id))
+        for j in range(messages_per_family):
+            messages.append(ChatMessage(
+                family_id=family_id,
+                sender_id=user_id if j % 2 == 0 else None,
+                sender_role="parent" if j % 2 == 0 else "ai",
+                content=f"Seeded message {j} about essays, visits and financial aid.",
+                timestamp=start + timedelta(minutes=j),
+            ))
+        token = create_access_token({"sub": email, "role": "parent", "user_id": str(user_id)})
+        accounts.append({"email": email, "headers": {"Authorization": f"Bearer {token}"}})
+
+    await User.insert_many(users)
+    await Family.insert_many(family_docs)
+    # Through the configured store, so CHAT_STORAGE=buckets serves the same history
+    await get_chat_store().insert_many(messages)
+    return accounts
+
+
+async def op_login(http, account):
+    return await http.post("/auth/login", json={"email": account["email"], "password": PASSWORD})
+
+
+async def op_chat(http, account):
+    return await http.post("/api/chat", headers=account["headers"], json={"content": "When should we start essays?"})
+
+
+async def op_history(http, account):
+    return await http.get("/api/chat/history", headers=account["headers"])
+
+
+async def op_dashboard(http, account):
+    return await http.get("/api/dashboard/family", headers=account["headers"])
+
+
+async def op_matches(http, account):
+    return await http.get("/api/colleges/matches", headers=account["headers"])
+
+
+OPERATIONS: Dict[str, Callable] = {
+    "login": op_login,
+    "chat": op_chat,
+    "history": op_history,
+    "dashboard": op_dashboard,
+    "matches": op_matches,
+}
+
+
+async def run_level(http, accounts, mix: Dict[str, float], concurrency: int, duration: float, seed_value: int):
+    names, weights = list(mix), list(mix.values())
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int):
+        rng = random.Random(seed_value * 1000 + worker_id)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await OPERATIONS[name](http, rng.choice(accounts))
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            latencies[name].append(time.perf_counter() - started)
+            if not ok:
+                errors[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "errors": sum(errors.values()),
+        "operations": {
+            name: {**summarize(samples), "throughput_rps": round(len(samples) / elapsed, 2), "errors": errors[name]}
+            for name, samples in sorted(latencies.items())
+        },
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in current["levels"]:
+        base = baseline_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        for name, stats in level["operations"].items():
+            base_stats = base["operations"].get(name)
+            if not base_stats:
+                continue
+            for key in ("p95_ms", "p99_ms"):
+                if base_stats[key] and stats[key] > base_stats[key] * (1 + threshold):
+                    regressions.append(
+                        f"c={level['concurrency']} {name} {key}: {base_stats[key]} -> {stats[key]}"
+                    )
+            if base_stats["throughput_rps"] and stats["throughput_rps"] < base_stats["throughput_rps"] * (1 - threshold):
+                regressions.append(
+                    f"c={level['concurrency']} {name} throughput_rps: {base_stats['throughput_rps']} -> {stats['throughput_rps']}"
+                )
+    return regressions
+
+
+async def run(args):
+    client = mongo_client(args)
+    async with running_app(client, args.db) as http:
+        accounts = await seed(args.families, args.messages, args.extra_colleges)
+        # One untimed pass so lazy caches and the matching matrix are warm
+        await run_level(http, accounts, args.mix, concurrency=1, duration=args.warmup, seed_value=0)
+        levels = []
+        for concurrency in args.concurrency:
+            levels.append(await run_level(http, accounts, args.mix, concurrency, args.duration, seed_value=concurrency))
+            print(f"concurrency={concurrency}: {levels[-1]['throughput_rps']} req/s", file=sys.stderr)
+    return {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "backend": "mongomock" if args.mock else "mongod",
+        "scale": {"families": args.families, "messages_per_family": args.messages, "extra_colleges": args.extra_colleges},
+        "mix": args.mix,
+        "levels": levels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, default_db="emma_bench_loadtest")
+    parser.add_argument("--families", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50, help="chat messages seeded per family")
+    parser.add_argument("--extra-colleges", type=int, default=1000)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"weighted operations (default {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Login hashing storm vs. latency of an unrelated endpoint.
+
+Fires a burst of bcrypt verifications (what /auth/login does per request) while
+probing GET / through the ASGI app, once with hashing inline on the event loop
+and once through the hashing pool. With the pool, probe p99 should stay flat.
+
+    python -m benchmarks.login_storm --logins 40 --probes 200
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks._common import summarize
+from hashing import _verify, hashing_pool, pwd_context
+from main import app
+
+
+async def _probe(client: httpx.AsyncClient, count: int, interval: float, until: asyncio.Event = None):
+    # Latency is measured from the scheduled send time, so time spent waiting
+    # for a blocked event loop counts against the probe.
+    latencies = []
+    scheduled = time.perf_counter()
+    while len(latencies) < count or (until is not None and not until.is_set()):
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        response = await client.get("/")
+        response.raise_for_status()
+        now = time.perf_counter()
+        latencies.append(now - scheduled)
+        scheduled = max(scheduled + interval, now)
+    return latencies
+
+
+async def _storm(mode: str, hashed: str, logins: int, spacing: float):
+    # Logins arrive staggered, the way a burst of real clients would
+    async def inline(delay):
+        await asyncio.sleep(delay)
+        _verify("wrong-password", hashed)
+
+    async def pooled(delay):
+        await asyncio.sleep(delay)
+        await hashing_pool.run(_verify, "wrong-password", hashed)
+
+    job = inline if mode == "inline" else pooled
+    await asyncio.gather(*(job(i * spacing) for i in range(logins)))
+
+
+async def run(mode: str, logins: int, probes: int, interval: float, spacing: float):
+    hashed = pwd_context.hash("correct-password")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        baseline = await _probe(client, probes, interval)
+        storm_done = asyncio.Event()
+        probe_task = asyncio.create_task(_probe(client, 1, interval, until=storm_done))
+        started = time.perf_counter()
+        await _storm(mode, hashed, logins, spacing)
+        storm_seconds = time.perf_counter() - started
+        storm_done.set()
+        during = await probe_task
+    return {
+        "mode": mode,
+        "logins": logins,
+        "storm_seconds": round(storm_seconds, 3),
+        "probe_idle": summarize(baseline),
+        "probe_during_storm": summarize(during),
+        "pool": hashing_pool.stats() if mode == "pool" else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between probe requests")
+    parser.add_argument("--spacing", type=float, default=0.01, help="seconds between login arrivals")
+    parser.add_argument("--mode", choices=["inline", "pool", "both"], default="both")
+    args = parser.parse_args()
+
+    modes = ["inline", "pool"] if args.mode == "both" else [args.mode]
+    results = [asyncio.run(run(mode, args.logins, args.probes, args.interval, args.spacing)) for mode in modes]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Prompt size vs. conversation length, with and without conversation memory.
+
+Replays a long family conversation through memory.remember (folding inline,
+with the deterministic fake provider) and records the size of the prompt
+chat.build_prompt would send at checkpoints, next to what sending the full
+ChatMessage history would cost. With memory the prompt should plateau once the
+first fold has happened; the naive prompt grows linearly.
+
+    python -m benchmarks.prompt_size --mock --messages 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from beanie import PydanticObjectId, init_beanie
+
+from benchmarks._common import add_mongo_args, mongo_client, summarize
+from chat import SYSTEM_PROMPT, build_prompt
+from llm import FakeProvider
+from memory import load_memory, remember
+from models import DOCUMENT_MODELS, ChatMessage, Family
+
+
+def _chars(prompt) -> int:
+    return sum(len(m["content"]) for m in prompt)
+
+
+def _message(family_id, i: int) -> ChatMessage:
+    role = "ai" if i % 2 else ("parent" if i % 4 == 0 else "student")
+    text = f"Message {i}. " + ("We are still weighing early decision for Reed and want to know about aid deadlines. " * 2)
+    # Ids are assigned client-side; remember() only needs id, role and content
+    return ChatMessage(id=PydanticObjectId(), family_id=family_id, sender_role=role, content=text)
+
+
+async def run(args) -> dict:
+    client = mongo_client(args)
+    await init_beanie(database=client[args.db], document_models=DOCUMENT_MODELS)
+    provider = FakeProvider()
+    family = Family(parent_id=PydanticObjectId())
+    await family.insert()
+
+    checkpoints = {int(args.messages * f) for f in (0.001, 0.01, 0.1, 0.5, 1.0)} | {100, 1000}
+    naive_chars = len(SYSTEM_PROMPT)
+    rows, append_latencies, read_latencies = [], [], []
+    try:
+        for i in range(0, args.messages, 2):
+            pair = [_message(family.id, i), _message(family.id, i + 1)]
+            naive_chars += sum(len(m.content) for m in pair)
+            started = time.perf_counter()
+            await remember(family.id, pair, provider, background=False)
+            append_latencies.append(time.perf_counter() - started)
+
+            done = i + 2
+            if any(i < c <= done for c in checkpoints):
+                started = time.perf_counter()
+                prompt = build_prompt("What should we do next?", await load_memory(family.id))
+                read_latencies.append(time.perf_counter() - started)
+                rows.append({
+                    "messages": done,
+                    "prompt_messages": len(prompt),
+                    "prompt_chars": _chars(prompt),
+                    "naive_prompt_chars": naive_chars,
+                    "approx_prompt_tokens": _chars(prompt) // 4,
+                    "approx_naive_tokens": naive_chars // 4,
+                })
+    finally:
+        await client.drop_database(args.db)
+
+    return {
+        "messages": args.messages,
+        "summarize_calls": provider.summaries,
+        "checkpoints": rows,
+        "remember": summarize(append_latencies),
+        "load_memory_and_build_prompt": summarize(read_latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, "emma_bench_prompt_size")
+    parser.add_argument("--messages", type=int, default=10000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Admission control check: which key a request is limited by, and what the middleware costs.
+
+Drives ratelimit.RateLimitMiddleware in front of a no-op ASGI app (no
+database needed) behind a simulated reverse proxy, and checks that:
+
+  spoofed_xff   a client varying the leading X-Forwarded-For entry it writes
+                itself still drains the bucket of the address the proxy saw
+  proxy_hops    with two trusted hops the key is the entry two from the right
+  account       one login email is limited across many IPs
+  per_worker    with --workers N each worker enforces 1/N of the budgets
+
+then reports the per-request latency the middleware adds to an admitted
+request. Exits with status 1 and lists the failed checks if any fail.
+
+    python -m benchmarks.rate_limits
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks._common import summarize
+from ratelimit import RateLimitMiddleware, RouteClass
+
+LOGIN = ("POST", "/auth/login")
+
+
+async def ok_app(scope, receive, send):
+    # Drain the body like a route would, so the account buffering is replayed
+    while (await receive()).get("more_body"):
+        pass
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def client_for(route_class: RouteClass, **kwargs) -> httpx.AsyncClient:
+    middleware = RateLimitMiddleware(ok_app, route_classes=[route_class], enabled=True, **kwargs)
+    # The proxy's own address, which every request arrives from
+    transport = httpx.ASGITransport(app=middleware, client=("10.0.0.1", 1234))
+    return httpx.AsyncClient(transport=transport, base_url="http://check")
+
+
+async def statuses(http: httpx.AsyncClient, requests: List[Tuple[Optional[str], Optional[str]]]) -> List[int]:
+    """POST /auth/login once per (X-Forwarded-For, email) pair, in order."""
+    codes = []
+    for forwarded, email in requests:
+        headers = {"x-forwarded-for": forwarded} if forwarded else {}
+        response = await http.post("/auth/login", json={"email": email or "nobody@example.com", "password": "x"}, headers=headers)
+        codes.append(response.status_code)
+    return codes
+
+
+async def run(args) -> dict:
+    burst = args.burst
+    ip_only = RouteClass("auth", [LOGIN], ip_rate_per_minute=1, ip_burst=burst)
+    account_only = RouteClass("auth", [LOGIN], account_field="email", account_rate_per_minute=1, account_burst=burst)
+    checks: Dict[str, bool] = {}
+    codes: Dict[str, List[int]] = {}
+
+    async with client_for(ip_only, trust_proxy=True, trusted_hops=1) as http:
+        codes["spoofed_xff"] = await statuses(http, [(f"198.51.100.{i}, 203.0.113.7", None) for i in range(burst + 3)])
+    checks["spoofed_xff"] = codes["spoofed_xff"] == [200] * burst + [429] * 3
+
+    async with client_for(ip_only, trust_proxy=True, trusted_hops=2) as http:
+        # Same client behind two proxies; the entry left of it is forged each time
+        same = await statuses(http, [(f"198.51.100.{i}, 203.0.113.7, 10.1.0.2", None) for i in range(burst + 1)])
+        other = await statuses(http, [("203.0.113.8, 10.1.0.2", None)])
+    codes["proxy_hops"] = same + other
+    checks["proxy_hops"] = same == [200] * burst + [429] and other == [200]
+
+    async with client_for(account_only, trust_proxy=True) as http:
+        victim = await statuses(http, [(f"203.0.113.{i}", " Victim@Example.com ") for i in range(burst + 2)])
+        other = await statuses(http, [("203.0.113.200", "other@example.com")])
+    codes["account"] = victim + other
+    checks["account"] = victim == [200] * burst + [429] * 2 and other == [200]
+
+    async with client_for(ip_only, workers=args.workers) as http:
+        codes["per_worker"] = await statuses(http, [(None, None)] * burst)
+    share = -(-burst // args.workers)
+    checks["per_worker"] = codes["per_worker"] == [200] * share + [429] * (burst - share)
+
+    overhead = {}
+    unlimited = RouteClass("auth", [LOGIN])
+    busy = RouteClass("auth", [LOGIN], ip_rate_per_minute=1e9, ip_burst=10**9, account_field="email",
+                      account_rate_per_minute=1e9, account_burst=10**9, max_in_flight=10**6)
+    for name, route_class in (("passthrough", unlimited), ("ip_and_account", busy)):
+        async with client_for(route_class, trust_proxy=True) as http:
+            latencies = []
+            for i in range(args.samples):
+                started = time.perf_counter()
+                await http.post("/auth/login", json={"email": f"user{i % 100}@example.com", "password": "x"},
+                                headers={"x-forwarded-for": f"203.0.113.{i % 250}"})
+                latencies.append(time.perf_counter() - started)
+            overhead[name] = summarize(latencies)
+
+    return {
+        "statuses": codes,
+        "latency": overhead,
+        "failed": [name for name, passed in checks.items() if not passed],
+        "ok": all(checks.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Per-route response serialization cost, before and after the trusted-payload path.
+
+For each route, times turning already-loaded data into response bytes (no
+Mongo, no HTTP):
+
+  before     build the response models, FastAPI's validate + serialize for the
+             route's response_model, then json.dumps (the previous handlers)
+  fastapi    the same models through FastAPI's pydantic dump_json fast path,
+             for reference
+  after      payload dicts straight from the documents, encoded once by orjson
+             via TrustedJSONResponse (what the handlers do now)
+
+    python -m benchmarks.serialization --iterations 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+
+from beanie import PydanticObjectId
+from fastapi.routing import serialize_response
+
+from benchmarks._common import summarize
+from benchmarks.college_matching import synthetic_college
+from catalog import college_payload
+from chat import encode_cursor, message_payload
+from dashboard import DEFAULT_SOUL_SCAN_PROFILE, DEFAULT_SUPPORT_CIRCLE, _snapshot
+from models import ChatMessage
+from responses import TrustedJSONResponse
+from routers import router
+from schemas import ChatMessageResponse, CollegeMatch, CollegeQueryResponse, FacetBucket, FamilyHQData
+
+
+def _json_dumps(content) -> bytes:
+    # The previous default response class: JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _response_field(path: str, method: str = "GET"):
+    for route in router.routes:
+        if getattr(route, "path", None) == path and method in getattr(route, "methods", ()):
+            return route.response_field
+    raise LookupError(path)
+
+
+def _messages(count: int):
+    start = datetime(2026, 1, 1)
+    return [
+        ChatMessage.model_construct(
+            id=PydanticObjectId(),
+            family_id=PydanticObjectId(),
+            sender_role="ai" if i % 2 else "parent",
+            content="When should we start the Common App essay? " * 4,
+            timestamp=start + timedelta(seconds=i),
+            metadata={},
+        )
+        for i in range(count)
+    ]
+
+
+def _chat_response(message: ChatMessage) -> ChatMessageResponse:
+    return ChatMessageResponse(
+        _id=message.id, sender_role=message.sender_role, content=message.content,
+        timestamp=message.timestamp, cursor=encode_cursor(message),
+    )
+
+
+def _cases(rng: random.Random, page_size: int) -> Dict[str, Dict[str, Callable]]:
+    history = _messages(50)
+    colleges = [synthetic_college(rng, i) for i in range(page_size)]
+    college_dumps = [c.model_dump(by_alias=True) for c in colleges]
+    facets = {"tuition_usd": [{"min": 0.0, "max": 20000.0, "count": 3}], "acceptance_rate_pct": [{"min": 0.0, "max": 10.0, "count": 3}]}
+    dashboard = FamilyHQData(
+        monthlyFocus=[f"Milestone {i}" for i in range(8)],
+        soulScanProfile=DEFAULT_SOUL_SCAN_PROFILE,
+        supportCircle=DEFAULT_SUPPORT_CIRCLE,
+        insiderTips=[f"Tip {i}" for i in range(10)],
+    )
+
+    return {
+        "GET /api/chat/history (50)": {
+            "field": _response_field("/api/chat/history"),
+            "models": lambda: [_chat_response(m) for m in history],
+            "payload": lambda: [message_payload(m) for m in history],
+        },
+        "POST /api/chat": {
+            "field": _response_field("/api/chat", "POST"),
+            "models": lambda: _chat_response(history[0]),
+            "payload": lambda: message_payload(history[0]),
+        },
+        f"GET /api/colleges/matches ({page_size})": {
+            "field": _response_field("/api/colleges/matches"),
+            "models": lambda: [
+                CollegeMatch.model_validate({**c.model_dump(by_alias=True), "fit_score": 0.5}) for c in colleges
+            ],
+            "payload": lambda: [college_payload(c.model_dump(by_alias=True), fit_score=0.5) for c in colleges],
+        },
+        f"GET /api/colleges ({page_size})": {
+            "field": _response_field("/api/colleges"),
+            "models": lambda: CollegeQueryResponse(
+                items=[CollegeMatch.model_validate(doc) for doc in college_dumps],
+                total=page_size, page=1, page_size=page_size,
+                facets={k: [FacetBucket(**b) for b in v] for k, v in facets.items()},
+            ),
+            "payload": lambda: {
+                "items": [college_payload(doc) for doc in college_dumps],
+                "total": page_size, "page": 1, "page_size": page_size, "facets": facets,
+            },
+        },
+        "dashboard snapshot rebuild": {
+            "before": lambda: _json_dumps(dashboard.model_dump(mode="json")),
+            "after": lambda: _snapshot(1, dashboard).body,
+        },
+    }
+
+
+async def _time(fn, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+async def run(args) -> dict:
+    report = {}
+    for name, case in _cases(random.Random(args.seed), args.page_size).items():
+        if "field" in case:
+            field, models, payload = case["field"], case["models"], case["payload"]
+
+            async def before():
+                return _json_dumps(await serialize_response(field=field, response_content=models()))
+
+            async def fastapi_fast_path():
+                return await serialize_response(field=field, response_content=models(), dump_json=True)
+
+            def after():
+                return TrustedJSONResponse(payload()).body
+
+            # Same bytes on the wire, whichever path produced them
+            assert json.loads(await before()) == json.loads(after()), name
+            timings = {
+                "before": await _time(before, args.iterations),
+                "fastapi": await _time(fastapi_fast_path, args.iterations),
+                "after": await _time(after, args.iterations),
+            }
+        else:
+            assert json.loads(case["before"]()) == json.loads(case["after"]()), name
+            timings = {
+                "before": await _time(case["before"], args.iterations),
+                "after": await _time(case["after"], args.iterations),
+            }
+        timings["speedup_p50"] = round(timings["before"]["p50_ms"] / max(timings["after"]["p50_ms"], 1e-6), 1)
+        report[name] = timings
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
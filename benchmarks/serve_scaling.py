@@ -0,0 +1,179 @@
+"""Throughput of the CPU-bound routes as serve.py adds worker processes.
+
+Seeds a throwaway database on a real mongod (the workers are separate
+processes, so mongomock can't be shared with them), then for each
+--workers count starts `python serve.py` with WEB_CONCURRENCY set to it and
+drives each route for --duration seconds from --clients load-generator
+processes:
+
+  login    POST /auth/login: one bcrypt verification per request
+  matches  GET /api/colleges/matches: scoring the catalog (grow it with
+           --extra-colleges) and serializing the page, all in Python
+
+Reported per route and worker count: requests/s, latency, and speedup and
+parallel efficiency against one worker. The load generators share the
+host's cores with the server; give them few enough (or run on a bigger
+machine) that the server, not the client, is what saturates.
+
+    python -m benchmarks.serve_scaling --url mongodb://localhost:27017 --workers 1,2,4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+from beanie import init_beanie
+
+from benchmarks._common import add_mongo_args, mongo_client, summarize
+from benchmarks.loadtest import PASSWORD, seed
+from models import DOCUMENT_MODELS
+from serve import available_cpus
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def request_for(route: str, account: dict):
+    if route == "login":
+        return "POST", "/auth/login", {"json": {"email": account["email"], "password": PASSWORD}}
+    return "GET", "/api/colleges/matches", {"headers": account["headers"], "params": {"limit": 20}}
+
+
+async def drive(base_url: str, route: str, accounts: List[dict], concurrency: int, duration: float) -> Dict[str, list]:
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def loop(i: int):
+        nonlocal errors
+        method, path, kwargs = request_for(route, accounts[i % len(accounts)])
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await http.request(method, path, **kwargs)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        await asyncio.gather(*(loop(i) for i in range(concurrency)))
+    return {"latencies": latencies, "errors": errors}
+
+
+def client_process(args) -> Dict[str, list]:
+    return asyncio.run(drive(*args))
+
+
+def load(base_url: str, route: str, accounts: List[dict], clients: int, concurrency: int, duration: float) -> dict:
+    per_client = max(1, concurrency // clients)
+    with multiprocessing.get_context("spawn").Pool(clients) as pool:
+        results = pool.map(client_process, [(base_url, route, accounts, per_client, duration)] * clients)
+    latencies = [l for r in results for l in r["latencies"]]
+    return {
+        "requests_per_s": round(len(latencies) / duration, 1),
+        "errors": sum(r["errors"] for r in results),
+        "latency": summarize(latencies),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, args) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "PORT": str(port),
+        "DATABASE_URL": args.url,
+        "MONGO_DB_NAME": args.db,
+        "INDEX_CREATION": "skip",
+        "RATE_LIMIT_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+    process = subprocess.Popen([sys.executable, "serve.py"], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.timeout:
+        try:
+            with urllib.request.urlopen(base_url + "/", timeout=1) as response:
+                if response.status == 200:
+                    return process, base_url
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise TimeoutError(f"serve.py with {workers} workers did not answer within {args.timeout}s")
+
+
+async def seed_database(args) -> List[dict]:
+    client = mongo_client(args)
+    await init_beanie(database=client[args.db], document_models=DOCUMENT_MODELS)
+    return await seed(args.accounts, 0, args.extra_colleges)
+
+
+async def drop_database(args) -> None:
+    await mongo_client(args).drop_database(args.db)
+
+
+def run(args) -> dict:
+    accounts = asyncio.run(seed_database(args))
+    routes = args.routes.split(",")
+    report = {"cpus": available_cpus(), "clients": args.clients, "concurrency": args.concurrency, "routes": {r: {} for r in routes}}
+    try:
+        for workers in sorted(int(w) for w in args.workers.split(",")):
+            process, base_url = start_server(workers, args)
+            try:
+                for route in routes:
+                    # Lets every worker load the catalog and cache the principals
+                    load(base_url, route, accounts, args.clients, args.concurrency, args.warmup)
+                    report["routes"][route][workers] = load(base_url, route, accounts, args.clients, args.concurrency, args.duration)
+            finally:
+                process.terminate()
+                process.wait()
+        for route, by_workers in report["routes"].items():
+            baseline = by_workers[min(by_workers)]["requests_per_s"] or 1
+            for workers, result in by_workers.items():
+                result["speedup"] = round(result["requests_per_s"] / baseline, 2)
+                result["efficiency"] = round(result["speedup"] / (workers / min(by_workers)), 2)
+        return report
+    finally:
+        asyncio.run(drop_database(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, "emma_bench_serve_scaling")
+    cpus = available_cpus()
+    default_workers = ",".join(str(w) for w in sorted({1, 2, 4, 8, cpus}) if w <= cpus)
+    parser.add_argument("--workers", default=default_workers, help="comma-separated worker counts")
+    parser.add_argument("--routes", default="login,matches")
+    parser.add_argument("--clients", type=int, default=max(1, cpus // 2), help="load-generator processes")
+    parser.add_argument("--concurrency", type=int, default=64, help="requests in flight, across all clients")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--extra-colleges", type=int, default=5000)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for serve.py to answer")
+    args = parser.parse_args()
+    if args.mock:
+        parser.error("serve.py workers are separate processes; point --url at a real mongod")
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Concurrent signup check: no double-claimed invites, no duplicate emails.
+
+Drives the signup routes through the ASGI app with many simultaneous
+requests that race for the same invite token / the same email, and checks
+exactly one of each wins: one 201, 400 for every other attempt, and one
+user and one family for it in the database. A later signup with the same
+email must be turned away too. Against a real mongod it also counts the
+database commands issued per signup.
+
+Exits with status 1 and lists the failed checks if any of them fail, so it
+can gate a deploy:
+
+    python -m benchmarks.signup_race --concurrency 50
+    python -m benchmarks.signup_race --mock
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from collections import Counter
+
+from pymongo import monitoring
+
+from benchmarks._common import add_mongo_args, mongo_client, running_app
+from models import Family, User
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def _count(counter, coro):
+    if counter is None:
+        return await coro, None
+    before = sum(counter.commands.values())
+    result = await coro
+    return result, sum(counter.commands.values()) - before
+
+
+async def run(args):
+    counter = None if args.mock else CommandCounter()
+    client = mongo_client(args, event_listeners=[counter] if counter else [])
+
+    run_id = uuid.uuid4().hex[:8]
+    async with running_app(client, args.db) as http:
+        parent_email = f"parent-{run_id}@example.com"
+        response, parent_commands = await _count(
+            counter, http.post("/auth/signup/parent", json={"email": parent_email, "password": "pw"})
+        )
+        response.raise_for_status()
+        login = await http.post("/auth/login", json={"email": parent_email, "password": "pw"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        invite = (await http.post("/auth/invite", headers=headers)).json()["invite_token"]
+
+        student_attempts = await asyncio.gather(*(
+            http.post("/auth/signup/student", json={
+                "email": f"student-{run_id}-{i}@example.com",
+                "password": "pw",
+                "invite_token": invite,
+            })
+            for i in range(args.concurrency)
+        ))
+        duplicate_email = f"dup-{run_id}@example.com"
+        duplicate_attempts = await asyncio.gather(*(
+            http.post("/auth/signup/parent", json={"email": duplicate_email, "password": "pw"})
+            for _ in range(args.concurrency)
+        ))
+        late_duplicate, late_commands = await _count(
+            counter, http.post("/auth/signup/parent", json={"email": duplicate_email, "password": "pw"})
+        )
+
+        parent = await User.find_one(User.email == parent_email)
+        family = await Family.get(parent.family_id)
+        duplicates = await User.find(User.email == duplicate_email).to_list()
+        state = {
+            "students_in_family": await User.find(User.family_id == family.id, User.role == "student").count(),
+            "family_student_set": family.student_id is not None,
+            "invite_consumed": family.invite_token is None,
+            "users_with_duplicate_email": len(duplicates),
+            "families_of_duplicate_email": await Family.find({"parent_id": {"$in": [u.id for u in duplicates]}}).count(),
+        }
+
+    student_statuses = Counter(r.status_code for r in student_attempts)
+    duplicate_statuses = Counter(r.status_code for r in duplicate_attempts)
+    checks = {
+        "one invite claim succeeds": student_statuses[201] == 1,
+        "other invite claims get 400": student_statuses[400] == args.concurrency - 1,
+        "one student in the family": state["students_in_family"] == 1 and state["family_student_set"],
+        "invite token consumed": state["invite_consumed"],
+        "one same-email signup succeeds": duplicate_statuses[201] == 1,
+        "other same-email signups get 400": duplicate_statuses[400] == args.concurrency - 1,
+        "one user and family for the email": state["users_with_duplicate_email"] == 1 and state["families_of_duplicate_email"] == 1,
+        "later same-email signup gets 400": late_duplicate.status_code == 400,
+    }
+    return {
+        "concurrency": args.concurrency,
+        "invite_claims": dict(student_statuses),
+        "same_email_parent_signups": dict(duplicate_statuses),
+        "database": state,
+        "db_commands_per_parent_signup": parent_commands,
+        "db_commands_per_taken_email_signup": late_commands,
+        "failed": [name for name, passed in checks.items() if not passed],
+        "ok": all(checks.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, default_db="emma_bench_signup")
+    parser.add_argument("--concurrency", type=int, default=25)
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
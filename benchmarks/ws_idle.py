@@ -0,0 +1,166 @@
+"""Thousands of idle /ws/chat connections: connect cost, memory, fan-out latency.
+
+Opens --connections WebSockets spread over --families families, straight into
+the ASGI app (no sockets, so numbers are the app's own cost). Then, while they
+sit idle, measures:
+
+  - time to authenticate, subscribe and accept each connection
+  - resident memory added per connection
+  - event-loop lag with all of them idle (heartbeats firing every --heartbeat s)
+  - delivery latency of one chat message published to every family
+
+    python -m benchmarks.ws_idle --mock --connections 5000 --families 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List, Optional
+
+from benchmarks._common import add_mongo_args, mongo_client, rss_mb, running_app, summarize
+
+
+class WebSocketClient:
+    """Drives one ASGI WebSocket session in-process."""
+
+    def __init__(self, app, query: str):
+        self.app = app
+        self.scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": "/ws/chat",
+            "raw_path": b"/ws/chat",
+            "query_string": query.encode(),
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+            "subprotocols": [],
+        }
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self.received: asyncio.Queue = asyncio.Queue()
+        self.accepted = asyncio.Event()
+        self.close_code: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def _send(self, message):
+        if message["type"] == "websocket.accept":
+            self.accepted.set()
+        elif message["type"] == "websocket.send":
+            self.received.put_nowait((time.perf_counter(), message.get("text")))
+        elif message["type"] == "websocket.close":
+            self.close_code = message.get("code", 1000)
+            self.accepted.set()
+
+    async def connect(self) -> bool:
+        self._to_app.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.create_task(self.app(self.scope, self._to_app.get, self._send))
+        await self.accepted.wait()
+        return self.close_code is None
+
+    async def disconnect(self):
+        self._to_app.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+
+async def _loop_lag(duration: float, interval: float = 0.01) -> List[float]:
+    lags = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        scheduled = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - scheduled - interval)
+    return lags
+
+
+async def run(args) -> dict:
+    os.environ["WS_HEARTBEAT_SECONDS"] = str(args.heartbeat)
+    import realtime
+    realtime.WS_HEARTBEAT_SECONDS = args.heartbeat
+
+    from beanie import PydanticObjectId
+
+    from auth import create_access_token
+    from main import app
+    from models import Family, User
+    from pubsub import family_channel, get_broker
+
+    client = mongo_client(args)
+    async with running_app(client, args.db):
+        tokens, family_ids = [], []
+        for i in range(args.families):
+            family_id, parent_id = PydanticObjectId(), PydanticObjectId()
+            await Family(id=family_id, parent_id=parent_id).insert()
+            await User(id=parent_id, email=f"ws{i}@bench.example", hashed_password="x", role="parent", family_id=family_id).insert()
+            tokens.append(create_access_token({"sub": f"ws{i}@bench.example"}))
+            family_ids.append(family_id)
+
+        baseline_rss = rss_mb()
+        clients, connect_latencies = [], []
+        started = time.perf_counter()
+        for i in range(args.connections):
+            ws = WebSocketClient(app, f"token={tokens[i % args.families]}")
+            t0 = time.perf_counter()
+            if not await ws.connect():
+                raise RuntimeError(f"connection {i} rejected with code {ws.close_code}")
+            connect_latencies.append(time.perf_counter() - t0)
+            clients.append(ws)
+        connect_total = time.perf_counter() - started
+        rss_per_connection_kb = (rss_mb() - baseline_rss) * 1024 / args.connections
+
+        # Idle period: only heartbeats are flowing
+        lags = await _loop_lag(args.idle_seconds)
+        pings = sum(ws.received.qsize() for ws in clients)
+        for ws in clients:
+            while not ws.received.empty():
+                ws.received.get_nowait()
+
+        broker = get_broker()
+        frame = json.dumps({"type": "message", "message": {"content": "bench"}})
+        published = time.perf_counter()
+        delivered = 0
+        for family_id in family_ids:
+            delivered += await broker.publish(family_channel(family_id), frame)
+        publish_total = time.perf_counter() - published
+        delivery_latencies = []
+        for ws in clients:
+            while True:
+                received_at, text = await asyncio.wait_for(ws.received.get(), 30)
+                if text == frame:
+                    delivery_latencies.append(received_at - published)
+                    break
+
+        stats = broker.stats()
+        await asyncio.gather(*(ws.disconnect() for ws in clients))
+
+    return {
+        "connections": args.connections,
+        "families": args.families,
+        "connect_total_s": round(connect_total, 3),
+        "connect": summarize(connect_latencies),
+        "rss_per_connection_kb": round(rss_per_connection_kb, 2),
+        "idle_seconds": args.idle_seconds,
+        "heartbeat_seconds": args.heartbeat,
+        "heartbeats_sent": pings,
+        "idle_loop_lag": summarize(lags),
+        "fanout_publish_total_ms": round(publish_total * 1000, 3),
+        "fanout_delivered": delivered,
+        "fanout_delivery": summarize(delivery_latencies),
+        "broker": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_mongo_args(parser, "emma_bench_ws_idle")
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--families", type=int, default=500)
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--heartbeat", type=float, default=1.0, help="seconds; production default is 25")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from dotenv import load_dotenv
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", 300))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire after a TTL.
+
+    Not thread-safe; it is only touched from the event loop.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        if self._data.pop(key, _MISSING) is not _MISSING:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self.invalidations += len(self._data)
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Authenticated users keyed by token subject (email), and decoded JWT payloads
+# keyed by the raw token. Token entries never outlive the token's own "exp".
+principal_cache = TTLCache("principal", maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+token_cache = TTLCache("token", maxsize=TOKEN_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Assembled dashboard payloads. Entries are tagged with the content version
+# they were built from; bumping the version (any milestone/tip write in this
+# process or, under serve.py, a sibling worker) makes them stale immediately,
+# the TTL covers writes made elsewhere.
+dashboard_cache = TTLCache("dashboard", maxsize=16, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+_dashboard_version = 0
+
+# Called with (kind, key) for every invalidation made in this process, to pass
+# it on to the other workers (cachebus.py); None when running alone
+_invalidation_listener: Optional[Callable[[str, Optional[str]], None]] = None
+
+
+def set_invalidation_listener(listener: Optional[Callable[[str, Optional[str]], None]]) -> None:
+    global _invalidation_listener
+    _invalidation_listener = listener
+
+
+def apply_invalidation(kind: str, key: Optional[str] = None) -> None:
+    """Drop the entries an invalidation covers, in this process only."""
+    global _dashboard_version
+    if kind == "principal":
+        principal_cache.invalidate(key)
+    elif kind == "dashboard":
+        _dashboard_version += 1
+        dashboard_cache.clear()
+
+
+def _invalidate(kind: str, key: Optional[str] = None) -> None:
+    apply_invalidation(kind, key)
+    if _invalidation_listener is not None:
+        _invalidation_listener(kind, key)
+
+
+def invalidate_principal(email: str) -> None:
+    _invalidate("principal", email)
+
+
+def dashboard_version() -> int:
+    return _dashboard_version
+
+
+def invalidate_dashboard() -> None:
+    _invalidate("dashboard")
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        principal_cache.name: principal_cache.stats(),
+        token_cache.name: token_cache.stats(),
+        dashboard_cache.name: dashboard_cache.stats(),
+    }
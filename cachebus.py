@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import socket
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import orjson
+from dotenv import load_dotenv
+
+from cache import apply_invalidation, set_invalidation_listener
+from pubsub import apply_publish, set_publish_listener
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# Directory shared by the worker processes of one server; serve.py creates it
+# and sets this for its workers. Unset (a single process): nothing to share.
+CACHE_BUS_DIR = os.getenv("CACHE_BUS_DIR")
+
+# Largest datagram read; a chat message bigger than the socket's send buffer
+# (about 200 KB on Linux) can't be sent at all and is counted as dropped
+MAX_DATAGRAM_BYTES = 256 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBus:
+    """Passes cache invalidations and chat pub/sub messages between the worker processes on this host.
+
+    Each process binds a Unix datagram socket in `directory` named after its
+    pid, and sends every invalidation it makes, and every message its
+    in-process broker publishes, to all the other sockets there. Sends never
+    block: a datagram a busy worker has no room for is dropped and counted.
+    For an invalidation that worker's entries fall back to expiring by TTL;
+    for a chat message its WebSocket subscribers miss it live and get it when
+    they backfill from /api/chat/history. Workers on other hosts are not
+    reached either.
+    """
+
+    def __init__(self, directory: Optional[str] = CACHE_BUS_DIR):
+        self.directory = Path(directory) if directory else None
+        self.path: Optional[Path] = None
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        self._socket: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> None:
+        if self._socket is not None or self.directory is None or not hasattr(socket, "AF_UNIX"):
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{os.getpid()}.sock"
+        self.path.unlink(missing_ok=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind(str(self.path))
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._socket.fileno(), self._receive)
+        set_invalidation_listener(self.publish)
+        set_publish_listener(self.forward)
+
+    def publish(self, kind: str, key: Optional[str] = None) -> None:
+        """Send a cache invalidation to the other workers."""
+        self._send(["cache", kind, key])
+
+    def forward(self, channel: str, message: str) -> None:
+        """Send a chat pub/sub message to the other workers' subscribers."""
+        self._send(["pubsub", channel, message])
+
+    def _send(self, payload: list) -> None:
+        if self._socket is None:
+            return
+        data = orjson.dumps(payload)
+        for peer in self.directory.glob("*.sock"):
+            if peer == self.path:
+                continue
+            try:
+                self._socket.sendto(data, str(peer))
+                self.sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # A worker that exited without cleaning up
+                peer.unlink(missing_ok=True)
+            except (BlockingIOError, OSError):
+                self.dropped += 1
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                data = self._socket.recv(MAX_DATAGRAM_BYTES)
+            except (BlockingIOError, OSError):
+                return
+            try:
+                topic, name, value = orjson.loads(data)
+            except (orjson.JSONDecodeError, ValueError):
+                continue
+            # Applied locally only, so it is not sent on again
+            if topic == "cache":
+                apply_invalidation(name, value)
+            elif topic == "pubsub":
+                apply_publish(name, value)
+            else:
+                continue
+            self.received += 1
+
+    def stop(self) -> None:
+        if self._socket is None:
+            return
+        set_invalidation_listener(None)
+        set_publish_listener(None)
+        self._loop.remove_reader(self._socket.fileno())
+        self._socket.close()
+        self._socket = None
+        self.path.unlink(missing_ok=True)
+
+    def peers(self) -> int:
+        if self._socket is None:
+            return 0
+        return sum(1 for peer in self.directory.glob("*.sock") if peer != self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._socket is not None,
+            "peers": self.peers(),
+            "sent": self.sent,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+
+cache_bus = CacheBus()
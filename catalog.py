@@ -0,0 +1,133 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from models import College
+from schemas import CollegeMatch
+
+# Bucket edges for facet counts; the last edge is an exclusive upper bound
+TUITION_BUCKETS = [0, 20_000, 40_000, 60_000, 80_000, 1_000_000_000]
+ACCEPTANCE_RATE_BUCKETS = [0, 10, 25, 50, 75, 100.01]
+
+# Each is an index walked forwards or backwards (the unique name index, or
+# College's sort_tuition / sort_acceptance_rate), so no sort is done in memory.
+# The _id tie-break follows the main key's direction for the same reason.
+SORTS = {
+    "name": [("name", 1)],
+    "tuition": [("tuition_usd", 1), ("_id", 1)],
+    "-tuition": [("tuition_usd", -1), ("_id", -1)],
+    "acceptance_rate": [("acceptance_rate_pct", 1), ("_id", 1)],
+    "-acceptance_rate": [("acceptance_rate_pct", -1), ("_id", -1)],
+}
+
+MAX_PAGE_SIZE = 100
+
+# CollegeMatch's wire keys (its aliases), i.e. the stored field names
+COLLEGE_FIELDS = tuple(field.alias or name for name, field in CollegeMatch.model_fields.items())
+
+
+def college_payload(doc: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+    """A stored college document (or model_dump(by_alias=True)) in CollegeMatch's wire format."""
+    payload = {key: doc.get(key) for key in COLLEGE_FIELDS}
+    payload.update(extra)
+    return payload
+
+
+def _range(minimum: Optional[float], maximum: Optional[float]) -> Optional[Dict[str, float]]:
+    bounds = {}
+    if minimum is not None:
+        bounds["$gte"] = minimum
+    if maximum is not None:
+        bounds["$lte"] = maximum
+    return bounds or None
+
+
+def build_filter(
+    min_tuition: Optional[int] = None,
+    max_tuition: Optional[int] = None,
+    min_acceptance_rate: Optional[float] = None,
+    max_acceptance_rate: Optional[float] = None,
+) -> Dict[str, Any]:
+    query = {}
+    tuition = _range(min_tuition, max_tuition)
+    if tuition:
+        query["tuition_usd"] = tuition
+    acceptance = _range(min_acceptance_rate, max_acceptance_rate)
+    if acceptance:
+        query["acceptance_rate_pct"] = acceptance
+    return query
+
+
+def _bucket_stage(field: str, boundaries: List[float]) -> List[Dict[str, Any]]:
+    # Nulls are mapped below the first edge so they land in the "unknown" bucket
+    group_by = {"$ifNull": [f"${field}", -1]}
+    return [{"$bucket": {"groupBy": group_by, "boundaries": boundaries, "default": "unknown", "output": {"count": {"$sum": 1}}}}]
+
+
+def _facet_buckets(rows: List[Dict[str, Any]], boundaries: List[float]) -> List[Dict[str, Any]]:
+    buckets = []
+    for row in rows:
+        if row["_id"] == "unknown":
+            buckets.append({"min": None, "max": None, "count": row["count"]})
+        else:
+            upper = boundaries[boundaries.index(row["_id"]) + 1]
+            buckets.append({"min": float(row["_id"]), "max": float(upper), "count": row["count"]})
+    return buckets
+
+
+async def query_colleges(
+    query: Dict[str, Any],
+    sort: str = "name",
+    page: int = 1,
+    page_size: int = 20,
+) -> Dict[str, Any]:
+    """One page of colleges plus total and facet counts.
+
+    The page is a plain find: stages inside a $facet can't use an index, so
+    sorting there would sort every match in memory on each request. The
+    find walks the sort's index instead (see SORTS) and stops after the
+    page, and runs concurrently with one aggregation for the total and
+    facets. Returns CollegeQueryResponse's wire format, ready for
+    TrustedJSONResponse.
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    projection = {key: 1 for key in COLLEGE_FIELDS if key not in ("_id", "fit_score")}
+    items = (
+        College.get_motor_collection()
+        .find(query, projection)
+        .sort(SORTS[sort])
+        .skip((page - 1) * page_size)
+        .limit(page_size)
+    )
+    pipeline = [
+        {"$match": query},
+        {
+            "$facet": {
+                "total": [{"$count": "count"}],
+                "tuition_usd": _bucket_stage("tuition_usd", TUITION_BUCKETS),
+                "acceptance_rate_pct": _bucket_stage("acceptance_rate_pct", ACCEPTANCE_RATE_BUCKETS),
+            }
+        },
+    ]
+    docs, facets = await asyncio.gather(items.to_list(page_size), College.aggregate(pipeline).to_list())
+    result = facets[0]
+    total = result["total"][0]["count"] if result["total"] else 0
+
+    return {
+        "items": [college_payload(doc) for doc in docs],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "facets": {
+            "tuition_usd": _facet_buckets(result["tuition_usd"], TUITION_BUCKETS),
+            "acceptance_rate_pct": _facet_buckets(result["acceptance_rate_pct"], ACCEPTANCE_RATE_BUCKETS),
+        },
+    }
+
+
+async def backfill_numeric_fields() -> int:
+    """Derive the numeric fields for colleges written before they existed."""
+    updated = 0
+    async for college in College.find({"tuition_usd": {"$exists": False}}):
+        await college.save()
+        updated += 1
+    return updated
@@ -0,0 +1,227 @@
+import base64
+import binascii
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+
+from chat_store import get_chat_store, truncate_to_millis
+from jobs import PermanentJobError, job_handler
+from llm import LLMProvider, Prompt, get_llm_provider
+from memory import load_memory, prompt_context, remember
+from metrics import span_duration
+from models import ChatMessage, ConversationMemory, Job, User
+from pubsub import family_channel, get_broker
+from responses import dumps
+from schemas import ChatMessageCreate
+
+DEFAULT_HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 200
+
+
+SYSTEM_PROMPT = (
+    "You are Emma, a warm and knowledgeable college admissions advisor. "
+    "You are talking with a family (a parent and a student) about college planning."
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(message: ChatMessage) -> str:
+    ts = truncate_to_millis(message.timestamp)
+    raw = f"{ts.isoformat()}|{message.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, PydanticObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts_raw, id_raw = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(ts_raw), PydanticObjectId(id_raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidId) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def message_payload(message: ChatMessage) -> Dict[str, Any]:
+    """ChatMessageResponse's wire format, built straight from the document.
+
+    For TrustedJSONResponse: the document is already validated, so there is no
+    need to build (and have FastAPI re-validate) a ChatMessageResponse per message.
+    """
+    return {
+        "_id": message.id,
+        "sender_role": message.sender_role,
+        "content": message.content,
+        "timestamp": message.timestamp,
+        "cursor": encode_cursor(message),
+    }
+
+
+async def fetch_history(
+    family_id: PydanticObjectId,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: int = DEFAULT_HISTORY_LIMIT,
+) -> List[ChatMessage]:
+    """One page of a family's chat history, always returned oldest-first.
+
+    - no cursor: the newest `limit` messages
+    - `before`: the `limit` messages immediately older than the cursor
+    - `after`:  the `limit` messages immediately newer than the cursor
+    - `since`:  messages newer than a timestamp (polling for deltas)
+
+    The same for either storage layout; see chat_store for how each serves it.
+    """
+    limit = max(1, min(limit, MAX_HISTORY_LIMIT))
+    if since is not None and since.tzinfo is not None:
+        # Stored timestamps are naive UTC; an aware one can't be compared with them
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return await get_chat_store().find(
+        family_id,
+        limit,
+        before=decode_cursor(before) if before is not None else None,
+        after=decode_cursor(after) if after is not None else None,
+        since=since,
+    )
+
+
+def build_prompt(content: str, memory: Optional[ConversationMemory] = None) -> Prompt:
+    """System prompt, then the family's summary and recent turns, then the new message.
+
+    Bounded by the memory settings no matter how long the conversation is.
+    """
+    context = prompt_context(memory) if memory is not None else []
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *context,
+        {"role": "user", "content": content},
+    ]
+
+
+async def save_user_message(user: User, message: ChatMessageCreate) -> ChatMessage:
+    user_msg = ChatMessage(
+        family_id=user.family_id,
+        sender_id=user.id,
+        sender_role=user.role,
+        content=message.content,
+        metadata=message.metadata,
+    )
+    await get_chat_store().insert(user_msg)
+    await publish_message(user_msg)
+    return user_msg
+
+
+async def save_ai_message(
+    family_id: PydanticObjectId,
+    content: str,
+    metadata: Optional[dict] = None,
+    message_id: Optional[PydanticObjectId] = None,
+) -> ChatMessage:
+    ai_msg = ChatMessage(
+        id=message_id,
+        family_id=family_id,
+        sender_role="ai",
+        content=content,
+        metadata=metadata or {},
+    )
+    await get_chat_store().insert(ai_msg)
+    await publish_message(ai_msg)
+    return ai_msg
+
+
+async def publish_message(message: ChatMessage) -> None:
+    """Push a persisted message to the family's live subscribers (/ws/chat).
+
+    Encoded once here, however many members are connected. A broker failure
+    is logged and otherwise ignored: the message is already stored, and
+    clients pick it up from /api/chat/history when they reconnect.
+    """
+    frame = dumps({"type": "message", "message": message_payload(message)}).decode()
+    try:
+        await get_broker().publish(family_channel(message.family_id), frame)
+    except Exception:
+        logger.exception("Failed to publish chat message", extra={"family_id": str(message.family_id)})
+
+
+class GenerationTiming:
+    """Time-to-first-token and total generation time for one LLM reply."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def mark_token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+        span_duration.observe((self.first_token or self.finished) - self.started, span="llm.first_token")
+        span_duration.observe(self.finished - self.started, span="llm.generation")
+
+    def as_metadata(self) -> dict:
+        finished = self.finished or time.perf_counter()
+        first_token = self.first_token or finished
+        return {
+            "ttft_ms": round((first_token - self.started) * 1000, 3),
+            "generation_ms": round((finished - self.started) * 1000, 3),
+        }
+
+
+async def stream_reply(provider: LLMProvider, prompt: Prompt, timing: GenerationTiming) -> AsyncIterator[str]:
+    async for chunk in provider.stream(prompt):
+        timing.mark_token()
+        yield chunk
+    timing.finish()
+
+
+async def collect_reply(provider: LLMProvider, prompt: Prompt) -> Tuple[str, GenerationTiming]:
+    timing = GenerationTiming()
+    content = "".join([chunk async for chunk in stream_reply(provider, prompt, timing)])
+    return content, timing
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+@job_handler("chat.reply")
+async def reply_job(job: Job) -> Dict[str, Any]:
+    """Generation step of POST /api/chat/async, run by the job queue.
+
+    The reply's id is fixed when the job is enqueued, so a retry (or a second
+    worker after a lease expiry) that finds it already stored returns it
+    instead of writing a second reply.
+    """
+    family_id = PydanticObjectId(job.payload["family_id"])
+    reply_id = PydanticObjectId(job.payload["reply_message_id"])
+    store = get_chat_store()
+    existing = await store.get(reply_id, family_id)
+    if existing is not None:
+        return {"message": message_payload(existing)}
+
+    user_msg = await store.get(PydanticObjectId(job.payload["user_message_id"]), family_id)
+    if user_msg is None:
+        raise PermanentJobError("User message no longer exists")
+
+    provider = get_llm_provider(cache=job.payload.get("cache", True))
+    content, timing = await collect_reply(provider, build_prompt(user_msg.content, await load_memory(family_id)))
+    try:
+        ai_msg = await save_ai_message(
+            family_id, content, {"provider": provider.name, "job_id": str(job.id), **timing.as_metadata()}, message_id=reply_id
+        )
+    except DuplicateKeyError:
+        return {"message": message_payload(await store.get(reply_id, family_id))}
+    await remember(family_id, [user_msg, ai_msg], provider)
+    return {"message": message_payload(ai_msg)}
@@ -0,0 +1,421 @@
+import asyncio
+import logging
+import os
+import time
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import bson
+from beanie import PydanticObjectId
+from dotenv import load_dotenv
+
+from metrics import REGISTRY, span
+from models import ChatArchive, ChatBucket, ChatMessage
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# How chat messages are stored:
+#   "documents" (default)  one chat_messages document, and index entry, per message
+#   "buckets"              packed into chat_buckets documents holding one family's
+#                          messages from one CHAT_BUCKET_SECONDS window, at most
+#                          CHAT_BUCKET_MAX_MESSAGES each; a new message is a $push
+#                          into an existing document and adds no index entries
+# Choose before any messages are stored: existing ones are not moved between layouts.
+CHAT_STORAGE = os.getenv("CHAT_STORAGE", "documents")
+# Buckets are read in window order, so keep the window fixed once buckets exist
+CHAT_BUCKET_SECONDS = int(os.getenv("CHAT_BUCKET_SECONDS", 86400))
+CHAT_BUCKET_MAX_MESSAGES = int(os.getenv("CHAT_BUCKET_MAX_MESSAGES", 200))
+# Buckets whose window ended more than CHAT_ARCHIVE_AFTER_DAYS ago are compressed
+# into chat_archive every CHAT_COMPACTION_INTERVAL_SECONDS (0 disables either).
+# History reads span both collections, so archiving is invisible to clients.
+CHAT_ARCHIVE_AFTER_DAYS = float(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", 90))
+CHAT_COMPACTION_INTERVAL_SECONDS = float(os.getenv("CHAT_COMPACTION_INTERVAL_SECONDS", 3600))
+CHAT_COMPACTION_BATCH = int(os.getenv("CHAT_COMPACTION_BATCH", 500))
+
+logger = logging.getLogger(__name__)
+
+archived_total = REGISTRY.counter("chat_archived_buckets_total", "Chat buckets moved to the compressed archive")
+
+# (timestamp, _id): the order history is paged in
+Key = Tuple[datetime, PydanticObjectId]
+
+_EPOCH = datetime(1970, 1, 1)
+_MAX_OBJECT_ID = PydanticObjectId("f" * 24)
+# Buckets fetched per round trip while paging; a page rarely spans more
+_READ_BATCH = 4
+# Messages per insert_many round trip in a bulk load
+_WRITE_BATCH = 10_000
+
+
+def truncate_to_millis(ts: datetime) -> datetime:
+    # Mongo stores datetimes with millisecond precision; cursors must match
+    # the stored value or the boundary message is skipped/duplicated.
+    return ts.replace(microsecond=ts.microsecond // 1000 * 1000)
+
+
+class ChatStore(ABC):
+    name = "base"
+
+    @abstractmethod
+    async def insert(self, message: ChatMessage) -> None:
+        """Persist a new message, assigning its id if it has none."""
+
+    async def insert_many(self, messages: Iterable[ChatMessage]) -> int:
+        """Bulk load (imports, benchmarks). Returns documents written."""
+        count = 0
+        for message in messages:
+            await self.insert(message)
+            count += 1
+        return count
+
+    @abstractmethod
+    async def get(self, message_id: PydanticObjectId, family_id: PydanticObjectId) -> Optional[ChatMessage]:
+        """One message by id, or None."""
+
+    @abstractmethod
+    async def delete(self, message: ChatMessage) -> None:
+        """Remove a message stored by insert()."""
+
+    @abstractmethod
+    async def find(
+        self,
+        family_id: PydanticObjectId,
+        limit: int,
+        before: Optional[Key] = None,
+        after: Optional[Key] = None,
+        since: Optional[datetime] = None,
+    ) -> List[ChatMessage]:
+        """One page of history, oldest-first.
+
+        The newest `limit` messages (older than `before`, if given), or with
+        `after`/`since` the oldest `limit` newer than that key or timestamp.
+        """
+
+    async def compact(self, now: Optional[datetime] = None) -> int:
+        """Move aged messages to cheaper storage; returns how many units were moved."""
+        return 0
+
+
+class DocumentStore(ChatStore):
+    """One ChatMessage document per message."""
+
+    name = "documents"
+
+    async def insert(self, message: ChatMessage) -> None:
+        await message.create()
+
+    async def insert_many(self, messages: Iterable[ChatMessage]) -> int:
+        messages = list(messages)
+        for offset in range(0, len(messages), _WRITE_BATCH):
+            await ChatMessage.insert_many(messages[offset:offset + _WRITE_BATCH])
+        return len(messages)
+
+    async def get(self, message_id: PydanticObjectId, family_id: PydanticObjectId) -> Optional[ChatMessage]:
+        return await ChatMessage.get(message_id)
+
+    async def delete(self, message: ChatMessage) -> None:
+        await message.delete()
+
+    async def find(self, family_id, limit, before=None, after=None, since=None) -> List[ChatMessage]:
+        # Every mode is a bounded range scan on the (family_id, timestamp, _id) index
+        query: Dict[str, Any] = {"family_id": family_id}
+        newest_first = True
+        if before is not None:
+            ts, oid = before
+            query["$or"] = [{"timestamp": {"$lt": ts}}, {"timestamp": ts, "_id": {"$lt": oid}}]
+        elif after is not None:
+            ts, oid = after
+            query["$or"] = [{"timestamp": {"$gt": ts}}, {"timestamp": ts, "_id": {"$gt": oid}}]
+            newest_first = False
+        elif since is not None:
+            query["timestamp"] = {"$gt": truncate_to_millis(since)}
+            newest_first = False
+
+        direction = -1 if newest_first else 1
+        messages = await (
+            ChatMessage.find(query)
+            .sort([("timestamp", direction), ("_id", direction)])
+            .limit(limit)
+            .to_list()
+        )
+        if newest_first:
+            messages.reverse()
+        return messages
+
+
+def _entry(message: ChatMessage) -> Dict[str, Any]:
+    return {
+        "_id": message.id,
+        "sender_id": message.sender_id,
+        "sender_role": message.sender_role,
+        "content": message.content,
+        "timestamp": message.timestamp,
+        "metadata": message.metadata,
+    }
+
+
+def _message(family_id: PydanticObjectId, entry: Dict[str, Any]) -> ChatMessage:
+    # Entries were validated on the way in; skip doing it again per message
+    return ChatMessage.model_construct(
+        id=entry["_id"],
+        family_id=family_id,
+        sender_id=entry.get("sender_id"),
+        sender_role=entry["sender_role"],
+        content=entry["content"],
+        timestamp=entry["timestamp"],
+        metadata=entry.get("metadata") or {},
+    )
+
+
+def _entries(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if "data" in doc:
+        return bson.decode(zlib.decompress(doc["data"]))["messages"]
+    return doc["messages"]
+
+
+class BucketStore(ChatStore):
+    """Messages packed into per-family, per-window ChatBucket documents.
+
+    Buckets past the archive age are compressed into ChatArchive documents
+    by compact(). Reads walk buckets in window order, newest or oldest first,
+    through the hot collection and then the archive, and stop as soon as the
+    next window cannot hold anything that would make the page.
+    """
+
+    name = "buckets"
+
+    def __init__(
+        self,
+        bucket_seconds: int = CHAT_BUCKET_SECONDS,
+        max_messages: int = CHAT_BUCKET_MAX_MESSAGES,
+        archive_after_days: float = CHAT_ARCHIVE_AFTER_DAYS,
+        compaction_batch: int = CHAT_COMPACTION_BATCH,
+    ):
+        self.bucket_seconds = bucket_seconds
+        self.max_messages = max_messages
+        self.archive_after = timedelta(days=archive_after_days) if archive_after_days > 0 else None
+        self.compaction_batch = compaction_batch
+
+    def _hot(self):
+        return ChatBucket.get_motor_collection()
+
+    def _archive(self):
+        return ChatArchive.get_motor_collection()
+
+    def window(self, ts: datetime) -> Tuple[datetime, datetime]:
+        seconds = int((ts - _EPOCH).total_seconds())
+        start = _EPOCH + timedelta(seconds=seconds - seconds % self.bucket_seconds)
+        return start, start + timedelta(seconds=self.bucket_seconds)
+
+    async def insert(self, message: ChatMessage) -> None:
+        message.id = message.id or PydanticObjectId()
+        message.timestamp = truncate_to_millis(message.timestamp)
+        start, end = self.window(message.timestamp)
+        # Appends to the window's open bucket; once it is full the filter stops
+        # matching and the upsert opens the next one
+        await self._hot().update_one(
+            {"family_id": message.family_id, "start": start, "size": {"$lt": self.max_messages}},
+            {"$push": {"messages": _entry(message)}, "$inc": {"size": 1}, "$setOnInsert": {"end": end}},
+            upsert=True,
+        )
+
+    async def insert_many(self, messages: Iterable[ChatMessage]) -> int:
+        """Bulk load (imports, benchmarks): writes full buckets directly. Returns buckets written."""
+        groups: Dict[Tuple[PydanticObjectId, datetime], List[ChatMessage]] = {}
+        for message in messages:
+            message.id = message.id or PydanticObjectId()
+            message.timestamp = truncate_to_millis(message.timestamp)
+            groups.setdefault((message.family_id, self.window(message.timestamp)[0]), []).append(message)
+
+        docs = []
+        for (family_id, start), group in groups.items():
+            group.sort(key=lambda m: (m.timestamp, m.id))
+            for offset in range(0, len(group), self.max_messages):
+                chunk = group[offset:offset + self.max_messages]
+                docs.append({
+                    "family_id": family_id,
+                    "start": start,
+                    "end": start + timedelta(seconds=self.bucket_seconds),
+                    "size": len(chunk),
+                    "messages": [_entry(m) for m in chunk],
+                })
+        for offset in range(0, len(docs), 1000):
+            await self._hot().insert_many(docs[offset:offset + 1000])
+        return len(docs)
+
+    async def get(self, message_id: PydanticObjectId, family_id: PydanticObjectId) -> Optional[ChatMessage]:
+        doc = await self._hot().find_one({"family_id": family_id, "messages._id": message_id})
+        if doc:
+            docs = [doc]
+        else:
+            # Archived messages can't be matched in the query. Ids are minted no
+            # later than their message is stored, so only windows from then on
+            # (less some slack for clock skew) need decompressing.
+            not_before = message_id.generation_time.replace(tzinfo=None) - timedelta(seconds=self.bucket_seconds + 300)
+            docs = await self._archive().find({"family_id": family_id, "start": {"$gt": not_before}}).to_list(None)
+        for doc in docs:
+            for entry in _entries(doc):
+                if entry["_id"] == message_id:
+                    return _message(family_id, entry)
+        return None
+
+    async def delete(self, message: ChatMessage) -> None:
+        start, _ = self.window(message.timestamp)
+        await self._hot().update_many(
+            {"family_id": message.family_id, "start": start, "messages._id": message.id},
+            {"$pull": {"messages": {"_id": message.id}}, "$inc": {"size": -1}},
+        )
+
+    async def find(self, family_id, limit, before=None, after=None, since=None) -> List[ChatMessage]:
+        if after is None and since is not None:
+            after = (truncate_to_millis(since), _MAX_OBJECT_ID)
+        newest_first = after is None
+        query: Dict[str, Any] = {"family_id": family_id}
+        if before is not None:
+            query["start"] = {"$lte": before[0]}
+        elif after is not None:
+            query["start"] = {"$gt": after[0] - timedelta(seconds=self.bucket_seconds)}
+
+        # Archived windows are all older than the hot ones
+        tiers = (self._hot(), self._archive()) if newest_first else (self._archive(), self._hot())
+        direction = -1 if newest_first else 1
+        # Keyed by _id: a retried write that was stored twice is returned once
+        page: Dict[PydanticObjectId, Dict[str, Any]] = {}
+        boundary: Optional[datetime] = None
+        done = False
+        for collection in tiers:
+            async for doc in collection.find(query).sort([("start", direction)]).batch_size(_READ_BATCH):
+                # With a full page, stop at the first window lying entirely beyond its last message
+                if boundary is not None and (doc["end"] <= boundary if newest_first else doc["start"] > boundary):
+                    done = True
+                    break
+                for entry in _entries(doc):
+                    key = (entry["timestamp"], entry["_id"])
+                    if (before is None or key < before) and (after is None or key > after):
+                        page[entry["_id"]] = entry
+                if len(page) >= limit:
+                    ordered = sorted(page.values(), key=lambda e: (e["timestamp"], e["_id"]), reverse=newest_first)[:limit]
+                    page = {e["_id"]: e for e in ordered}
+                    boundary = ordered[-1]["timestamp"]
+            if done:
+                break
+
+        entries = sorted(page.values(), key=lambda e: (e["timestamp"], e["_id"]))
+        entries = entries[-limit:] if newest_first else entries[:limit]
+        return [_message(family_id, entry) for entry in entries]
+
+    async def compact(self, now: Optional[datetime] = None) -> int:
+        """Archive up to compaction_batch buckets whose window ended before the cutoff."""
+        if self.archive_after is None:
+            return 0
+        cutoff = (now or datetime.utcnow()) - self.archive_after
+        moved = 0
+        with span("chat.compact"):
+            docs = await self._hot().find({"end": {"$lte": cutoff}}).limit(self.compaction_batch).to_list(None)
+            for doc in docs:
+                # Same _id in both collections, so a pass interrupted between the
+                # two writes (or one racing another instance) just redoes the copy
+                await self._archive().replace_one(
+                    {"_id": doc["_id"]},
+                    {
+                        "family_id": doc["family_id"],
+                        "start": doc["start"],
+                        "end": doc["end"],
+                        "size": doc["size"],
+                        "data": zlib.compress(bson.encode({"messages": doc["messages"]})),
+                    },
+                    upsert=True,
+                )
+                # Unless the bucket changed since it was read; then the next pass redoes it
+                result = await self._hot().delete_one({"_id": doc["_id"], "size": doc["size"]})
+                moved += result.deleted_count
+        archived_total.inc(moved)
+        return moved
+
+
+_STORES = {
+    "documents": DocumentStore,
+    "buckets": BucketStore,
+}
+
+_store: Optional[ChatStore] = None
+
+
+def get_chat_store() -> ChatStore:
+    global _store
+    if _store is None:
+        if CHAT_STORAGE not in _STORES:
+            raise ValueError(f"Unknown CHAT_STORAGE {CHAT_STORAGE!r}, expected one of {sorted(_STORES)}")
+        _store = _STORES[CHAT_STORAGE]()
+    return _store
+
+
+def set_chat_store(store: Optional[ChatStore]) -> None:
+    """Swap the process-wide store (tests, benchmarks)."""
+    global _store
+    _store = store
+
+
+class Compactor:
+    """Runs the chat store's compaction in the background.
+
+    Every instance runs its own; the copy-then-delete in compact() makes
+    overlapping passes safe, only redundant.
+    """
+
+    def __init__(self, interval: float = CHAT_COMPACTION_INTERVAL_SECONDS):
+        self.interval = interval
+        self.archived = 0
+        self.last_run_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        store = get_chat_store()
+        total = 0
+        # A full batch means there may be more waiting
+        while True:
+            moved = await store.compact()
+            total += moved
+            if not moved or moved < getattr(store, "compaction_batch", 0):
+                break
+        self.archived += total
+        self.last_run_at = time.time()
+        if total:
+            logger.info("Archived chat buckets", extra={"buckets": total})
+        return total
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Chat compaction failed")
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0 and get_chat_store().name == "buckets":
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "storage": get_chat_store().name,
+            "archived_buckets": self.archived,
+            "last_compaction_at": self.last_run_at,
+        }
+
+
+compactor = Compactor()
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from models import CohortStats, Family, User
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# Counter changes are buffered in-process and applied as one $inc every
+# COHORT_FLUSH_SECONDS, so chat traffic does not all land on one hot document.
+# Every COHORT_RECONCILE_SECONDS (0 disables) the counters are recomputed from
+# users and families, correcting whatever drift the increments accumulated.
+COHORT_FLUSH_SECONDS = float(os.getenv("COHORT_FLUSH_SECONDS", 5))
+COHORT_RECONCILE_SECONDS = float(os.getenv("COHORT_RECONCILE_SECONDS", 3600))
+
+# Everyone is in one cohort for now; the collection is keyed so that finer
+# cohorts (e.g. by graduation year) can be added alongside it
+DEFAULT_COHORT = "all"
+COUNTERS = ("parents", "students", "families", "families_with_student", "active_families", "messages")
+
+logger = logging.getLogger(__name__)
+
+
+def _collection():
+    return CohortStats.get_motor_collection()
+
+
+async def load_cohort_stats(cohort: str = DEFAULT_COHORT) -> Optional[CohortStats]:
+    """The cohort's counters: one _id lookup, None before the first reconciliation."""
+    doc = await _collection().find_one({"_id": cohort})
+    return CohortStats.model_validate(doc) if doc else None
+
+
+async def count_cohort_stats() -> Dict[str, int]:
+    """Recompute every counter from users and families: two full-collection aggregations."""
+    counts = dict.fromkeys(COUNTERS, 0)
+    async for row in User.get_motor_collection().aggregate([{"$group": {"_id": "$role", "n": {"$sum": 1}}}]):
+        if row["_id"] in ("parent", "student"):
+            counts[row["_id"] + "s"] = row["n"]
+    pipeline = [{"$group": {
+        "_id": None,
+        "families": {"$sum": 1},
+        "families_with_student": {"$sum": {"$cond": [{"$ifNull": ["$student_id", False]}, 1, 0]}},
+        "active_families": {"$sum": {"$cond": [{"$gt": [{"$ifNull": ["$memory.message_count", 0]}, 0]}, 1, 0]}},
+        "messages": {"$sum": {"$ifNull": ["$memory.message_count", 0]}},
+    }}]
+    async for row in Family.get_motor_collection().aggregate(pipeline):
+        counts.update({name: row[name] for name in COUNTERS if name in row})
+    return counts
+
+
+class CohortStatsMaintainer:
+    """Keeps the cohort_stats counters current.
+
+    Routes call record() once their write has committed; the deltas are
+    flushed in the background. Every instance reconciles on its own schedule;
+    the reconciliation is an idempotent $set, so overlapping runs are only
+    redundant. Increments flushed by other processes while an aggregation is
+    running can be counted twice or not at all until the next reconciliation.
+    """
+
+    def __init__(self, flush_interval: float = COHORT_FLUSH_SECONDS, reconcile_interval: float = COHORT_RECONCILE_SECONDS):
+        self.flush_interval = flush_interval
+        self.reconcile_interval = reconcile_interval
+        self.pending: Counter = Counter()
+        self.flushes = 0
+        self.reconciliations = 0
+        self.last_drift = 0
+        self.last_reconcile_at: Optional[float] = None
+        self._tasks = []
+
+    def record(self, **deltas: int) -> None:
+        self.pending.update(deltas)
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+        deltas, self.pending = self.pending, Counter()
+        try:
+            await _collection().update_one(
+                {"_id": DEFAULT_COHORT},
+                {"$inc": dict(deltas), "$set": {"updated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        except Exception:
+            # Keep the deltas for the next attempt
+            self.pending.update(deltas)
+            raise
+        self.flushes += 1
+
+    async def reconcile(self) -> Dict[str, int]:
+        # Anything recorded so far is already committed, so the aggregation
+        # sees it; only deltas recorded after this point remain to flush
+        self.pending.clear()
+        counts = await count_cohort_stats()
+        now = datetime.utcnow()
+        previous = await _collection().find_one_and_update(
+            {"_id": DEFAULT_COHORT},
+            {"$set": {**counts, "updated_at": now, "reconciled_at": now}},
+            upsert=True,
+        )
+        self.last_drift = sum(abs(counts[name] - (previous or {}).get(name, 0)) for name in COUNTERS)
+        self.reconciliations += 1
+        self.last_reconcile_at = time.time()
+        if self.last_drift:
+            logger.info("Reconciled cohort stats", extra={"drift": self.last_drift})
+        return counts
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Cohort stats flush failed")
+
+    async def _reconcile_loop(self):
+        # A fresh deployment has no counters yet: build them straight away
+        delay = self.reconcile_interval
+        try:
+            if await load_cohort_stats() is None:
+                delay = 0
+        except Exception:
+            logger.exception("Cohort stats lookup failed")
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.reconcile_interval
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.exception("Cohort stats reconciliation failed")
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        if self.flush_interval > 0:
+            self._tasks.append(asyncio.create_task(self._flush_loop()))
+        if self.reconcile_interval > 0:
+            self._tasks.append(asyncio.create_task(self._reconcile_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Cohort stats flush failed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_deltas": sum(abs(v) for v in self.pending.values()),
+            "flushes": self.flushes,
+            "reconciliations": self.reconciliations,
+            "last_drift": self.last_drift,
+            "last_reconcile_at": self.last_reconcile_at,
+        }
+
+
+cohort_stats = CohortStatsMaintainer()
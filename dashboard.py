@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+import orjson
+
+from cache import dashboard_cache, dashboard_version
+from cohort import load_cohort_stats
+from models import CohortStats, Milestone, Tip
+from schemas import FamilyHQData, SoulScanProfile, SupportCircle
+
+_CACHE_KEY = "default"
+
+# Placeholder SoulScan result shown until real profiles are collected
+DEFAULT_SOUL_SCAN_PROFILE = SoulScanProfile(
+    identity_traits=["Curious", "Analytical", "Creative", "Empathetic"],
+    learning_style=["Hands-on", "Collaborative", "Self-directed"],
+    motivations=["Impact", "Innovation", "Personal Growth"],
+    career_vibes=["Research", "Arts & Culture", "Social Impact"]
+)
+# Shown until the cohort has its first family
+DEFAULT_SUPPORT_CIRCLE = SupportCircle(
+    peer_progress_stats="85% of students in your cohort have started their essays.",
+    leaderboard_glimpse=["Top Essay Drafts: Alex C., Maya S.", "Most College Visits: Ben T., Chloe L."],
+    parent_board_preview="Discussion: 'Navigating financial aid forms.'",
+    student_board_preview="Poll: 'What's your biggest college application stress?'"
+)
+
+
+def _percent(part: int, whole: int) -> int:
+    return round(100 * part / whole) if whole else 0
+
+
+def support_circle(stats: Optional[CohortStats]) -> SupportCircle:
+    """SupportCircle from the materialized cohort counters, the placeholder before there are any."""
+    if stats is None or stats.families <= 0:
+        return DEFAULT_SUPPORT_CIRCLE
+    return SupportCircle(
+        peer_progress_stats=f"{_percent(stats.active_families, stats.families)}% of families in your cohort have started planning with Emma.",
+        leaderboard_glimpse=[
+            f"Families in your cohort: {stats.families:,}",
+            f"Students who have joined their family: {_percent(stats.families_with_student, stats.families)}%",
+            f"Questions answered by Emma: {stats.messages // 2:,}",
+        ],
+        parent_board_preview=DEFAULT_SUPPORT_CIRCLE.parent_board_preview,
+        student_board_preview=DEFAULT_SUPPORT_CIRCLE.student_board_preview,
+    )
+
+
+# The constant sections serialized once at import; only the milestone and tip
+# lists are encoded per rebuild. Key order follows FamilyHQData.
+_SOUL_SCAN_JSON = orjson.dumps(DEFAULT_SOUL_SCAN_PROFILE.model_dump(mode="json"))
+_SUPPORT_CIRCLE_JSON = orjson.dumps(DEFAULT_SUPPORT_CIRCLE.model_dump(mode="json"))
+_rebuild_lock = asyncio.Lock()
+
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    version: int
+    data: FamilyHQData
+    body: bytes
+    etag: str
+
+
+async def build_dashboard_data() -> FamilyHQData:
+    # Fetch milestones
+    milestones = await Milestone.find(Milestone.is_default == True).to_list()
+    monthly_focus = [m.text for m in milestones]
+
+    # Fetch tips
+    tips = await Tip.find_all().to_list()
+    insider_tips = [t.text for t in tips]
+
+    # Cohort progress: a single _id lookup, however many users there are
+    circle = support_circle(await load_cohort_stats())
+
+    # Mock/Profile data for the rest: shared constant instances, which pydantic
+    # does not re-validate when nested
+    return FamilyHQData(
+        monthlyFocus=monthly_focus,
+        soulScanProfile=DEFAULT_SOUL_SCAN_PROFILE,
+        supportCircle=circle,
+        insiderTips=insider_tips
+    )
+
+
+def _section(value, default, encoded: bytes) -> bytes:
+    return encoded if value is default else orjson.dumps(value.model_dump(mode="json"))
+
+
+def _snapshot(version: int, data: FamilyHQData) -> DashboardSnapshot:
+    body = b"".join([
+        b'{"monthlyFocus":', orjson.dumps(data.monthlyFocus),
+        b',"soulScanProfile":', _section(data.soulScanProfile, DEFAULT_SOUL_SCAN_PROFILE, _SOUL_SCAN_JSON),
+        b',"supportCircle":', _section(data.supportCircle, DEFAULT_SUPPORT_CIRCLE, _SUPPORT_CIRCLE_JSON),
+        b',"insiderTips":', orjson.dumps(data.insiderTips),
+        b"}",
+    ])
+    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+    return DashboardSnapshot(version=version, data=data, body=body, etag=etag)
+
+
+def _cached(version: int) -> Optional[DashboardSnapshot]:
+    snapshot = dashboard_cache.get(_CACHE_KEY)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    return None
+
+
+async def get_dashboard_snapshot() -> DashboardSnapshot:
+    """Read-through cache for the dashboard payload, serialized once per version."""
+    version = dashboard_version()
+    snapshot = _cached(version)
+    if snapshot is not None:
+        return snapshot
+
+    # Only one request rebuilds; the rest wait and reuse its result
+    async with _rebuild_lock:
+        version = dashboard_version()
+        snapshot = _cached(version)
+        if snapshot is None:
+            snapshot = _snapshot(version, await build_dashboard_data())
+            dashboard_cache.set(_CACHE_KEY, snapshot)
+        return snapshot
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as required for If-None-Match
+    return "*" in candidates or etag in (c[2:] if c.startswith("W/") else c for c in candidates)
@@ -1,33 +1,306 @@
+import asyncio
+import logging
 import os
+import socket
+import time
+import uuid
 import certifi
+from contextlib import asynccontextmanager
 from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, monitoring
+from pymongo.errors import DuplicateKeyError
+from metrics import MongoCommandTimer
 from dotenv import load_dotenv
 
 # Load .env from the same directory as this file
 env_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-# Mask the password in logs
-if DATABASE_URL:
-    masked_url = DATABASE_URL.split('@')[-1] if '@' in DATABASE_URL else "..."
-    print(f'database url target === ...@{masked_url}')
-else:
-    # Default to local mongodb if not set
-    DATABASE_URL = "mongodb://localhost:27017"
-    print("DATABASE_URL not set, using default local connection.")
-
-
-# Use certifi for valid SSL certificates (The Robust Fix)
-# tlsAllowInvalidCertificates caused internal errors, so we use proper CAs now.
-# However, for debugging Render connection issues, we can try to be more permissive if needed
-# but usually this error is due to IP Whitelisting on Atlas.
-client = AsyncIOMotorClient(
-    DATABASE_URL,
-    tls=True,
-    tlsCAFile=certifi.where(),
-    serverSelectionTimeoutMS=5000,
-    # tlsAllowInvalidCertificates=True # Uncomment this if you suspect certificate issues, but it's unsafe for prod
-)
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+# Default to local mongodb if not set
+DATABASE_URL = os.getenv("DATABASE_URL") or "mongodb://localhost:27017"
+
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "emma_advisor_db")
+# "true"/"false"; unset means TLS for anything that isn't a local mongod
+MONGO_TLS = os.getenv("MONGO_TLS")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 0)) or None
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS")  # e.g. "zstd,snappy,zlib"
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+# Connections opened on startup so the first requests don't pay for the handshake
+MONGO_WARMUP_CONNECTIONS = int(os.getenv("MONGO_WARMUP_CONNECTIONS", max(MONGO_MIN_POOL_SIZE, 1)))
+HEALTHCHECK_INTERVAL_SECONDS = float(os.getenv("HEALTHCHECK_INTERVAL_SECONDS", 10))
+
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "mongo", "mongodb"}
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters, fed by the driver's CMAP events."""
+
+    def __init__(self):
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.pools_cleared = 0
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def pool_cleared(self, event):
+        self.pools_cleared += 1
+
+    def connection_created(self, event):
+        self.created += 1
+
+    def connection_closed(self, event):
+        self.closed += 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+        self.checkouts += 1
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "open_connections": self.created - self.closed,
+            "in_use": self.checked_out,
+            "checkouts_total": self.checkouts,
+            "checkout_failures_total": self.checkout_failures,
+            "pool_clears_total": self.pools_cleared,
+        }
+
+
+pool_stats = PoolStats()
+client: Optional[AsyncIOMotorClient] = None
+# Clients installed with use_client() belong to the caller and outlive close()
+_owns_client = False
+
+
+def _tls_default(url: str) -> bool:
+    if url.startswith("mongodb+srv://"):
+        return True
+    host = (urlsplit(url).hostname or "").lower()
+    return host not in _LOCAL_HOSTS
+
+
+def create_client(url: str = DATABASE_URL) -> AsyncIOMotorClient:
+    tls = MONGO_TLS.lower() in ("1", "true", "yes") if MONGO_TLS else _tls_default(url)
+    options: Dict[str, Any] = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "readPreference": MONGO_READ_PREFERENCE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [pool_stats, MongoCommandTimer()],
+        "tls": tls,
+    }
+    if MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = MONGO_MAX_IDLE_TIME_MS
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    if tls:
+        # Use certifi for valid SSL certificates. Connection errors against
+        # Atlas are usually IP whitelisting, not certificates.
+        options["tlsCAFile"] = certifi.where()
+    return AsyncIOMotorClient(url, **options)
+
+
+def use_client(new_client) -> None:
+    """Install an already-built client (tests, benchmarks, mongomock) before connect()."""
+    global client, _owns_client
+    client = new_client
+    _owns_client = False
+
+
+def get_client() -> AsyncIOMotorClient:
+    if client is None:
+        raise RuntimeError("Database client is not connected; call database.connect() first")
+    return client
+
+
+def get_database():
+    return get_client()[MONGO_DB_NAME]
+
+
+async def connect() -> AsyncIOMotorClient:
+    """Create the client (unless one was installed) and warm up the pool."""
+    global client, _owns_client
+    if client is None:
+        # Mask the password in logs
+        masked_url = DATABASE_URL.split('@')[-1] if '@' in DATABASE_URL else DATABASE_URL
+        logger.info("Connecting to database", extra={"target": f"...@{masked_url}"})
+        client = create_client()
+        _owns_client = True
+    try:
+        # Concurrent pings force several connections open at once
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(MONGO_WARMUP_CONNECTIONS)))
+    except Exception as e:
+        logger.warning("Database warm-up failed: %s", e)
+    return client
+
+
+async def close() -> None:
+    global client, _owns_client
+    if client is not None and _owns_client:
+        client.close()
+        client = None
+        _owns_client = False
+    _transactions_supported.clear()
+
+
+class HealthMonitor:
+    """Pings the database in the background; /healthz reports the cached result."""
+
+    def __init__(self, interval: float = HEALTHCHECK_INTERVAL_SECONDS):
+        self.interval = interval
+        self.state: Dict[str, Any] = {"status": "unknown", "checked_at": None}
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            await get_client().admin.command("ping")
+            self.state = {
+                "status": "connected",
+                "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+                "checked_at": time.time(),
+            }
+        except Exception as e:
+            self.state = {"status": f"disconnected: {e}", "checked_at": time.time()}
+        return self.state
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+health_monitor = HealthMonitor()
+
+
+_transactions_supported = {}
+
+async def supports_transactions(client) -> bool:
+    """Multi-document transactions need a replica set or sharded cluster."""
+    key = id(client)
+    if key not in _transactions_supported:
+        try:
+            hello = await client.admin.command("hello")
+            _transactions_supported[key] = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions_supported[key] = False
+    return _transactions_supported[key]
+
+@asynccontextmanager
+async def transaction(client):
+    """Yield a session inside a transaction, or None when the deployment can't do them.
+
+    Callers pass the session to every write and must compensate by hand
+    when it is None.
+    """
+    if not await supports_transactions(client):
+        yield None
+        return
+    async with await client.start_session() as session:
+        async with session.start_transaction():
+            yield session
+
+
+class MongoLock:
+    """A named lease in the `locks` collection, held by at most one process at a time.
+
+    The lease runs out `ttl` seconds after it was last taken or renewed, so a
+    holder that dies only blocks the others until then. `held()` renews it in
+    the background for as long as the block runs.
+    """
+
+    def __init__(self, db, name: str, ttl: float = 60):
+        self.collection = db["locks"]
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self) -> Optional[Dict[str, Any]]:
+        """Take the lease if it is free or expired; returns the lock document, or None if someone else holds it."""
+        now = datetime.utcnow()
+        try:
+            # When the lease is held the filter misses and the upsert collides on _id
+            return await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"expires_at": None}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "acquired_at": now, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            return None
+
+    async def renew(self) -> bool:
+        result = await self.collection.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)}},
+        )
+        return result.modified_count == 1
+
+    async def record(self, **fields: Any) -> None:
+        """Store `fields` on the lock document, for whoever looks next; holder only."""
+        await self.collection.update_one({"_id": self.name, "owner": self.owner}, {"$set": fields})
+
+    async def release(self) -> None:
+        await self.collection.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {"$set": {"owner": None, "expires_at": None}},
+        )
+
+    async def read(self) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": self.name})
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if not await self.renew():
+                    logger.warning("Lost lock %s", self.name)
+                    return
+            except Exception:
+                logger.exception("Renewing lock %s failed", self.name)
+
+    @asynccontextmanager
+    async def held(self):
+        """Run the block with the lease renewed; the caller must have acquired it."""
+        renewer = asyncio.create_task(self._keep_alive())
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await self.release()
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from metrics import REGISTRY, span
+from models import Job
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# Mongo-backed job queue. Every app process runs JOB_WORKERS asyncio workers
+# (0 = enqueue only, e.g. for a web tier with separate worker processes).
+# A claimed job is leased for JOB_LEASE_SECONDS; if its worker dies the lease
+# runs out and another worker picks it up again, so handlers must be idempotent.
+# Failures are retried with exponential backoff (JOB_BACKOFF_SECONDS * 2^n,
+# capped at JOB_MAX_BACKOFF_SECONDS, plus jitter) up to max_attempts.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 120))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", 2.0))
+JOB_MAX_BACKOFF_SECONDS = float(os.getenv("JOB_MAX_BACKOFF_SECONDS", 300))
+
+logger = logging.getLogger(__name__)
+
+jobs_total = REGISTRY.counter("jobs_total", "Background job attempts by outcome", ["kind", "outcome"])
+
+Handler = Callable[[Job], Awaitable[Optional[Dict[str, Any]]]]
+_handlers: Dict[str, Handler] = {}
+
+
+def job_handler(kind: str):
+    """Register `fn(job) -> result dict` as the handler for jobs of `kind`."""
+    def register(fn: Handler) -> Handler:
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help; the job fails immediately."""
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), JOB_MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_SECONDS, lease_seconds: float = JOB_LEASE_SECONDS):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        idempotency_key: Optional[str] = None,
+        family_id: Optional[PydanticObjectId] = None,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        delay: float = 0.0,
+    ) -> Tuple[Job, bool]:
+        """Insert a job; returns (job, created).
+
+        With an idempotency key, enqueueing the same key again returns the
+        existing job (created=False) instead of adding a second one.
+        """
+        if kind not in _handlers:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        job = Job(
+            kind=kind,
+            payload=payload,
+            idempotency_key=idempotency_key,
+            family_id=family_id,
+            max_attempts=max_attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+        )
+        try:
+            await job.insert()
+        except DuplicateKeyError:
+            existing = await Job.find_one(Job.idempotency_key == idempotency_key)
+            if existing is None:
+                raise
+            return existing, False
+        # Local workers pick it up now rather than at their next poll
+        self._wakeup.set()
+        return job, True
+
+    async def claim(self) -> Optional[Job]:
+        """Atomically lease the next due job, including ones whose lease has expired."""
+        now = datetime.utcnow()
+        doc = await Job.get_motor_collection().find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "locked_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": self.worker_id,
+                    "locked_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return Job.model_validate(doc) if doc else None
+
+    async def run_one(self) -> bool:
+        """Claim and run a single job. Returns False when nothing was due."""
+        job = await self.claim()
+        if job is None:
+            return False
+        handler = _handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise PermanentJobError(f"No handler registered for job kind {job.kind!r}")
+            with span(f"job.{job.kind}"):
+                result = await handler(job)
+        except Exception as e:
+            await self._record_failure(job, e)
+        else:
+            await self._finish(job, {"status": "succeeded", "result": result or {}}, unset_error=True)
+            jobs_total.inc(kind=job.kind, outcome="succeeded")
+        self.processed += 1
+        return True
+
+    async def _record_failure(self, job: Job, error: Exception) -> None:
+        message = f"{type(error).__name__}: {error}"
+        if isinstance(error, PermanentJobError) or job.attempts >= job.max_attempts:
+            logger.error("Job failed", extra={"job_id": str(job.id), "kind": job.kind, "attempts": job.attempts, "error": message})
+            await self._finish(job, {"status": "failed", "error": message})
+            jobs_total.inc(kind=job.kind, outcome="failed")
+            self.failed += 1
+        else:
+            logger.warning("Job attempt failed, will retry", extra={"job_id": str(job.id), "kind": job.kind, "attempts": job.attempts, "error": message})
+            run_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(job.attempts))
+            await self._finish(job, {"status": "queued", "error": message, "run_at": run_at})
+            jobs_total.inc(kind=job.kind, outcome="retried")
+            self.retried += 1
+
+    async def _finish(self, job: Job, fields: Dict[str, Any], unset_error: bool = False) -> None:
+        # Conditional on still holding the lease: if it expired and another
+        # worker re-claimed the job, that worker's outcome wins
+        update: Dict[str, Any] = {
+            "$set": {**fields, "updated_at": datetime.utcnow()},
+            "$unset": {"locked_until": "", "worker_id": "", **({"error": ""} if unset_error else {})},
+        }
+        await Job.get_motor_collection().update_one(
+            {"_id": job.id, "worker_id": self.worker_id, "attempts": job.attempts},
+            update,
+        )
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                if await self.run_one():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Mongo unavailable and the like; back off and keep the worker alive
+                logger.exception("Job worker error", extra={"worker": index})
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._tasks or self.workers <= 0:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        # Jobs interrupted here keep their lease and are retried once it expires
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+def job_payload(job: Job) -> Dict[str, Any]:
+    """JobResponse's wire format, for TrustedJSONResponse."""
+    return {
+        "_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+job_queue = JobQueue()
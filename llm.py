@@ -0,0 +1,340 @@
+import asyncio
+import hashlib
+import json
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from cache import TTLCache
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# "stub" (default), "fake" or "openai"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "stub")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Import the provider's SDK in a worker thread once the app is serving,
+# instead of making the first chat request pay for it. "0" disables.
+LLM_WARMUP = os.getenv("LLM_WARMUP", "1") != "0"
+# Replies are cached by normalized prompt (system prompt, conversation memory
+# and message together), and identical prompts already being generated share
+# that one generation. Per-family memory keeps personal conversations apart;
+# a request can also opt out (ChatMessageCreate.cache=false).
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 1000))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 3600))
+# Longest a shared generation may run before it and everyone waiting on it
+# fail with a timeout. 0 disables.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 120))
+
+# Chat-style prompt: [{"role": "system" | "user" | "assistant", "content": "..."}]
+Prompt = List[Dict[str, str]]
+
+
+def _last_user_message(messages: Prompt) -> str:
+    for message in reversed(messages):
+        if message["role"] == "user":
+            return message["content"]
+    return ""
+
+
+def _word_tokens(text: str) -> List[str]:
+    # Split on spaces but keep them attached so joining the tokens is lossless
+    words = text.split(" ")
+    return [w + " " for w in words[:-1]] + [words[-1]]
+
+
+SUMMARY_PROMPT = (
+    "You maintain the running memory of a conversation between Emma, a college admissions "
+    "advisor, and a family. Merge the new messages into the existing summary. Keep names, "
+    "schools, deadlines, preferences and open questions; drop pleasantries. "
+    "Reply with the updated summary only, in at most {max_chars} characters."
+)
+
+
+def _extractive_summary(summary: str, transcript: Prompt, max_chars: int) -> str:
+    # First sentence of each message appended to the old summary, keeping the
+    # most recent max_chars. Deterministic and free, for the offline providers.
+    lines = [summary] if summary else []
+    for message in transcript:
+        first = message["content"].split(". ")[0][:160]
+        lines.append(f"{message['role']}: {first}")
+    return " | ".join(lines)[-max_chars:]
+
+
+class LLMProvider(ABC):
+    name = "base"
+
+    @abstractmethod
+    def stream(self, messages: Prompt) -> AsyncIterator[str]:
+        """Yield the reply as text chunks in generation order."""
+
+    async def complete(self, messages: Prompt) -> str:
+        return "".join([chunk async for chunk in self.stream(messages)])
+
+    async def summarize(self, summary: str, transcript: Prompt, max_chars: int) -> str:
+        """Fold `transcript` into `summary`, returning at most max_chars characters."""
+        existing = summary or "(empty)"
+        new_messages = "\n".join(f"{m['role']}: {m['content']}" for m in transcript)
+        reply = await self.complete([
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_chars=max_chars)},
+            {"role": "user", "content": f"Existing summary:\n{existing}\n\nNew messages:\n{new_messages}"},
+        ])
+        return reply.strip()[:max_chars]
+
+    def warm_up(self) -> None:
+        """Do slow one-off setup (SDK imports, clients). Safe to call from a thread."""
+
+
+class StubProvider(LLMProvider):
+    """The placeholder reply the prototype has always sent."""
+
+    name = "stub"
+
+    async def stream(self, messages: Prompt) -> AsyncIterator[str]:
+        content = _last_user_message(messages)
+        reply = f"I'm Emma, your AI advisor. I received your message: '{content}'. I'm currently running in stub mode, but I'm ready to be connected to OpenAI!"
+        for token in _word_tokens(reply):
+            yield token
+
+    async def summarize(self, summary: str, transcript: Prompt, max_chars: int) -> str:
+        return _extractive_summary(summary, transcript, max_chars)
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic provider for tests and benchmarks.
+
+    Replies are a pure function of the prompt, with optional per-token and
+    first-token delays to simulate model latency.
+    """
+
+    name = "fake"
+
+    def __init__(self, first_token_delay: float = 0.0, token_delay: float = 0.0):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.calls = 0
+        self.summaries = 0
+
+    async def stream(self, messages: Prompt) -> AsyncIterator[str]:
+        self.calls += 1
+        reply = f"Emma (fake) reply to: {_last_user_message(messages)}"
+        if self.first_token_delay:
+            await asyncio.sleep(self.first_token_delay)
+        for i, token in enumerate(_word_tokens(reply)):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+    async def summarize(self, summary: str, transcript: Prompt, max_chars: int) -> str:
+        self.summaries += 1
+        return _extractive_summary(summary, transcript, max_chars)
+
+
+class OpenAIProvider(LLMProvider):
+    # The openai SDK (and anything LangChain-based later) is only imported
+    # here, on first use, never at module import: it dominates cold start.
+    name = "openai"
+
+    def __init__(self, model: str = OPENAI_MODEL):
+        self.model = model
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI()
+        return self._client
+
+    def warm_up(self) -> None:
+        import openai  # noqa: F401  (populates sys.modules; the client is built on first call)
+
+    async def stream(self, messages: Prompt) -> AsyncIterator[str]:
+        response = await self._get_client().chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+        )
+        async for event in response:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+
+def prompt_key(provider: LLMProvider, messages: Prompt) -> str:
+    """Cache key: the provider and model, plus the prompt with case, runs of
+    whitespace and trailing punctuation normalized away."""
+    normalized = [(m["role"], " ".join(m["content"].casefold().split()).rstrip("?!. ")) for m in messages]
+    raw = json.dumps([provider.name, getattr(provider, "model", None), normalized])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _Flight:
+    """One upstream generation, replayable by every request waiting on it."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._wakeup = asyncio.Event()
+
+    def push(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def replay(self) -> AsyncIterator[str]:
+        sent = 0
+        while True:
+            while sent < len(self.chunks):
+                yield self.chunks[sent]
+                sent += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._wakeup.wait()
+
+
+class CachingProvider(LLMProvider):
+    """LRU + TTL reply cache with single-flight in front of another provider.
+
+    A miss starts the upstream stream in its own task; the request that
+    missed and any identical ones arriving meanwhile all replay its chunks
+    as they come. Running detached means a client that disconnects doesn't
+    cancel a generation others are waiting on, and the finished reply is
+    still cached for its retry. Failures are not cached. However the
+    generation ends (error, timeout, cancellation at shutdown), its flight
+    is finished so no waiter is left hanging.
+    """
+
+    def __init__(
+        self,
+        inner: LLMProvider,
+        maxsize: int = LLM_CACHE_SIZE,
+        ttl: float = LLM_CACHE_TTL_SECONDS,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+    ):
+        self.inner = inner
+        self.timeout = timeout or None
+        self.cache = TTLCache("llm", maxsize=maxsize, ttl=ttl)
+        self._flights: Dict[str, _Flight] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.coalesced = 0
+        self.upstream_calls = 0
+
+    @property
+    def name(self) -> str:
+        return self.inner.name
+
+    async def stream(self, messages: Prompt) -> AsyncIterator[str]:
+        key = prompt_key(self.inner, messages)
+        chunks = self.cache.get(key)
+        if chunks is not None:
+            for chunk in chunks:
+                yield chunk
+            return
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            task = asyncio.create_task(self._generate(key, flight, messages))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self.coalesced += 1
+        async for chunk in flight.replay():
+            yield chunk
+
+    async def _generate(self, key: str, flight: _Flight, messages: Prompt) -> None:
+        self.upstream_calls += 1
+
+        async def pump():
+            async for chunk in self.inner.stream(messages):
+                flight.push(chunk)
+
+        try:
+            await asyncio.wait_for(pump(), self.timeout)
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+            if flight.chunks:
+                self.cache.set(key, tuple(flight.chunks))
+        finally:
+            # Cancelled (or another BaseException): the waiters still need waking
+            if not flight.done:
+                flight.finish(RuntimeError("LLM generation was cancelled"))
+            self._flights.pop(key, None)
+
+    async def summarize(self, summary: str, transcript: Prompt, max_chars: int) -> str:
+        # Memory folds are unique to a family; nothing to share
+        return await self.inner.summarize(summary, transcript, max_chars)
+
+    def warm_up(self) -> None:
+        self.inner.warm_up()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "in_flight": len(self._flights),
+        }
+
+
+_PROVIDERS = {
+    "stub": StubProvider,
+    "fake": FakeProvider,
+    "openai": OpenAIProvider,
+}
+
+_provider: Optional[LLMProvider] = None
+_cached_provider: Optional[CachingProvider] = None
+
+
+def get_llm_provider(cache: bool = True) -> LLMProvider:
+    """The configured provider, behind the reply cache unless `cache` is False or LLM_CACHE_ENABLED is off."""
+    global _provider, _cached_provider
+    if _provider is None:
+        if LLM_PROVIDER not in _PROVIDERS:
+            raise ValueError(f"Unknown LLM_PROVIDER {LLM_PROVIDER!r}, expected one of {sorted(_PROVIDERS)}")
+        _provider = _PROVIDERS[LLM_PROVIDER]()
+    if not cache or not LLM_CACHE_ENABLED:
+        return _provider
+    if _cached_provider is None:
+        _cached_provider = CachingProvider(_provider)
+    return _cached_provider
+
+
+def set_llm_provider(provider: Optional[LLMProvider]) -> None:
+    """Swap the process-wide provider (tests, benchmarks)."""
+    global _provider, _cached_provider
+    _provider = provider
+    _cached_provider = None
+
+
+def llm_cache_stats() -> Dict[str, Any]:
+    if _cached_provider is None:
+        return {"enabled": LLM_CACHE_ENABLED}
+    return {"enabled": LLM_CACHE_ENABLED, **_cached_provider.stats()}
+
+
+async def warm_up_llm_provider() -> None:
+    if not LLM_WARMUP:
+        return
+    try:
+        await asyncio.to_thread(get_llm_provider().warm_up)
+    except Exception:
+        # Not fatal: the first chat request will retry the import and report it
+        pass
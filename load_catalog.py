@@ -0,0 +1,245 @@
+"""Stream a college catalog into Mongo with unordered bulk upserts.
+
+    python load_catalog.py colleges.jsonl
+    python load_catalog.py colleges.csv --chunk-size 2000
+    python load_catalog.py colleges.jsonl --resume      # continue after a crash
+
+Records are upserted by College.name, so re-running a file is a no-op and
+existing documents are never removed: there is no window where the
+collection is empty. Input is read one chunk at a time, so memory stays
+flat regardless of file size. Progress is checkpointed after every chunk
+to <input>.checkpoint; --resume skips the records already written.
+
+CSV columns match the College fields; rich_media_links may be a JSON list
+or "Type|url;Type|url".
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from beanie import init_beanie
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import database
+from models import DOCUMENT_MODELS, College
+
+DEFAULT_CHUNK_SIZE = 1000
+DUPLICATE_KEY = 11000
+# Key of the placeholder read_records yields for a line it can't parse, so
+# the line is still counted (and skipped on --resume) like any other record
+INVALID = "_invalid"
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_links(value: Any) -> List[Dict[str, str]]:
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    if value.lstrip().startswith("["):
+        return json.loads(value)
+    links = []
+    for part in value.split(";"):
+        link_type, _, url = part.partition("|")
+        links.append({"type": link_type.strip(), "url": url.strip() or "#"})
+    return links
+
+
+def read_records(path: Path, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    fmt = fmt or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                record = {k: v for k, v in row.items() if v not in (None, "")}
+                try:
+                    record["rich_media_links"] = _parse_links(record.get("rich_media_links"))
+                except ValueError as e:
+                    yield {INVALID: f"line {reader.line_num}: rich_media_links: {e}"}
+                    continue
+                yield record
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield {INVALID: f"line {line_number}: {e}"}
+                    continue
+                if not isinstance(record, dict):
+                    yield {INVALID: f"line {line_number}: expected an object, got {type(record).__name__}"}
+                    continue
+                yield record
+
+
+def chunked(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def to_upsert(college: College) -> UpdateOne:
+    doc = college.model_dump(exclude={"id", "revision_id"})
+    return UpdateOne({"name": college.name}, {"$set": doc}, upsert=True)
+
+
+class LoadStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.skipped_invalid = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "records": self.read,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "invalid": self.skipped_invalid,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 2),
+            "records_per_s": round(self.read / elapsed, 1) if elapsed else 0.0,
+            # ru_maxrss is KiB on Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+async def upsert_chunk(collection, records: List[Dict[str, Any]], stats: LoadStats) -> None:
+    operations = {}
+    for record in records:
+        if INVALID in record:
+            stats.skipped_invalid += 1
+            logger.warning("Skipping unreadable record at %s", record[INVALID])
+            continue
+        try:
+            # Validating through the model also derives the numeric fields
+            college = College.model_validate(record)
+        except (ValidationError, ValueError) as e:
+            stats.skipped_invalid += 1
+            logger.warning("Skipping invalid record %r: %s", record.get("name"), e)
+            continue
+        # Last occurrence of a name wins; two upserts of one new name in the
+        # same unordered batch would race on the unique index
+        operations[college.name] = to_upsert(college)
+    if not operations:
+        return
+
+    pending = list(operations.values())
+    for attempt in range(2):
+        try:
+            result = await collection.bulk_write(pending, ordered=False)
+            details = result.bulk_api_result
+            failed = []
+        except BulkWriteError as e:
+            details = e.details
+            # A concurrent loader inserted the same name first: the retry
+            # turns those inserts into updates
+            failed = [pending[err["index"]] for err in details["writeErrors"] if err["code"] == DUPLICATE_KEY]
+            stats.failed += len(details["writeErrors"]) - len(failed)
+            for err in details["writeErrors"]:
+                if err["code"] != DUPLICATE_KEY:
+                    logger.error("Failed to upsert college: %s", err.get("errmsg"))
+        stats.inserted += details["nUpserted"]
+        stats.updated += details["nModified"]
+        stats.unchanged += details["nMatched"] - details["nModified"]
+        if not failed:
+            return
+        pending = failed
+    stats.failed += len(pending)
+
+
+def _read_checkpoint(path: Path, source: Path) -> int:
+    if not path.exists():
+        return 0
+    state = json.loads(path.read_text())
+    if state.get("input") != str(source.resolve()):
+        raise SystemExit(f"Checkpoint {path} belongs to {state.get('input')}, not {source}")
+    return int(state["records_done"])
+
+
+def _write_checkpoint(path: Path, source: Path, records_done: int) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"input": str(source.resolve()), "records_done": records_done}))
+    os.replace(tmp, path)
+
+
+async def load(
+    source: Path,
+    fmt: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    resume: bool = False,
+    checkpoint: Optional[Path] = None,
+    progress_every: int = 10,
+) -> Dict[str, Any]:
+    """Load `source` into the colleges collection (Beanie must be initialized)."""
+    collection = College.get_motor_collection()
+    checkpoint = checkpoint or source.with_name(source.name + ".checkpoint")
+    skip = _read_checkpoint(checkpoint, source) if resume else 0
+    if skip:
+        logger.info("Resuming after %d records", skip)
+
+    stats = LoadStats()
+    records = read_records(source, fmt)
+    for _ in range(skip):
+        next(records, None)
+
+    done = skip
+    for i, chunk in enumerate(chunked(records, chunk_size), start=1):
+        await upsert_chunk(collection, chunk, stats)
+        stats.read += len(chunk)
+        done += len(chunk)
+        _write_checkpoint(checkpoint, source, done)
+        if i % progress_every == 0:
+            logger.info("Catalog load progress", extra={**stats.as_dict(), "records_done": done})
+
+    checkpoint.unlink(missing_ok=True)
+    summary = stats.as_dict()
+    logger.info("Catalog load finished", extra=summary)
+    return summary
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", type=Path)
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--resume", action="store_true", help="skip records recorded in the checkpoint")
+    parser.add_argument("--checkpoint", type=Path, help="default: <input>.checkpoint")
+    args = parser.parse_args()
+
+    await database.connect()
+    await init_beanie(database=database.get_database(), document_models=DOCUMENT_MODELS, skip_indexes=True)
+    try:
+        summary = await load(args.input, args.format, args.chunk_size, args.resume, args.checkpoint)
+    finally:
+        await database.close()
+    print(json.dumps(summary, indent=2))
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    from logs import configure_logging
+    configure_logging()
+    sys.exit(asyncio.run(main()))
@@ -1,18 +1,91 @@
-from fastapi import FastAPI
+import asyncio
+import importlib
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from beanie import init_beanie
-from database import client
-from models import User, Family, College, Milestone, Tip, ChatMessage
+import database
+from hashing import hashing_pool
+from cache import cache_stats
+from models import DOCUMENT_MODELS
+from migrate import INDEX_CREATION, ensure_unique_indexes, run_migrations_once
+from llm import llm_cache_stats, warm_up_llm_provider
+from jobs import job_queue
+from chat_store import compactor
+from cohort import cohort_stats
+from cachebus import cache_bus
+from search import search_index_cache, search_stats
+from logs import configure_logging
+from metrics import REGISTRY, MetricsMiddleware, Sample, StatDescriptions, TimedJSONResponse, stats_samples
+from profiling import ProfilerMiddleware
+from ratelimit import RateLimitMiddleware, ratelimit_stats
+from pubsub import get_broker
+from realtime import realtime_stats
 
 
 from routers import router
 
-app = FastAPI()
+configure_logging()
+logger = logging.getLogger(__name__)
+
+async def keep_college_catalog_loaded():
+    # Imported in a thread, after startup, to keep NumPy off the cold-start path
+    matching = await asyncio.to_thread(importlib.import_module, "matching")
+    await matching.college_engine.run()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.connect()
+    db = database.get_database()
+    background = []
+    # Initialize Beanie with the specific database and models. Index builds
+    # can be moved off the boot path with INDEX_CREATION, and run in only one
+    # of the processes starting together (see migrate.py).
+    try:
+        await init_beanie(database=db, document_models=DOCUMENT_MODELS, skip_indexes=True)
+        logger.info("Database initialized successfully!", extra={"index_creation": INDEX_CREATION})
+        if INDEX_CREATION == "startup":
+            await run_migrations_once(db)
+        else:
+            # Signups depend on these, so they exist before serving in every mode
+            await ensure_unique_indexes()
+            if INDEX_CREATION == "background":
+                background.append(asyncio.create_task(run_migrations_once(db)))
+    except Exception:
+        logger.exception("Database initialization failed")
+        # We don't raise here so the app can still start and we can see the logs
+    database.health_monitor.start()
+    cache_bus.start()
+    job_queue.start()
+    compactor.start()
+    cohort_stats.start()
+    background.append(asyncio.create_task(warm_up_llm_provider()))
+    background.append(asyncio.create_task(keep_college_catalog_loaded()))
+
+    yield
+
+    for task in background:
+        task.cancel()
+    await job_queue.stop()
+    await compactor.stop()
+    await cohort_stats.stop()
+    cache_bus.stop()
+    get_broker().close()
+    await database.health_monitor.stop()
+    hashing_pool.shutdown()
+    await database.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
 @app.get("/")
 @app.head("/")
 async def root():
     return {"message": "Emma Advisor API is running"}
 
+# Innermost, so 429/503 rejections still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 # Allow any localhost origin for development convenience
 allow_origin_regex = r"http://(localhost|127\.0\.0\.1)(:\d+)?"
@@ -26,31 +99,141 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all methods including OPTIONS
     allow_headers=["*"],
 )
-
-# Initialize Beanie on startup
-@app.on_event("startup")
-async def startup_event():
-    # Initialize Beanie with the specific database and models
-    try:
-        await init_beanie(database=client.emma_advisor_db, document_models=[User, Family, College, Milestone, Tip, ChatMessage])
-        print("Database initialized successfully!")
-    except Exception as e:
-        print(f"❌ Database initialization failed: {e}")
-        # We don't raise here so the app can still start and we can see the logs
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Include the API router
 app.include_router(router)
 
 @app.get("/healthz")
 async def health_check():
-    try:
-        # Check MongoDB connection
-        await client.server_info()
-        db_status = "connected"
-    except Exception as e:
-        db_status = f"disconnected: {str(e)}"
+    # Reports the background monitor's last result instead of pinging Mongo
+    # on every load balancer probe
+    db_health = database.health_monitor.state
 
     return {
         "status": "ok",
-        "database": db_status
-    }
\ No newline at end of file
+        "database": db_health["status"],
+        "database_checked_at": db_health["checked_at"],
+        "database_pool": database.pool_stats.stats(),
+        "password_hashing": hashing_pool.stats(),
+        "caches": cache_stats(),
+        "rate_limits": ratelimit_stats(),
+        "pubsub": {**get_broker().stats(), **realtime_stats()},
+        "jobs": job_queue.stats(),
+        "chat_storage": compactor.stats(),
+        "search": search_stats(),
+        "llm_cache": llm_cache_stats(),
+        "cohort_stats": cohort_stats.stats(),
+        "cache_bus": cache_bus.stats()
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# (type, help) of the runtime stats exported on /metrics, by stats() key
+def _cache_descriptions(what: str) -> StatDescriptions:
+    return {
+        "size": ("gauge", f"Entries in the {what}"),
+        "maxsize": ("gauge", f"Capacity of the {what}"),
+        "ttl_seconds": ("gauge", f"Entry lifetime of the {what}"),
+        "hits": ("counter", f"Lookups answered from the {what}"),
+        "misses": ("counter", f"Lookups the {what} could not answer"),
+        "hit_rate": ("gauge", f"Hits over lookups of the {what} since start"),
+        "evictions": ("counter", f"Entries evicted from the {what} for space"),
+        "invalidations": ("counter", f"Entries dropped from the {what} by invalidation"),
+    }
+
+
+RUNTIME_STATS: Dict[str, StatDescriptions] = {
+    "password_hash": {
+        "workers": ("gauge", "Password hashing pool workers"),
+        "concurrency": ("gauge", "Password hashes allowed to run at once"),
+        "in_flight": ("gauge", "Password hashes running"),
+        "queue_depth": ("gauge", "Password hashes waiting for a worker"),
+        "max_queue_depth": ("gauge", "Most password hashes that have waited at once"),
+        "completed": ("counter", "Password hashes completed"),
+        "failed": ("counter", "Password hashes that raised"),
+        "wait_seconds_total": ("counter", "Seconds password hashes spent waiting for a worker"),
+        "run_seconds_total": ("counter", "Seconds spent hashing passwords"),
+    },
+    "mongo_pool": {
+        "max_pool_size": ("gauge", "MongoDB connection pool size limit"),
+        "min_pool_size": ("gauge", "MongoDB connections kept open when idle"),
+        "open_connections": ("gauge", "Open MongoDB connections"),
+        "in_use": ("gauge", "MongoDB connections checked out"),
+        "checkouts_total": ("counter", "MongoDB connection checkouts"),
+        "checkout_failures_total": ("counter", "MongoDB connection checkouts that failed"),
+        "pool_clears_total": ("counter", "Times the MongoDB connection pool was cleared"),
+    },
+    "cache": _cache_descriptions("in-process cache"),
+    "ratelimit": {
+        "in_flight": ("gauge", "Requests running in the route class"),
+        "max_in_flight": ("gauge", "Cap on requests running in the route class, per worker"),
+        "tracked_users": ("gauge", "Users with a token bucket in the route class"),
+        "tracked_ips": ("gauge", "IPs with a token bucket in the route class"),
+        "tracked_accounts": ("gauge", "Target accounts with a token bucket in the route class"),
+    },
+    "pubsub": {
+        "channels": ("gauge", "Chat pub/sub channels with subscribers"),
+        "subscribers": ("gauge", "Chat pub/sub subscriptions"),
+        "queue_size": ("gauge", "Messages buffered per chat pub/sub subscriber"),
+    },
+    "realtime": {
+        "websocket_connections": ("gauge", "Open /ws/chat connections"),
+    },
+    "job_queue": {
+        "workers": ("gauge", "Background job workers"),
+        "processed": ("counter", "Background jobs completed"),
+        "retried": ("counter", "Background job attempts retried"),
+        "failed": ("counter", "Background jobs failed for good"),
+    },
+    "chat_storage": {
+        "archived_buckets": ("counter", "Chat buckets moved to the archive"),
+    },
+    "search_index": _cache_descriptions("chat search index cache"),
+    "llm_cache": {
+        **_cache_descriptions("LLM reply cache"),
+        "coalesced": ("counter", "LLM requests that joined an identical generation in flight"),
+        "upstream_calls": ("counter", "Generations sent to the LLM provider"),
+        "in_flight": ("gauge", "Generations running at the LLM provider"),
+    },
+    "cohort_stats": {
+        "pending_deltas": ("gauge", "Cohort counter changes not yet flushed"),
+        "flushes": ("counter", "Cohort counter flushes"),
+        "reconciliations": ("counter", "Cohort counter reconciliations"),
+        "last_drift": ("gauge", "Total correction made by the last cohort reconciliation"),
+    },
+    "cache_bus": {
+        "peers": ("gauge", "Sibling workers reachable on the cache bus"),
+        "sent": ("counter", "Cache bus datagrams sent"),
+        "received": ("counter", "Cache bus datagrams received"),
+        "dropped": ("counter", "Cache bus datagrams that could not be sent"),
+    },
+}
+
+
+def _collect_runtime_stats():
+    def collect(prefix, stats, labels=None):
+        return stats_samples(prefix, stats, labels, RUNTIME_STATS[prefix])
+
+    samples = collect("password_hash", hashing_pool.stats())
+    samples += collect("mongo_pool", database.pool_stats.stats())
+    for name, stats in cache_stats().items():
+        samples += collect("cache", stats, {"cache": name})
+    for name, stats in ratelimit_stats().items():
+        samples += collect("ratelimit", stats, {"route_class": name})
+    samples += collect("pubsub", get_broker().stats())
+    samples += collect("realtime", realtime_stats())
+    samples += collect("job_queue", job_queue.stats())
+    samples += collect("chat_storage", compactor.stats())
+    samples += collect("search_index", search_index_cache.stats())
+    samples += collect("llm_cache", llm_cache_stats())
+    samples += collect("cohort_stats", cohort_stats.stats())
+    samples += collect("cache_bus", cache_bus.stats())
+    samples.append(Sample("database_up", {}, 1 if database.health_monitor.state["status"] == "connected" else 0,
+                          "gauge", "1 while the MongoDB health check reports connected"))
+    return samples
+
+REGISTRY.add_collector("Point-in-time runtime stat", _collect_runtime_stats)
\ No newline at end of file
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+MATCH_FEATURE_DIM = int(os.getenv("MATCH_FEATURE_DIM", 256))
+# Background full-reload interval, to pick up catalog writes made by other
+# processes (seed/loader scripts, other workers). In-process writes apply
+# immediately.
+MATCH_CATALOG_REFRESH_SECONDS = float(os.getenv("MATCH_CATALOG_REFRESH_SECONDS", 300))
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z][a-z&'-]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it its of on or that the their this to who with you your "
+    "where what when which while want love loves lots about more most very".split()
+)
+
+# Profile traits are short labels ("Analytical"), college copy is prose; a few
+# related words per trait give the two sides a shared vocabulary to meet in.
+TRAIT_EXPANSIONS = {
+    "curious": "curious inquiry ideas thinkers explore",
+    "analytical": "analytical rigorous research academics intellectual",
+    "creative": "creative arts creativity innovation energy",
+    "empathetic": "empathetic compassion community engagement",
+    "hands-on": "hands-on practical projects labs",
+    "collaborative": "collaborative community close-knit teamwork",
+    "self-directed": "self-directed independent thinkers",
+    "impact": "impact change world social",
+    "innovation": "innovation ideas creativity research",
+    "personal growth": "growth balanced well-rounded life",
+    "research": "research academics intellectual rigorous",
+    "arts & culture": "arts culture creative quirky",
+    "social impact": "social impact community change world",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _iter_text(value: Any) -> Iterable[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _iter_text(item)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            yield from _iter_text(item)
+
+
+def _hash_vector(weighted_texts: Iterable[Tuple[str, float]], dim: int) -> np.ndarray:
+    # Feature hashing: a stable hash (crc32, unlike hash()) maps each token to a column
+    vector = np.zeros(dim, dtype=np.float32)
+    for text, weight in weighted_texts:
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode()) % dim] += weight
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def college_vector(college, dim: int = MATCH_FEATURE_DIM) -> np.ndarray:
+    texts = [
+        (college.emotional_tagline, 1.0),
+        (college.default_fit_reason or "", 1.0),
+        (college.default_fit_reason_student or "", 1.0),
+    ]
+    texts.extend((link.type, 0.5) for link in college.rich_media_links)
+    return _hash_vector(texts, dim)
+
+
+def profile_vector(profile: Dict[str, Any], soul_scan: Optional[Dict[str, List[str]]] = None, dim: int = MATCH_FEATURE_DIM) -> np.ndarray:
+    texts = []
+    for source in (profile, soul_scan or {}):
+        for text in _iter_text(source):
+            texts.append((text, 1.0))
+            expansion = TRAIT_EXPANSIONS.get(text.strip().lower())
+            if expansion:
+                texts.append((expansion, 0.5))
+    return _hash_vector(texts, dim)
+
+
+class MatchingEngine:
+    """College catalog held as an L2-normalized (n_colleges x dim) matrix.
+
+    A match is one matrix-vector product (cosine similarity) plus argpartition
+    for the top k. Rows are added, replaced or removed in place as colleges
+    change, so the catalog is only read from Mongo in full on (re)load.
+
+    Full loads run in the background (run(): at startup, then every
+    refresh_seconds) and build the new matrix in a worker thread; requests
+    keep matching against the current one until it is swapped out.
+    """
+
+    def __init__(self, dim: int = MATCH_FEATURE_DIM, refresh_seconds: float = MATCH_CATALOG_REFRESH_SECONDS):
+        self.dim = dim
+        self.refresh_seconds = refresh_seconds
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._size = 0
+        self._ids: List[Any] = []
+        self._rows: Dict[Any, int] = {}
+        self._colleges: Dict[Any, Any] = {}
+        self._loaded_at: Optional[float] = None
+        self._load_lock = asyncio.Lock()
+        # Changes made while a reload is building, replayed onto its result
+        self._pending: Optional[List[Tuple[Any, Any]]] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _compute(self, colleges: List[Any]) -> tuple:
+        # Pure: safe to run in a thread while requests use the current matrix
+        matrix = np.zeros((max(len(colleges), 1), self.dim), dtype=np.float32)
+        for row, college in enumerate(colleges):
+            matrix[row] = college_vector(college, self.dim)
+        ids = [c.id for c in colleges]
+        return matrix, len(colleges), ids, {c.id: row for row, c in enumerate(colleges)}, {c.id: c for c in colleges}
+
+    def _compute_from_documents(self, model, docs: List[dict]) -> tuple:
+        return self._compute([model.model_validate(doc) for doc in docs])
+
+    def _swap(self, state: tuple) -> None:
+        self._matrix, self._size, self._ids, self._rows, self._colleges = state
+        self._loaded_at = time.monotonic()
+
+    def build(self, colleges: Iterable[Any]) -> None:
+        self._swap(self._compute(list(colleges)))
+
+    async def refresh(self, only_if_unloaded: bool = False) -> None:
+        """Reload the whole catalog from Mongo, building the matrix off the event loop."""
+        async with self._load_lock:
+            if only_if_unloaded and self._loaded_at is not None:
+                return
+            from models import College
+            self._pending = []
+            try:
+                # Raw documents: validating them is CPU work too, done in the thread
+                docs = await College.get_motor_collection().find().to_list(None)
+                state = await asyncio.to_thread(self._compute_from_documents, College, docs)
+                # No awaits from here on, so a request sees either catalog, never a mix
+                pending = self._pending
+                self._swap(state)
+                for college_id, college in pending:
+                    if college is None:
+                        self.remove(college_id)
+                    else:
+                        self.upsert(college)
+            finally:
+                self._pending = None
+
+    async def run(self) -> None:
+        """Load now, then reload every refresh_seconds; runs until cancelled."""
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Loading the college catalog failed")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def upsert(self, college) -> None:
+        row = self._rows.get(college.id)
+        if row is None:
+            if self._size == self._matrix.shape[0]:
+                # Grow geometrically so a stream of inserts stays amortized O(1)
+                grown = np.zeros((max(2 * self._size, 16), self.dim), dtype=np.float32)
+                grown[: self._size] = self._matrix[: self._size]
+                self._matrix = grown
+            row = self._size
+            self._size += 1
+            self._ids.append(college.id)
+            self._rows[college.id] = row
+        self._matrix[row] = college_vector(college, self.dim)
+        self._colleges[college.id] = college
+
+    def remove(self, college_id) -> None:
+        row = self._rows.pop(college_id, None)
+        if row is None:
+            return
+        self._colleges.pop(college_id, None)
+        last = self._size - 1
+        if row != last:
+            # Swap the last row into the hole to keep the matrix dense
+            moved_id = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._ids.pop()
+        self._size = last
+
+    def changed(self, college) -> None:
+        if self._pending is not None:
+            self._pending.append((college.id, college))
+        # Only patch a loaded matrix; an unloaded one reads everything when it loads
+        if self._loaded_at is not None:
+            self.upsert(college)
+
+    def deleted(self, college_id) -> None:
+        if self._pending is not None:
+            self._pending.append((college_id, None))
+        if self._loaded_at is not None:
+            self.remove(college_id)
+
+    def match(self, query: np.ndarray, k: int = 3) -> List[Tuple[Any, float]]:
+        """Top-k (college, score) pairs, best first. Scores are cosine in [0, 1]."""
+        if self._size == 0 or k <= 0:
+            return []
+        scores = self._matrix[: self._size] @ query
+        k = min(k, self._size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._colleges[self._ids[row]], float(max(scores[row], 0.0))) for row in top]
+
+    async def ensure_loaded(self) -> None:
+        # Only waits when a request beats the startup load; reloads happen in run()
+        if self._loaded_at is None:
+            await self.refresh(only_if_unloaded=True)
+
+
+college_engine = MatchingEngine()
+
+
+def on_college_changed(college) -> None:
+    if college.id is not None:
+        college_engine.changed(college)
+
+
+def on_college_deleted(college) -> None:
+    college_engine.deleted(college.id)
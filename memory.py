@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Set
+
+from beanie import PydanticObjectId
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from cohort import cohort_stats
+from llm import LLMProvider, Prompt
+from metrics import span
+from models import ChatMessage, ConversationMemory, Family, MemoryTurn
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# The prompt carries the rolling summary plus the last MEMORY_RECENT_MESSAGES
+# messages verbatim. Once MEMORY_FOLD_BATCH more have accumulated, the oldest
+# are folded into the summary in one summarize call, so summarization costs one
+# LLM call per batch and the prompt never grows past
+#   summary (MEMORY_SUMMARY_MAX_CHARS) + (recent + batch) * MEMORY_TURN_MAX_CHARS
+MEMORY_RECENT_MESSAGES = int(os.getenv("MEMORY_RECENT_MESSAGES", 20))
+MEMORY_FOLD_BATCH = int(os.getenv("MEMORY_FOLD_BATCH", 10))
+MEMORY_SUMMARY_MAX_CHARS = int(os.getenv("MEMORY_SUMMARY_MAX_CHARS", 2000))
+MEMORY_TURN_MAX_CHARS = int(os.getenv("MEMORY_TURN_MAX_CHARS", 2000))
+
+logger = logging.getLogger(__name__)
+
+# Background folds, referenced so they are not garbage collected mid-flight
+_pending: Set[asyncio.Task] = set()
+
+
+def _collection():
+    return Family.get_motor_collection()
+
+
+def _turn(message: ChatMessage) -> dict:
+    return MemoryTurn(
+        message_id=message.id,
+        sender_role=message.sender_role,
+        content=message.content[:MEMORY_TURN_MAX_CHARS],
+    ).model_dump()
+
+
+def _prompt_message(turn: MemoryTurn) -> dict:
+    if turn.sender_role == "ai":
+        return {"role": "assistant", "content": turn.content}
+    # Parent and student share the "user" role; the label tells them apart
+    return {"role": "user", "content": f"{turn.sender_role.title()}: {turn.content}"}
+
+
+async def load_memory(family_id: PydanticObjectId) -> ConversationMemory:
+    """The family's conversation memory: one _id lookup, projected to the memory field."""
+    doc = await _collection().find_one({"_id": family_id}, {"memory": 1})
+    return ConversationMemory.model_validate((doc or {}).get("memory") or {})
+
+
+def prompt_context(memory: ConversationMemory) -> Prompt:
+    """Summary and recent turns as chat messages, to sit between the system prompt and the new message."""
+    messages: Prompt = []
+    if memory.summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{memory.summary}"})
+    messages.extend(_prompt_message(turn) for turn in memory.recent)
+    return messages
+
+
+async def remember(
+    family_id: PydanticObjectId,
+    messages: List[ChatMessage],
+    provider: LLMProvider,
+    background: bool = True,
+) -> ConversationMemory:
+    """Append persisted messages to the family's memory, folding old turns when due.
+
+    The append is a single atomic $push. When `recent` has grown past
+    MEMORY_RECENT_MESSAGES + MEMORY_FOLD_BATCH the fold runs in a background
+    task (or inline with background=False) so the reply is not held up by it.
+    Failures are logged, not raised: the messages are already persisted, and a
+    turn missing from memory only costs the model some context.
+    """
+    try:
+        doc = await _collection().find_one_and_update(
+            {"_id": family_id},
+            {
+                "$push": {"memory.recent": {"$each": [_turn(m) for m in messages]}},
+                "$inc": {"memory.message_count": len(messages)},
+            },
+            projection={"memory": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception:
+        logger.exception("Conversation memory update failed", extra={"family_id": str(family_id)})
+        return ConversationMemory()
+    memory = ConversationMemory.model_validate((doc or {}).get("memory") or {})
+    if doc is not None:
+        # The family's first messages make it an active one
+        cohort_stats.record(messages=len(messages), active_families=int(memory.message_count == len(messages)))
+    if len(memory.recent) >= MEMORY_RECENT_MESSAGES + MEMORY_FOLD_BATCH:
+        if background:
+            task = asyncio.create_task(_fold_logged(family_id, provider))
+            _pending.add(task)
+            task.add_done_callback(_pending.discard)
+        else:
+            memory = await fold(family_id, provider) or memory
+    return memory
+
+
+async def fold(family_id: PydanticObjectId, provider: LLMProvider) -> Optional[ConversationMemory]:
+    """Summarize the turns older than the last MEMORY_RECENT_MESSAGES into the summary.
+
+    Incremental: only the folded turns and the previous summary are sent to
+    the model. The write is conditional on summarized_count, so when two folds
+    race only the first one lands and the other is dropped (returns None).
+    """
+    memory = await load_memory(family_id)
+    fold_count = len(memory.recent) - MEMORY_RECENT_MESSAGES
+    if fold_count <= 0:
+        return memory
+
+    folded = memory.recent[:fold_count]
+    transcript = [_prompt_message(t) for t in folded]
+    with span("memory.summarize"):
+        summary = await provider.summarize(memory.summary, transcript, MEMORY_SUMMARY_MAX_CHARS)
+
+    # Folded turns are pulled by message id, so turns appended while the
+    # summarize call was running are left in place
+    result = await _collection().update_one(
+        {"_id": family_id, "memory.summarized_count": memory.summarized_count},
+        {
+            "$set": {
+                "memory.summary": summary[:MEMORY_SUMMARY_MAX_CHARS],
+                "memory.summarized_count": memory.summarized_count + fold_count,
+            },
+            "$pull": {"memory.recent": {"message_id": {"$in": [t.message_id for t in folded]}}},
+        },
+    )
+    if not result.modified_count:
+        return None
+    memory.summary = summary[:MEMORY_SUMMARY_MAX_CHARS]
+    memory.summarized_count += fold_count
+    memory.recent = memory.recent[fold_count:]
+    return memory
+
+
+async def _fold_logged(family_id: PydanticObjectId, provider: LLMProvider) -> None:
+    try:
+        await fold(family_id, provider)
+    except Exception:
+        # The turns stay in `recent`; the next append retries the fold
+        logger.exception("Conversation memory fold failed", extra={"family_id": str(family_id)})
@@ -0,0 +1,250 @@
+import bisect
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import orjson
+from fastapi.responses import JSONResponse
+from pymongo import monitoring
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+# What stats_samples needs to know about a stats() key: (type, help)
+StatDescriptions = Dict[str, Tuple[str, str]]
+
+
+class Sample(NamedTuple):
+    """One value produced by a collector; type and help default to the collector's."""
+
+    name: str
+    labels: Dict[str, str]
+    value: float
+    type: Optional[str] = None
+    help: Optional[str] = None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def render(self) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def count(self, **labels: str) -> int:
+        state = self._values.get(tuple(str(labels[name]) for name in self.labelnames))
+        return int(sum(state[:-1])) if state else 0
+
+    def render(self) -> Iterable[str]:
+        for key, state in self._values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(state[-1])}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Tuple[str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, help: str, collect: Callable[[], Iterable[Sample]], type: str = "gauge") -> None:
+        """Register a callback producing samples at scrape time.
+
+        `help` and `type` apply to the samples that don't carry their own.
+        """
+        self._collectors.append((help, type, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        for help, type, collect in self._collectors:
+            # The exposition format wants each family's samples contiguous
+            families: Dict[str, Tuple[str, str, List[str]]] = {}
+            for sample in collect():
+                sample = Sample(*sample)
+                family = families.setdefault(sample.name, (sample.help or help, sample.type or type, []))
+                family[2].append(f"{sample.name}{_format_labels(sample.labels)} {_format_value(sample.value)}")
+            for name, (family_help, family_type, samples) in families.items():
+                lines.append(f"# HELP {name} {family_help}")
+                lines.append(f"# TYPE {name} {family_type}")
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ["method", "route", "status"]
+)
+span_duration = REGISTRY.histogram(
+    "span_duration_seconds", "Duration of named in-process spans (hashing, token decode, serialization, LLM)", ["span"]
+)
+mongo_command_duration = REGISTRY.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency as seen by the driver", ["command", "collection", "outcome"]
+)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block into span_duration_seconds{span=name}."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        span_duration.observe(time.perf_counter() - started, span=name)
+
+
+def stats_samples(
+    prefix: str,
+    stats: Dict[str, object],
+    labels: Optional[Dict[str, str]] = None,
+    descriptions: Optional[StatDescriptions] = None,
+) -> List[Sample]:
+    """Turn a stats() dict into samples, skipping non-numeric entries.
+
+    Keys in `descriptions` get their (type, help); counters are named with
+    the `_total` suffix. Other keys are gauges with the collector's help.
+    """
+    samples = []
+    descriptions = descriptions or {}
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', key)}"
+            type, help = descriptions.get(key, (None, None))
+            if type == "counter" and not name.endswith("_total"):
+                name += "_total"
+            samples.append(Sample(name, labels or {}, value, type, help))
+    return samples
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Feeds mongo_command_duration_seconds for every driver command, Beanie queries included."""
+
+    def __init__(self):
+        self._collections: Dict[int, str] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def _finish(self, event, outcome: str):
+        collection = self._collections.pop(event.request_id, "")
+        mongo_command_duration.observe(
+            event.duration_micros / 1_000_000, command=event.command_name, collection=collection, outcome=outcome
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+class TimedJSONResponse(JSONResponse):
+    """Default response class: orjson encoding, recorded as a span."""
+
+    def render(self, content) -> bytes:
+        with span("serialize.json"):
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency histograms."""
+
+    def __init__(self, app, exclude_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Label by route template (/api/jobs/{job_id}), never the raw path
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code),
+            )
@@ -0,0 +1,130 @@
+"""Schema setup that doesn't need to run on every boot.
+
+    python migrate.py
+
+Creates the indexes declared on the document models (never drops any) and
+backfills derived fields. With INDEX_CREATION=skip the app leaves this to
+a deploy step running this command; with INDEX_CREATION=background the app
+runs it in a task after it has started serving. Either way the unique
+indexes are still created before the app serves (ensure_unique_indexes):
+signups rely on them to turn away duplicate emails and double-claimed
+invites, so they can't be deferred like the secondary and text indexes.
+
+When several app processes start at once (serve.py), a lock in Mongo lets
+one of them run the migrations while the rest wait for it to finish.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import List
+
+from beanie import init_beanie
+from beanie.odm.utils.init import Initializer
+from beanie.odm.utils.pydantic import get_model_fields
+from beanie.odm.utils.typing import get_index_attributes
+from pymongo import IndexModel
+
+import database
+from catalog import backfill_numeric_fields
+from models import DOCUMENT_MODELS
+
+# "startup" (build indexes before serving, the default), "background" or "skip"
+INDEX_CREATION = os.getenv("INDEX_CREATION", "startup")
+# The migration lock's lease (renewed while held), and how long the other
+# processes wait for its holder before serving anyway
+MIGRATION_LOCK_TTL_SECONDS = float(os.getenv("MIGRATION_LOCK_TTL_SECONDS", 60))
+MIGRATION_LOCK_WAIT_SECONDS = float(os.getenv("MIGRATION_LOCK_WAIT_SECONDS", 300))
+# Runs finished after this count for every process started with it; serve.py
+# sets it once for all of its workers
+SERVE_STARTED_AT = float(os.getenv("SERVE_STARTED_AT") or time.time())
+
+logger = logging.getLogger(__name__)
+
+
+async def ensure_indexes(db, models=DOCUMENT_MODELS) -> None:
+    # Beanie's own index sync, run against models that are already initialized
+    initializer = Initializer(database=db, document_models=[])
+    for model in models:
+        await initializer.init_indexes(model)
+
+
+def unique_indexes(model) -> List[IndexModel]:
+    """The unique indexes declared on a model, via Indexed() or Settings.indexes."""
+    indexes = []
+    for name, field in get_model_fields(model).items():
+        attributes = get_index_attributes(field)
+        if attributes is not None and attributes[1].get("unique"):
+            indexes.append(IndexModel([(field.alias or name, attributes[0])], **attributes[1]))
+    for index in model.get_settings().indexes or []:
+        index = getattr(index, "index", index)
+        if isinstance(index, IndexModel) and index.document.get("unique"):
+            indexes.append(index)
+    return indexes
+
+
+async def ensure_unique_indexes(models=DOCUMENT_MODELS) -> None:
+    """Create just the unique indexes; a no-op for those that already exist."""
+    for model in models:
+        indexes = unique_indexes(model)
+        if indexes:
+            await model.get_motor_collection().create_indexes(indexes)
+
+
+async def run_migrations(db, create_indexes: bool = True) -> bool:
+    started = time.perf_counter()
+    try:
+        if create_indexes:
+            await ensure_indexes(db)
+        backfilled = await backfill_numeric_fields()
+        if backfilled:
+            logger.info("Backfilled numeric fields on %d colleges", backfilled)
+        logger.info("Migrations finished", extra={"duration_s": round(time.perf_counter() - started, 3)})
+        return True
+    except Exception:
+        logger.exception("Migrations failed")
+        return False
+
+
+async def run_migrations_once(db) -> bool:
+    """run_migrations, unless another process has done them since SERVE_STARTED_AT.
+
+    Returns whether this process ran them. While another process holds the
+    lock this waits for it, so no worker serves before the unique indexes
+    exist; a holder that died is taken over once its lease runs out.
+    """
+    since = datetime.utcfromtimestamp(SERVE_STARTED_AT)
+    lock = database.MongoLock(db, "migrations", ttl=MIGRATION_LOCK_TTL_SECONDS)
+    deadline = time.monotonic() + MIGRATION_LOCK_WAIT_SECONDS
+    while True:
+        current = await lock.read() or {}
+        if (current.get("finished_at") or datetime.min) >= since:
+            return False
+        acquired = await lock.acquire()
+        if acquired is not None:
+            async with lock.held():
+                # Someone may have finished between the read and the acquire
+                if (acquired.get("finished_at") or datetime.min) >= since:
+                    return False
+                if await run_migrations(db):
+                    await lock.record(finished_at=datetime.utcnow(), finished_by=lock.owner)
+            return True
+        if time.monotonic() > deadline:
+            logger.warning("Gave up waiting for the migration lock", extra={"holder": current.get("owner")})
+            return False
+        await asyncio.sleep(0.5)
+
+
+async def main():
+    await database.connect()
+    db = database.get_database()
+    await init_beanie(database=db, document_models=DOCUMENT_MODELS, skip_indexes=True)
+    await run_migrations(db)
+    await database.close()
+
+
+if __name__ == "__main__":
+    from logs import configure_logging
+    configure_logging()
+    asyncio.run(main())
@@ -1,8 +1,12 @@
 from typing import Optional, Dict, Any, List
-from beanie import Document, Indexed, PydanticObjectId
-from pydantic import EmailStr, Field, BaseModel
+from beanie import Document, Indexed, PydanticObjectId, after_event, before_event, Delete, Insert, Replace, Save, SaveChanges, Update
+import re
+from pydantic import EmailStr, Field, BaseModel, model_validator
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
 from datetime import datetime
 
+from cache import invalidate_dashboard, invalidate_principal
+
 class User(Document):
     email: Indexed(EmailStr, unique=True)
     hashed_password: str
@@ -11,21 +15,58 @@ class User(Document):
     profile: Dict[str, Any] = {}
     family_id: Optional[PydanticObjectId] = None
 
+    @after_event(Save, Replace, SaveChanges, Update, Delete)
+    def drop_cached_principal(self):
+        invalidate_principal(self.email)
+
     class Settings:
         name = "users"
 
+class MemoryTurn(BaseModel):
+    message_id: Optional[PydanticObjectId] = None
+    sender_role: str  # "parent", "student", "ai"
+    content: str
+
+class ConversationMemory(BaseModel):
+    # What the model sees of the conversation: a rolling summary of everything
+    # older than `recent`, plus the last few turns verbatim. Maintained by memory.py.
+    summary: str = ""
+    recent: List[MemoryTurn] = []
+    summarized_count: int = 0
+    message_count: int = 0
+
 class Family(Document):
     parent_id: PydanticObjectId
     student_id: Optional[PydanticObjectId] = None
-    invite_token: Optional[Indexed(str, unique=True)] = None
+    invite_token: Optional[str] = None
+    memory: ConversationMemory = Field(default_factory=ConversationMemory)
 
     class Settings:
         name = "families"
+        # Unset fields are left out of the document rather than stored as null,
+        # so the sparse unique index allows any number of families without a
+        # pending invite
+        keep_nulls = False
+        indexes = [
+            IndexModel([("invite_token", ASCENDING)], name="invite_token_unique", unique=True, sparse=True),
+        ]
 
 class RichMediaLink(BaseModel):
     type: str
     url: str
 
+_NUMBER_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+def parse_percent(value: Optional[str]) -> Optional[float]:
+    """'14%' -> 14.0; None when the string holds no number."""
+    match = _NUMBER_RE.search(value or "")
+    return float(match.group().replace(",", "")) if match else None
+
+def parse_usd(value: Optional[str]) -> Optional[int]:
+    """'$45,000/year' -> 45000; None when the string holds no number."""
+    match = _NUMBER_RE.search(value or "")
+    return int(float(match.group().replace(",", ""))) if match else None
+
 class College(Document):
     name: Indexed(str, unique=True)
     acceptance_rate: str
@@ -37,25 +78,67 @@ class College(Document):
     default_fit_reason: Optional[str] = None
     default_fit_reason_student: Optional[str] = None
 
+    # Numeric copies of the display strings above, for range filters and sorts.
+    # Always derived from the strings; never set these directly.
+    acceptance_rate_pct: Optional[float] = None
+    tuition_usd: Optional[int] = None
+
+    @model_validator(mode="after")
+    def _derive_numbers(self):
+        self.normalize_numbers()
+        return self
+
+    @before_event(Insert, Save, Replace, SaveChanges)
+    def normalize_numbers(self):
+        self.acceptance_rate_pct = parse_percent(self.acceptance_rate)
+        self.tuition_usd = parse_usd(self.tuition)
+
+    # Keep the in-memory matching matrix in step with catalog writes
+    @after_event(Insert, Save, Replace, SaveChanges, Update)
+    def refresh_match_vector(self):
+        from matching import on_college_changed
+        on_college_changed(self)
+
+    @after_event(Delete)
+    def drop_match_vector(self):
+        from matching import on_college_deleted
+        on_college_deleted(self)
+
     class Settings:
         name = "colleges"
+        indexes = [
+            # Beanie keeps one index per set of fields, so the (tuition_usd,
+            # acceptance_rate_pct) order is left to sort_tuition to cover
+            IndexModel([("acceptance_rate_pct", DESCENDING), ("tuition_usd", ASCENDING)], name="acceptance_tuition"),
+            # Serve catalog.SORTS in either direction
+            IndexModel([("tuition_usd", ASCENDING), ("_id", ASCENDING)], name="sort_tuition"),
+            IndexModel([("acceptance_rate_pct", ASCENDING), ("_id", ASCENDING)], name="sort_acceptance_rate"),
+        ]
 
 class Milestone(Document):
     text: str
     month: Optional[str] = None
     is_default: bool = True
+
+    @after_event(Insert, Save, Replace, SaveChanges, Update, Delete)
+    def drop_cached_dashboard(self):
+        invalidate_dashboard()
     
     class Settings:
         name = "milestones"
 
 class Tip(Document):
     text: str
+
+    @after_event(Insert, Save, Replace, SaveChanges, Update, Delete)
+    def drop_cached_dashboard(self):
+        invalidate_dashboard()
     
     class Settings:
         name = "tips"
 
 class ChatMessage(Document):
-    family_id: Indexed(PydanticObjectId)
+    family_id: PydanticObjectId
     sender_id: Optional[PydanticObjectId] = None # None for AI
     sender_role: str # "parent", "student", "ai"
     content: str
@@ -63,4 +146,92 @@ class ChatMessage(Document):
     metadata: Dict[str, Any] = {} 
 
     class Settings:
-        name = "chat_messages"
\ No newline at end of file
+        name = "chat_messages"
+        # Serves both the family filter and keyset pagination on (timestamp, _id)
+        indexes = [
+            IndexModel(
+                [("family_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+                name="family_timestamp",
+            ),
+            # /api/chat/search (search.py); prefixed with family_id so a
+            # search only reads the caller's family's entries
+            IndexModel([("family_id", ASCENDING), ("content", TEXT)], name="family_content_text"),
+        ]
+
+class ChatBucket(Document):
+    # CHAT_STORAGE=buckets (chat_store.py): up to CHAT_BUCKET_MAX_MESSAGES of one
+    # family's messages from the window [start, end), in place of one document each
+    family_id: PydanticObjectId
+    start: datetime
+    end: datetime
+    size: int = 0
+    messages: List[Dict[str, Any]] = []  # ChatMessage fields except family_id, keyed "_id"
+
+    class Settings:
+        name = "chat_buckets"
+        indexes = [
+            IndexModel([("family_id", ASCENDING), ("start", ASCENDING)], name="family_start"),
+            # Compaction's scan for buckets past the archive age
+            IndexModel([("end", ASCENDING)], name="end"),
+        ]
+
+class ChatArchive(Document):
+    # A ChatBucket moved out of the hot collection once it aged past
+    # CHAT_ARCHIVE_AFTER_DAYS; same _id, messages stored compressed
+    family_id: PydanticObjectId
+    start: datetime
+    end: datetime
+    size: int = 0
+    data: bytes  # zlib-compressed BSON {"messages": [...]}
+
+    class Settings:
+        name = "chat_archive"
+        indexes = [
+            IndexModel([("family_id", ASCENDING), ("start", ASCENDING)], name="family_start"),
+        ]
+
+class CohortStats(Document):
+    # Materialized counters behind the dashboard's SupportCircle, one document
+    # per cohort (_id is the cohort name). Kept current by cohort.py.
+    id: str
+    parents: int = 0
+    students: int = 0
+    families: int = 0
+    families_with_student: int = 0
+    active_families: int = 0  # families with at least one message in memory
+    messages: int = 0
+    updated_at: Optional[datetime] = None
+    reconciled_at: Optional[datetime] = None
+
+    class Settings:
+        name = "cohort_stats"
+
+class Job(Document):
+    # Unit of background work, claimed and run by the worker pool in jobs.py
+    kind: str
+    payload: Dict[str, Any] = {}
+    status: str = "queued"  # "queued", "running", "succeeded", "failed"
+    attempts: int = 0
+    max_attempts: int = 5
+    run_at: datetime = Field(default_factory=datetime.utcnow)
+    locked_until: Optional[datetime] = None
+    worker_id: Optional[str] = None
+    idempotency_key: Optional[str] = None
+    family_id: Optional[PydanticObjectId] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "jobs"
+        keep_nulls = False
+        indexes = [
+            # Claim order, and lease expiry of crashed workers' jobs
+            IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+            IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)], name="status_locked_until"),
+            IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True, sparse=True),
+        ]
+
+# Everything registered with init_beanie
+DOCUMENT_MODELS = [User, Family, College, Milestone, Tip, ChatMessage, ChatBucket, ChatArchive, CohortStats, Job]
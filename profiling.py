@@ -0,0 +1,97 @@
+import cProfile
+import hmac
+import logging
+import os
+import pstats
+import time
+import uuid
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# Off unless PROFILING_ENABLED=true, and even then a request is only profiled
+# when its X-Profile header carries PROFILING_TOKEN
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "/tmp/emma-profiles"))
+# Reports kept in PROFILE_DIR; the oldest are deleted past this
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 20))
+PROFILE_HEADER = b"x-profile"
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerMiddleware:
+    """Profiles a single request when it carries `X-Profile: <PROFILING_TOKEN>`.
+
+    Uses pyinstrument (a sampling profiler, async-aware) when installed,
+    otherwise cProfile. Both see everything else the event loop runs
+    meanwhile, so only one request is profiled at a time. The report is
+    written to PROFILE_DIR and only its id is returned, in the X-Profile-Id
+    response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = PROFILING_ENABLED and bool(PROFILING_TOKEN)
+        if PROFILING_ENABLED and not PROFILING_TOKEN:
+            logger.warning("PROFILING_ENABLED is set without PROFILING_TOKEN; profiling stays off")
+        self._busy = False
+
+    def _authorized(self, scope) -> bool:
+        value = dict(scope["headers"]).get(PROFILE_HEADER)
+        return value is not None and hmac.compare_digest(value, PROFILING_TOKEN.encode())
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or self._busy or scope["type"] != "http" or not self._authorized(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        suffix = ".html" if Profiler is not None else ".pstats"
+        report_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        report = PROFILE_DIR / f"{report_id}{suffix}"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", report_id.encode())]
+            await send(message)
+
+        self._busy = True
+        try:
+            if Profiler is not None:
+                profiler = Profiler(async_mode="enabled")
+                profiler.start()
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    profiler.stop()
+                    report.write_text(profiler.output_html())
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    profiler.disable()
+                    pstats.Stats(profiler).dump_stats(str(report))
+        finally:
+            self._busy = False
+            self._prune()
+
+    def _prune(self) -> None:
+        reports = sorted(
+            (path for path in PROFILE_DIR.iterdir() if path.suffix in (".html", ".pstats")),
+            key=lambda path: path.stat().st_mtime,
+        )
+        for path in reports[:-PROFILE_MAX_FILES or None]:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,197 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set
+
+from dotenv import load_dotenv
+
+from metrics import REGISTRY
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# "memory" (default): fan-out within this process, and to the sibling worker
+# processes of serve.py over the cache bus (cachebus.py). A deployment with
+# several hosts needs a shared backend (Redis, Mongo change streams)
+# implementing Broker; set it with set_broker() at startup.
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+# Messages buffered per subscriber. A subscriber that falls this far behind is
+# disconnected rather than allowed to grow memory or slow the publisher; clients
+# reconnect and backfill from /api/chat/history?after=<cursor>.
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", 100))
+
+published_total = REGISTRY.counter("pubsub_published_total", "Messages published to the chat broker")
+delivered_total = REGISTRY.counter("pubsub_delivered_total", "Messages queued for a subscriber")
+overflow_total = REGISTRY.counter("pubsub_overflow_total", "Subscribers dropped for falling behind")
+
+
+class Subscription:
+    """One consumer of a channel. Messages are opaque (already-encoded) strings."""
+
+    def __init__(self, broker: "Broker", channel: str, maxsize: int):
+        self.broker = broker
+        self.channel = channel
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+        self.closed = False
+
+    def deliver(self, message: str) -> bool:
+        """Queue without waiting; on a full queue the subscription is closed instead."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            overflow_total.inc()
+            self.close()
+            return False
+        delivered_total.inc()
+        return True
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Next message; None once closed. Raises asyncio.TimeoutError after `timeout` idle seconds."""
+        if self.closed and self.queue.empty():
+            return None
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.broker.unsubscribe(self)
+        # Wake a pending get(); the sentinel may not fit if the queue is full,
+        # in which case the reader finds `closed` once it drains
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+
+class Broker(ABC):
+    name = "base"
+
+    @abstractmethod
+    def subscribe(self, channel: str) -> Subscription:
+        """Start receiving messages published to `channel` from now on."""
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop delivering to `subscription`. Called by Subscription.close()."""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str) -> int:
+        """Fan `message` out to the channel's subscribers; returns how many received it."""
+
+    def close(self) -> None:
+        """End every subscription (shutdown)."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InProcessBroker(Broker):
+    """Channels and subscribers held in this process's memory.
+
+    publish() never awaits a subscriber: delivery is a put_nowait into each
+    subscriber's bounded queue, so one slow WebSocket cannot hold up the chat
+    request that published or the other members of the family. Each publish
+    is also handed to the publish listener, if one is set, to reach the
+    subscribers of the other workers on this host; the count it returns
+    covers this process's subscribers only.
+    """
+
+    name = "memory"
+
+    def __init__(self, queue_size: int = PUBSUB_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._channels: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(self, channel, self.queue_size)
+        self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._channels.get(subscription.channel)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._channels[subscription.channel]
+
+    async def publish(self, channel: str, message: str) -> int:
+        published_total.inc()
+        if _publish_listener is not None:
+            _publish_listener(channel, message)
+        return self.deliver(channel, message)
+
+    def deliver(self, channel: str, message: str) -> int:
+        """Fan out to this process's subscribers only."""
+        # Copy: an overflowing subscriber removes itself during the loop
+        return sum(s.deliver(message) for s in list(self._channels.get(channel, ())))
+
+    def close(self) -> None:
+        for subscribers in list(self._channels.values()):
+            for subscription in list(subscribers):
+                subscription.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "channels": len(self._channels),
+            "subscribers": sum(len(s) for s in self._channels.values()),
+            "queue_size": self.queue_size,
+        }
+
+
+_BROKERS = {
+    "memory": InProcessBroker,
+}
+
+_broker: Optional[Broker] = None
+
+# Called with every message the in-process broker publishes, so the cache bus
+# can pass it on to the other workers (cachebus.py); None when running alone
+_publish_listener: Optional[Callable[[str, str], None]] = None
+
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        if PUBSUB_BACKEND not in _BROKERS:
+            raise ValueError(f"Unknown PUBSUB_BACKEND {PUBSUB_BACKEND!r}, expected one of {sorted(_BROKERS)}")
+        _broker = _BROKERS[PUBSUB_BACKEND]()
+    return _broker
+
+
+def set_broker(broker: Optional[Broker]) -> None:
+    """Swap the process-wide broker (another backend, tests, benchmarks)."""
+    global _broker
+    _broker = broker
+
+
+def set_publish_listener(listener: Optional[Callable[[str, str], None]]) -> None:
+    global _publish_listener
+    _publish_listener = listener
+
+
+def apply_publish(channel: str, message: str) -> int:
+    """Deliver a message another worker published, in this process only."""
+    broker = get_broker()
+    if isinstance(broker, InProcessBroker):
+        return broker.deliver(channel, message)
+    # A shared broker already reached this process's subscribers
+    return 0
+
+
+def family_channel(family_id) -> str:
+    return f"family:{family_id}"
@@ -0,0 +1,362 @@
+import hashlib
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from jose import JWTError
+
+from cache import TTLCache
+from metrics import REGISTRY
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# Admission control for the expensive routes (bcrypt logins, LLM chat). Over-limit
+# requests are rejected immediately instead of queueing behind the work they
+# would slow down:
+#   429 + Retry-After  the caller's token bucket (per IP, per user, per account) is empty
+#   503 + Retry-After  the route class already has MAX_IN_FLIGHT requests running
+# Rates are per minute; a rate of 0 disables that bucket, a cap of 0 the in-flight limit.
+# They are for the whole server: with serve.py's worker processes each keeps its
+# own buckets and count, so each enforces 1/SERVE_WORKERS of every budget. A
+# client whose requests all land on one worker gets that worker's share.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Behind a reverse proxy every request comes from the proxy's address, so all
+# clients share one IP bucket; enable this to key on X-Forwarded-For instead.
+# Each proxy appends the address it received from, so the entry
+# RATE_LIMIT_TRUSTED_HOPS from the right was written by the outermost proxy you
+# run (1 = a single proxy, e.g. the platform's router). Entries left of it are
+# the client's to forge and are ignored. Only enable when a proxy sets the header.
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_TRUSTED_HOPS = int(os.getenv("RATE_LIMIT_TRUSTED_HOPS", 1))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# Set by serve.py for its workers
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", 1))
+# Largest request body read to find the account a request targets; bigger
+# bodies are passed on without an account key
+RATE_LIMIT_MAX_BODY_BYTES = int(os.getenv("RATE_LIMIT_MAX_BODY_BYTES", 16384))
+
+AUTH_RATE_PER_MINUTE_IP = float(os.getenv("AUTH_RATE_PER_MINUTE_IP", 30))
+AUTH_BURST_IP = int(os.getenv("AUTH_BURST_IP", 10))
+# Per target account, whichever IPs the attempts come from
+AUTH_RATE_PER_MINUTE_ACCOUNT = float(os.getenv("AUTH_RATE_PER_MINUTE_ACCOUNT", 10))
+AUTH_BURST_ACCOUNT = int(os.getenv("AUTH_BURST_ACCOUNT", 5))
+AUTH_MAX_IN_FLIGHT = int(os.getenv("AUTH_MAX_IN_FLIGHT", 32))
+CHAT_RATE_PER_MINUTE_USER = float(os.getenv("CHAT_RATE_PER_MINUTE_USER", 20))
+CHAT_BURST_USER = int(os.getenv("CHAT_BURST_USER", 5))
+CHAT_RATE_PER_MINUTE_IP = float(os.getenv("CHAT_RATE_PER_MINUTE_IP", 120))
+CHAT_BURST_IP = int(os.getenv("CHAT_BURST_IP", 20))
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", 64))
+
+shed_total = REGISTRY.counter(
+    "ratelimit_shed_total", "Requests rejected by admission control", ["route_class", "reason"]
+)
+admitted_total = REGISTRY.counter(
+    "ratelimit_admitted_total", "Requests admitted to a rate-limited route class", ["route_class"]
+)
+
+
+class TokenBucket:
+    """Classic token bucket: `burst` tokens, refilled at `rate` tokens per second."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """Consume one token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+@dataclass
+class RouteClass:
+    name: str
+    routes: Sequence[Tuple[str, str]]  # (method, path)
+    user_rate_per_minute: float = 0.0
+    user_burst: int = 0
+    ip_rate_per_minute: float = 0.0
+    ip_burst: int = 0
+    # JSON body field naming the account a request targets (e.g. the login email)
+    account_field: Optional[str] = None
+    account_rate_per_minute: float = 0.0
+    account_burst: int = 0
+    max_in_flight: int = 0
+
+    def per_worker(self, workers: int) -> "RouteClass":
+        """This class's budgets split evenly across `workers` processes."""
+        if workers <= 1:
+            return self
+        return replace(
+            self,
+            user_rate_per_minute=self.user_rate_per_minute / workers,
+            user_burst=_share(self.user_burst, workers),
+            ip_rate_per_minute=self.ip_rate_per_minute / workers,
+            ip_burst=_share(self.ip_burst, workers),
+            account_rate_per_minute=self.account_rate_per_minute / workers,
+            account_burst=_share(self.account_burst, workers),
+            max_in_flight=_share(self.max_in_flight, workers),
+        )
+
+
+def _share(value: int, workers: int) -> int:
+    # Rounded up so a non-zero budget never becomes 0 (which would disable it)
+    return math.ceil(value / workers) if value > 0 else value
+
+
+DEFAULT_ROUTE_CLASSES = (
+    RouteClass(
+        "auth",
+        [("POST", "/auth/login"), ("POST", "/auth/signup/parent"), ("POST", "/auth/signup/student")],
+        ip_rate_per_minute=AUTH_RATE_PER_MINUTE_IP,
+        ip_burst=AUTH_BURST_IP,
+        account_field="email",
+        account_rate_per_minute=AUTH_RATE_PER_MINUTE_ACCOUNT,
+        account_burst=AUTH_BURST_ACCOUNT,
+        max_in_flight=AUTH_MAX_IN_FLIGHT,
+    ),
+    RouteClass(
+        "chat",
+        [("POST", "/api/chat"), ("POST", "/api/chat/stream"), ("POST", "/api/chat/async")],
+        user_rate_per_minute=CHAT_RATE_PER_MINUTE_USER,
+        user_burst=CHAT_BURST_USER,
+        ip_rate_per_minute=CHAT_RATE_PER_MINUTE_IP,
+        ip_burst=CHAT_BURST_IP,
+        max_in_flight=CHAT_MAX_IN_FLIGHT,
+    ),
+)
+
+
+class _Limiter:
+    """Buckets and in-flight count for one route class."""
+
+    def __init__(self, route_class: RouteClass, max_keys: int):
+        self.route_class = route_class
+        self.in_flight = 0
+        # An idle bucket refills completely after burst / rate seconds, at which
+        # point forgetting it is equivalent to keeping it, so the TTL bounds memory.
+        self.user_buckets = self._buckets("user", route_class.user_rate_per_minute, route_class.user_burst, max_keys)
+        self.ip_buckets = self._buckets("ip", route_class.ip_rate_per_minute, route_class.ip_burst, max_keys)
+        self.account_buckets = None
+        if route_class.account_field:
+            self.account_buckets = self._buckets("account", route_class.account_rate_per_minute, route_class.account_burst, max_keys)
+
+    def _buckets(self, scope: str, rate_per_minute: float, burst: int, max_keys: int) -> Optional[TTLCache]:
+        if rate_per_minute <= 0 or burst <= 0:
+            return None
+        return TTLCache(f"ratelimit.{self.route_class.name}.{scope}", maxsize=max_keys, ttl=burst / (rate_per_minute / 60))
+
+    def take(self, buckets: Optional[TTLCache], key: Optional[str], rate_per_minute: float, burst: int) -> float:
+        if buckets is None or key is None:
+            return 0.0
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rate_per_minute / 60, burst)
+        retry_after = bucket.take()
+        # Re-set on every hit so the entry's TTL runs from the last request
+        buckets.set(key, bucket)
+        return retry_after
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.route_class.max_in_flight,
+            "tracked_users": len(self.user_buckets) if self.user_buckets is not None else 0,
+            "tracked_ips": len(self.ip_buckets) if self.ip_buckets is not None else 0,
+            "tracked_accounts": len(self.account_buckets) if self.account_buckets is not None else 0,
+        }
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def account_key(value) -> Optional[str]:
+    """Bucket key for an account identifier: a hash of it, trimmed and lowercased.
+
+    Hashed so the buckets never hold the emails themselves.
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return hashlib.sha256(value.strip().lower().encode()).hexdigest()
+
+
+async def _buffer_body(receive, limit: int):
+    """Read the request body ahead of the app, up to `limit` bytes.
+
+    Returns the body (None if it was larger than `limit` or the client went
+    away) and a receive callable that replays what was read, then continues
+    with the original stream.
+    """
+    messages = []
+    chunks = []
+    size = 0
+    complete = False
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            break
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            complete = True
+            break
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return (b"".join(chunks) if complete else None), replay
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware applying token buckets and in-flight caps per route class.
+
+    The user key is the bearer token's subject, decoded through the same
+    memoized path as get_current_user. Requests without a valid token are
+    limited by IP only and left for the route to reject.
+
+    Route classes with an `account_field` also limit by the account a request
+    targets, read from its JSON body, so guessing one account's password from
+    many IPs still runs into that account's bucket. The body is buffered here
+    and replayed to the app; one that is not JSON or lacks the field is
+    passed on without an account key, for the route's validation to reject.
+    """
+
+    def __init__(
+        self,
+        app,
+        route_classes: Sequence[RouteClass] = DEFAULT_ROUTE_CLASSES,
+        enabled: bool = RATE_LIMIT_ENABLED,
+        trust_proxy: bool = RATE_LIMIT_TRUST_PROXY,
+        trusted_hops: int = RATE_LIMIT_TRUSTED_HOPS,
+        max_keys: int = RATE_LIMIT_MAX_KEYS,
+        max_body_bytes: int = RATE_LIMIT_MAX_BODY_BYTES,
+        workers: int = SERVE_WORKERS,
+    ):
+        self.app = app
+        route_classes = [rc.per_worker(workers) for rc in route_classes]
+        self.enabled = enabled
+        self.trust_proxy = trust_proxy
+        self.trusted_hops = max(1, trusted_hops)
+        self.max_body_bytes = max_body_bytes
+        self.limiters = {rc.name: _Limiter(rc, max_keys) for rc in route_classes}
+        self._routes = {route: self.limiters[rc.name] for rc in route_classes for route in rc.routes}
+        limiters[id(self)] = self
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limiter = self._routes.get((scope["method"], scope["path"].rstrip("/") or "/"))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = limiter.route_class
+        if route_class.max_in_flight and limiter.in_flight >= route_class.max_in_flight:
+            await self._reject(send, route_class.name, "concurrency", 503, 1.0, "Server busy, try again shortly")
+            return
+
+        retry_after = limiter.take(limiter.ip_buckets, self._client_ip(scope), route_class.ip_rate_per_minute, route_class.ip_burst)
+        reason = "ip_rate"
+        if not retry_after:
+            retry_after = limiter.take(limiter.user_buckets, self._user_key(scope), route_class.user_rate_per_minute, route_class.user_burst)
+            reason = "user_rate"
+        if not retry_after and limiter.account_buckets is not None:
+            body, receive = await _buffer_body(receive, self.max_body_bytes)
+            retry_after = limiter.take(limiter.account_buckets, self._account_key(body, route_class.account_field), route_class.account_rate_per_minute, route_class.account_burst)
+            reason = "account_rate"
+        if retry_after:
+            await self._reject(send, route_class.name, reason, 429, retry_after, "Too many requests")
+            return
+
+        admitted_total.inc(route_class=route_class.name)
+        limiter.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.in_flight -= 1
+
+    def _client_ip(self, scope) -> Optional[str]:
+        if self.trust_proxy:
+            forwarded = _header(scope, b"x-forwarded-for")
+            if forwarded:
+                entries = [entry.strip() for entry in forwarded.split(b",")]
+                # Fewer entries than hops: the leftmost is the nearest to the client there is
+                return entries[-min(self.trusted_hops, len(entries))].decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else None
+
+    def _user_key(self, scope) -> Optional[str]:
+        authorization = _header(scope, b"authorization")
+        if not authorization or not authorization[:7].lower() == b"bearer ":
+            return None
+        # Imported here so this module does not pull in the models at import time
+        from auth import decode_access_token
+        try:
+            return decode_access_token(authorization[7:].decode("latin-1").strip()).get("sub")
+        except (JWTError, UnicodeDecodeError):
+            return None
+
+    def _account_key(self, body: Optional[bytes], field: str) -> Optional[str]:
+        if not body:
+            return None
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return None
+        if not isinstance(payload, dict):
+            return None
+        return account_key(payload.get(field))
+
+    async def _reject(self, send, route_class: str, reason: str, status_code: int, retry_after: float, detail: str):
+        shed_total.inc(route_class=route_class, reason=reason)
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+# Live middleware instances, so /healthz and /metrics can report in-flight counts
+limiters: Dict[int, RateLimitMiddleware] = {}
+
+
+def ratelimit_stats() -> Dict[str, Dict[str, int]]:
+    stats: Dict[str, Dict[str, int]] = {}
+    for middleware in limiters.values():
+        stats.update(middleware.stats())
+    return stats
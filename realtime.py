@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Dict
+
+from dotenv import load_dotenv
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from pubsub import Subscription
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# An idle connection gets a {"type": "ping"} frame this often, which keeps
+# proxies (most close idle sockets after 60 s) from dropping it and lets the
+# server notice dead peers on the next send.
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", 25))
+
+# Close codes (RFC 6455 / IANA registry)
+WS_POLICY_VIOLATION = 1008  # bad or missing credentials, no family
+WS_TRY_AGAIN_LATER = 1013  # fell behind; reconnect and backfill from /api/chat/history
+
+PING_FRAME = '{"type":"ping"}'
+PONG_FRAME = '{"type":"pong"}'
+
+logger = logging.getLogger(__name__)
+
+_connections = 0
+
+
+async def _send_loop(websocket: WebSocket, subscription: Subscription) -> None:
+    while True:
+        try:
+            message = await subscription.get(timeout=WS_HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            message = PING_FRAME
+        if message is None:
+            return
+        await websocket.send_text(message)
+
+
+async def _receive_loop(websocket: WebSocket) -> None:
+    # Clients only ever send pings; anything else is ignored
+    while True:
+        if await websocket.receive_text() == "ping":
+            await websocket.send_text(PONG_FRAME)
+
+
+async def serve_subscription(websocket: WebSocket, subscription: Subscription) -> None:
+    """Forward `subscription` to an accepted WebSocket until either side goes away."""
+    global _connections
+    _connections += 1
+    sender = asyncio.create_task(_send_loop(websocket, subscription))
+    receiver = asyncio.create_task(_receive_loop(websocket))
+    try:
+        await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        _connections -= 1
+        for task in (sender, receiver):
+            task.cancel()
+        results = await asyncio.gather(sender, receiver, return_exceptions=True)
+        subscription.close()
+
+    for result in results:
+        if isinstance(result, Exception) and not isinstance(result, (WebSocketDisconnect, asyncio.CancelledError)):
+            logger.warning("WebSocket connection ended with an error", exc_info=result)
+    if subscription.overflowed:
+        await _close_quietly(websocket, WS_TRY_AGAIN_LATER)
+    elif sender.done() and not sender.cancelled() and sender.exception() is None:
+        # The broker closed the subscription (shutdown)
+        await _close_quietly(websocket, 1001)
+
+
+async def _close_quietly(websocket: WebSocket, code: int) -> None:
+    try:
+        await websocket.close(code=code)
+    except Exception:
+        # Already closed by the peer
+        pass
+
+
+def realtime_stats() -> Dict[str, int]:
+    return {"websocket_connections": _connections}
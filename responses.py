@@ -0,0 +1,39 @@
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from pydantic import BaseModel
+from starlette.responses import Response
+
+from metrics import span
+
+# Handlers that already hold typed data (Beanie documents, raw Mongo rows shaped
+# like the response model) return TrustedJSONResponse directly. FastAPI passes
+# Response objects through untouched, so the payload is serialized once by
+# orjson instead of being dumped, re-validated against response_model and
+# encoded again. The route keeps its response_model for the OpenAPI schema; the
+# payload builders (chat.message_payload, catalog.college_payload) are what keep
+# the wire format in step with it.
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """orjson with ObjectId and pydantic model support."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class TrustedJSONResponse(Response):
+    """JSON response for content that needs no validation, only encoding."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with span("serialize.json"):
+            return dumps(content)
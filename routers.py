@@ -1,52 +1,85 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+import asyncio
+import logging
 import secrets
-import random
+import os
 from datetime import datetime
 
-from models import User, Family, College, Milestone, Tip, ChatMessage
+from beanie import PydanticObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import transaction
+from models import User, Family, Job
 from schemas import (
-    CollegeMatch, FamilyHQData, SoulScanProfile, SupportCircle,
+    CollegeMatch, CollegeQueryResponse, FamilyHQData,
     UserCreate, UserLogin, Token, InviteResponse, StudentSignup, UserResponse,
-    ChatMessageCreate, ChatMessageResponse
+    ChatMessageCreate, ChatMessageResponse, ChatSearchResponse, JobResponse, BootstrapResponse
+)
+from chat import (
+    DEFAULT_HISTORY_LIMIT, MAX_HISTORY_LIMIT, InvalidCursor, GenerationTiming,
+    build_prompt, collect_reply, fetch_history, message_payload, save_ai_message, save_user_message,
+    sse_event, stream_reply
 )
-from auth import get_password_hash, verify_password, create_access_token, get_current_user
+from catalog import build_filter, college_payload, query_colleges
+from dashboard import DEFAULT_SOUL_SCAN_PROFILE, etag_matches, get_dashboard_snapshot
+from chat_store import get_chat_store
+from cohort import cohort_stats
+from jobs import job_payload, job_queue
+from llm import get_llm_provider
+from responses import TrustedJSONResponse, dumps
+from memory import load_memory, remember
+from pubsub import family_channel, get_broker
+from search import SEARCH_MAX_OFFSET, search_messages
+from realtime import WS_POLICY_VIOLATION, serve_subscription
+from auth import authenticate, get_password_hash_async, verify_password_async, create_access_token, get_current_user
+
+PUBLIC_DASHBOARD_MAX_AGE = int(os.getenv("PUBLIC_DASHBOARD_MAX_AGE", 60))
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # --- Auth Routes ---
 
 @router.post("/auth/signup/parent", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup_parent(user_data: UserCreate):
-    # Check existing
-    if await User.find_one(User.email == user_data.email):
+    # Turn away a taken email before paying for the bcrypt hash. This is
+    # only a shortcut: two signups can both pass it, and the unique email
+    # index (DuplicateKeyError below) is what lets just one of them in.
+    if await User.get_motor_collection().find_one({"email": user_data.email}, {"_id": 1}):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+    # Ids are generated up front so the user and family can reference each
+    # other in their first (and only) write.
+    hashed_password = await get_password_hash_async(user_data.password)
+    user_id, family_id = PydanticObjectId(), PydanticObjectId()
+    new_user = User(
+        id=user_id,
+        email=user_data.email,
+        hashed_password=hashed_password,
+        role="parent",
+        is_verified=False,
+        profile=user_data.profile,
+        family_id=family_id
+    )
+    new_family = Family(id=family_id, parent_id=user_id)
 
     try:
-        # Create User
-        new_user = User(
-            email=user_data.email,
-            hashed_password=get_password_hash(user_data.password),
-            role="parent",
-            is_verified=False,
-            profile=user_data.profile
-        )
-        await new_user.create()
-
-        # Create Family
-        new_family = Family(parent_id=new_user.id)
-        await new_family.create()
-
-        # Link user to family
-        new_user.family_id = new_family.id
-        await new_user.save()
-        
+        async with transaction(_mongo_client()) as session:
+            await new_user.insert(session=session)
+            try:
+                await new_family.insert(session=session)
+            except Exception:
+                if session is None:
+                    await new_user.delete()
+                raise
+        cohort_stats.record(parents=1, families=1)
         return new_user
-    except Exception as e:
-        # In a real app, log the error
-        print(f"Error creating parent account: {e}")
-        # Rollback would be good here if transactions were supported fully across all mongo versions/drivers used here easily
-        # For prototype, we'll raise server error
+    except DuplicateKeyError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+    except Exception:
+        logger.exception("Error creating parent account")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create account")
 
 @router.post("/auth/login", response_model=Token)
@@ -54,7 +87,7 @@ async def login(login_data: UserLogin):
     # Find user
     user = await User.find_one(User.email == login_data.email)
     
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not user or not await verify_password_async(login_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -76,114 +109,145 @@ async def generate_invite(current_user: User = Depends(get_current_user)):
         # Generate token
         invite_token = secrets.token_urlsafe(16)
         
-        # Update Family
-        family = await Family.get(current_user.family_id)
-        if not family:
+        # Update only the token, so a concurrent student claim is never overwritten
+        result = await Family.get_motor_collection().update_one(
+            {"_id": current_user.family_id},
+            {"$set": {"invite_token": invite_token}},
+        )
+        if result.matched_count == 0:
              raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Family not found")
-             
-        family.invite_token = invite_token
-        await family.save()
         
         return {"invite_token": invite_token}
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error generating invite: {e}")
+    except Exception:
+        logger.exception("Error generating invite")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate invite")
 
 @router.post("/auth/signup/student", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup_student(signup_data: StudentSignup):
-    # Validate token
-    family = await Family.find_one(Family.invite_token == signup_data.invite_token)
-    
-    if not family:
+    families = Family.get_motor_collection()
+    # Turn away unusable invites and taken emails before paying for the bcrypt
+    # hash. Only a shortcut, as in signup_parent: the atomic claim below and
+    # the unique email index decide between concurrent signups.
+    if not await families.find_one({"invite_token": signup_data.invite_token, "student_id": None}, {"_id": 1}):
+        if await families.find_one({"invite_token": signup_data.invite_token}, {"_id": 1}):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Family already has a student registered")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid invite token")
-        
-    if family.student_id:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Family already has a student registered")
-
-    # Check email
-    if await User.find_one(User.email == signup_data.email):
+    if await User.get_motor_collection().find_one({"email": signup_data.email}, {"_id": 1}):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+    hashed_password = await get_password_hash_async(signup_data.password)
+    student_id = PydanticObjectId()
 
     try:
-        # Create Student
-        new_student = User(
-            email=signup_data.email,
-            hashed_password=get_password_hash(signup_data.password),
-            role="student",
-            is_verified=True,
-            family_id=family.id,
-            profile=signup_data.profile
-        )
-        await new_student.create()
-        
-        # Update Family
-        family.student_id = new_student.id
-        family.invite_token = None # Invalidate token after use
-        await family.save()
-        
+        async with transaction(_mongo_client()) as session:
+            # Claim the invite atomically: of any number of concurrent signups
+            # with the same token, exactly one matches this filter.
+            family = await families.find_one_and_update(
+                {"invite_token": signup_data.invite_token, "student_id": None},
+                {"$set": {"student_id": student_id}, "$unset": {"invite_token": ""}},
+                return_document=ReturnDocument.AFTER,
+                session=session,
+            )
+            if family is None:
+                # Slow path only: work out which error to report
+                if await families.find_one({"invite_token": signup_data.invite_token}, {"_id": 1}, session=session):
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Family already has a student registered")
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid invite token")
+
+            new_student = User(
+                id=student_id,
+                email=signup_data.email,
+                hashed_password=hashed_password,
+                role="student",
+                is_verified=True,
+                family_id=family["_id"],
+                profile=signup_data.profile
+            )
+            try:
+                await new_student.insert(session=session)
+            except Exception:
+                if session is None:
+                    # No transaction to abort: hand the invite back
+                    await families.update_one(
+                        {"_id": family["_id"], "student_id": student_id},
+                        {"$set": {"student_id": None, "invite_token": signup_data.invite_token}},
+                    )
+                raise
+        cohort_stats.record(students=1, families_with_student=1)
         return new_student
-    except Exception as e:
-        print(f"Error creating student account: {e}")
+    except HTTPException:
+        raise
+    except DuplicateKeyError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+    except Exception:
+        logger.exception("Error creating student account")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create account")
 
+def _mongo_client():
+    return User.get_motor_collection().database.client
+
 
 # --- Data Routes ---
 
 @router.get("/api/colleges/matches", response_model=List[CollegeMatch])
-async def get_college_matches(current_user: User = Depends(get_current_user)):
-    # In a real scenario, we'd filter based on student profile/preferences using embeddings
-    # For now, we'll simulate AI matching by returning a random subset of colleges
-    # This makes the "matching" feel dynamic for the prototype
-    
-    all_colleges = await College.find_all().to_list()
-    
-    # Shuffle and pick 2-3 colleges to simulate a "curated" list
-    if len(all_colleges) > 0:
-        num_matches = min(len(all_colleges), 3)
-        return random.sample(all_colleges, num_matches)
-    
-    return []
+async def get_college_matches(
+    limit: int = Query(3, ge=1, le=20),
+    current_user: User = Depends(get_current_user),
+):
+    return TrustedJSONResponse(await _college_matches(current_user, limit))
+
+async def _college_matches(user: User, limit: int) -> List[dict]:
+    # Imported on first use to keep NumPy off the cold-start path
+    from matching import college_engine, profile_vector
+
+    # Score the whole catalog against the user's profile in one matrix product;
+    # the SoulScan traits stand in until the profile has been filled in
+    await college_engine.ensure_loaded()
+    soul_scan = DEFAULT_SOUL_SCAN_PROFILE.model_dump() if not user.profile else None
+    query = profile_vector(user.profile, soul_scan)
+
+    return [
+        college_payload(college.model_dump(by_alias=True), fit_score=round(score, 4))
+        for college, score in college_engine.match(query, limit)
+    ]
+
+@router.get("/api/colleges", response_model=CollegeQueryResponse)
+async def search_colleges(
+    min_tuition: Optional[int] = Query(None, ge=0),
+    max_tuition: Optional[int] = Query(None, ge=0),
+    min_acceptance_rate: Optional[float] = Query(None, ge=0, le=100),
+    max_acceptance_rate: Optional[float] = Query(None, ge=0, le=100),
+    sort: Literal["name", "tuition", "-tuition", "acceptance_rate", "-acceptance_rate"] = "name",
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+):
+    query = build_filter(min_tuition, max_tuition, min_acceptance_rate, max_acceptance_rate)
+    try:
+        return TrustedJSONResponse(await query_colleges(query, sort=sort, page=page, page_size=page_size))
+    except Exception:
+        logger.exception("Error querying colleges")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to query colleges")
 
 @router.get("/api/dashboard/family", response_model=FamilyHQData)
-async def get_family_dashboard_data(current_user: User = Depends(get_current_user)):
-    return await _get_dashboard_data()
+async def get_family_dashboard_data(
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+):
+    return await _dashboard_response(if_none_match, cache_control="private, no-cache")
 
 @router.get("/api/public/dashboard/preview", response_model=FamilyHQData)
-async def get_public_dashboard_preview():
-    return await _get_dashboard_data()
-
-async def _get_dashboard_data():
-    # Fetch milestones
-    milestones = await Milestone.find(Milestone.is_default == True).to_list()
-    monthly_focus = [m.text for m in milestones]
-
-    # Fetch tips
-    tips = await Tip.find_all().to_list()
-    insider_tips = [t.text for t in tips]
-
-    # Mock/Profile data for the rest
-    student_profile = SoulScanProfile(
-        identity_traits=["Curious", "Analytical", "Creative", "Empathetic"],
-        learning_style=["Hands-on", "Collaborative", "Self-directed"],
-        motivations=["Impact", "Innovation", "Personal Growth"],
-        career_vibes=["Research", "Arts & Culture", "Social Impact"]
-    )
-    
-    support_circle = SupportCircle(
-        peer_progress_stats="85% of students in your cohort have started their essays.",
-        leaderboard_glimpse=["Top Essay Drafts: Alex C., Maya S.", "Most College Visits: Ben T., Chloe L."],
-        parent_board_preview="Discussion: 'Navigating financial aid forms.'",
-        student_board_preview="Poll: 'What's your biggest college application stress?'"
-    )
+async def get_public_dashboard_preview(if_none_match: Optional[str] = Header(None)):
+    return await _dashboard_response(if_none_match, cache_control=f"public, max-age={PUBLIC_DASHBOARD_MAX_AGE}")
 
-    return FamilyHQData(
-        monthlyFocus=monthly_focus,
-        soulScanProfile=student_profile,
-        supportCircle=support_circle,
-        insiderTips=insider_tips
-    )
+async def _dashboard_response(if_none_match: Optional[str], cache_control: str) -> Response:
+    # The payload is cached pre-serialized, so this skips both Mongo and JSON encoding
+    snapshot = await get_dashboard_snapshot()
+    headers = {"ETag": snapshot.etag, "Cache-Control": cache_control}
+    if etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 # --- Chat Routes ---
 
@@ -194,45 +258,227 @@ async def send_chat_message(message: ChatMessageCreate, current_user: User = Dep
 
     try:
         # 1. Save User Message
-        user_msg = ChatMessage(
-            family_id=current_user.family_id,
-            sender_id=current_user.id,
-            sender_role=current_user.role,
-            content=message.content,
-            metadata=message.metadata
-        )
-        await user_msg.create()
+        user_msg = await save_user_message(current_user, message)
 
-        # 2. AI Processing (Stub)
-        # This is where LangChain/OpenAI integration would happen
-        # For now, a simple echo/response stub
-        ai_response_content = f"I'm Emma, your AI advisor. I received your message: '{message.content}'. I'm currently running in stub mode, but I'm ready to be connected to OpenAI!"
-        
-        ai_msg = ChatMessage(
-            family_id=current_user.family_id,
-            sender_role="ai",
-            content=ai_response_content
-        )
-        await ai_msg.create()
+        # 2. AI Processing, with the family's rolling summary and recent turns as context
+        provider = get_llm_provider(cache=message.cache)
+        conversation = await load_memory(current_user.family_id)
+        ai_response_content, timing = await collect_reply(provider, build_prompt(message.content, conversation))
 
-        return ChatMessageResponse(
-            _id=ai_msg.id,
-            sender_role=ai_msg.sender_role,
-            content=ai_msg.content,
-            timestamp=ai_msg.timestamp
+        ai_msg = await save_ai_message(
+            current_user.family_id,
+            ai_response_content,
+            {"provider": provider.name, **timing.as_metadata()},
         )
-    except Exception as e:
-        print(f"Error in chat processing: {e}")
+        await remember(current_user.family_id, [user_msg, ai_msg], provider)
+        return TrustedJSONResponse(message_payload(ai_msg))
+    except Exception:
+        logger.exception("Error in chat processing")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to process message")
+
+@router.post("/api/chat/stream")
+async def stream_chat_message(message: ChatMessageCreate, current_user: User = Depends(get_current_user)):
+    """Same as POST /api/chat, but streams the reply as Server-Sent Events.
+
+    Emits `token` events ({"text": ...}) as the model generates, then a single
+    `done` event carrying the persisted AI message, or `error` on failure.
+    """
+    if not current_user.family_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not linked to a family")
+
+    provider = get_llm_provider(cache=message.cache)
+    family_id = current_user.family_id
+    try:
+        user_msg = await save_user_message(current_user, message)
+        prompt = build_prompt(message.content, await load_memory(family_id))
+    except Exception:
+        logger.exception("Error in chat processing")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to process message")
 
+    async def events():
+        timing = GenerationTiming()
+        chunks = []
+        try:
+            async for chunk in stream_reply(provider, prompt, timing):
+                chunks.append(chunk)
+                yield sse_event("token", {"text": chunk})
+
+            # The reply is only persisted once the stream has completed
+            ai_msg = await save_ai_message(family_id, "".join(chunks), {"provider": provider.name, **timing.as_metadata()})
+            await remember(family_id, [user_msg, ai_msg], provider)
+            yield sse_event("done", message_payload(ai_msg))
+        except Exception:
+            logger.exception("Error streaming chat reply")
+            yield sse_event("error", {"detail": "Failed to process message"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/api/chat/async", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def send_chat_message_async(
+    message: ChatMessageCreate,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+):
+    """Same as POST /api/chat, but the reply is generated by the job queue.
+
+    Stores the user message, enqueues generation and returns 202 with the job.
+    Poll GET /api/jobs/{job_id} for the reply, or receive it on /ws/chat.
+    Retrying with the same Idempotency-Key header returns the original job
+    without storing the message again.
+    """
+    if not current_user.family_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not linked to a family")
+
+    # Keys are scoped to the user so clients cannot collide with each other
+    key = f"{current_user.id}:{idempotency_key}" if idempotency_key else None
+    try:
+        job = await Job.find_one(Job.idempotency_key == key) if key else None
+        if job is None:
+            user_msg = await save_user_message(current_user, message)
+            job, created = await job_queue.enqueue(
+                "chat.reply",
+                {
+                    "family_id": str(current_user.family_id),
+                    "user_message_id": str(user_msg.id),
+                    "reply_message_id": str(PydanticObjectId()),
+                    "cache": message.cache,
+                },
+                idempotency_key=key,
+                family_id=current_user.family_id,
+            )
+            if not created:
+                # A concurrent retry with the same key won; keep only its message
+                await get_chat_store().delete(user_msg)
+    except Exception:
+        logger.exception("Error enqueueing chat reply")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to process message")
+
+    return TrustedJSONResponse(
+        job_payload(job), status_code=status.HTTP_202_ACCEPTED, headers={"Location": f"/api/jobs/{job.id}"}
+    )
+
+@router.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: PydanticObjectId, current_user: User = Depends(get_current_user)):
+    job = await Job.get(job_id)
+    # Other families' jobs are reported as missing, not forbidden
+    if job is None or job.family_id is None or job.family_id != current_user.family_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return TrustedJSONResponse(job_payload(job))
+
 @router.get("/api/chat/history", response_model=List[ChatMessageResponse])
-async def get_chat_history(current_user: User = Depends(get_current_user)):
+async def get_chat_history(
+    before: Optional[str] = Query(None, description="Cursor of the oldest message already loaded"),
+    after: Optional[str] = Query(None, description="Cursor of the newest message already loaded"),
+    since: Optional[datetime] = Query(None, description="Only messages newer than this timestamp"),
+    limit: int = Query(DEFAULT_HISTORY_LIMIT, ge=1, le=MAX_HISTORY_LIMIT),
+    current_user: User = Depends(get_current_user),
+):
     if not current_user.family_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not linked to a family")
-    
+    if sum(param is not None for param in (before, after, since)) > 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use only one of before, after or since")
+
+    try:
+        messages = await fetch_history(current_user.family_id, before=before, after=after, since=since, limit=limit)
+        return TrustedJSONResponse([message_payload(m) for m in messages])
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception:
+        logger.exception("Error fetching chat history")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to fetch chat history")
+
+@router.get("/api/chat/search", response_model=ChatSearchResponse)
+async def search_chat(
+    q: str = Query(..., min_length=1, max_length=200, description="Search words; results contain any of them, best matches first"),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET),
+    current_user: User = Depends(get_current_user),
+):
+    if not current_user.family_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not linked to a family")
+
     try:
-        messages = await ChatMessage.find(ChatMessage.family_id == current_user.family_id).sort(+ChatMessage.timestamp).to_list()
-        return messages
-    except Exception as e:
-        print(f"Error fetching chat history: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to fetch chat history")
\ No newline at end of file
+        results, has_more = await search_messages(current_user.family_id, q, limit, offset)
+    except Exception:
+        logger.exception("Error searching chat history")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to search messages")
+    return TrustedJSONResponse({"results": results, "offset": offset, "limit": limit, "has_more": has_more})
+
+# --- App Bootstrap ---
+
+BOOTSTRAP_SECTIONS = ("dashboard", "matches", "chat")
+
+@router.get("/api/bootstrap", response_model=BootstrapResponse)
+async def bootstrap(
+    sections: str = Query(",".join(BOOTSTRAP_SECTIONS), description="Comma-separated subset of dashboard, matches, chat"),
+    matches_limit: int = Query(3, ge=1, le=20),
+    chat_limit: int = Query(DEFAULT_HISTORY_LIMIT, ge=1, le=MAX_HISTORY_LIMIT),
+    current_user: User = Depends(get_current_user),
+):
+    """Everything the app needs after login, in one request.
+
+    Equivalent to /api/dashboard/family, /api/colleges/matches and the newest
+    page of /api/chat/history, but the principal is resolved once and the
+    sections are loaded concurrently. A section that fails is left out and
+    named in `errors`, so the rest of the app can still render.
+    """
+    requested = [name.strip() for name in sections.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(BOOTSTRAP_SECTIONS))
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown sections: {', '.join(unknown)}")
+
+    async def dashboard_section() -> bytes:
+        return (await get_dashboard_snapshot()).body
+
+    async def matches_section() -> bytes:
+        return dumps(await _college_matches(current_user, matches_limit))
+
+    async def chat_section() -> bytes:
+        if not current_user.family_id:
+            return b"[]"
+        messages = await fetch_history(current_user.family_id, limit=chat_limit)
+        return dumps([message_payload(m) for m in messages])
+
+    loaders = {"dashboard": dashboard_section, "matches": matches_section, "chat": chat_section}
+    names = [name for name in BOOTSTRAP_SECTIONS if name in requested]
+    results = await asyncio.gather(*(loaders[name]() for name in names), return_exceptions=True)
+
+    # Each section arrives already serialized (the dashboard straight from its
+    # cache), so the envelope is assembled from bytes rather than re-encoded
+    parts, errors = [], {}
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            logger.error("Bootstrap section failed", exc_info=result, extra={"section": name})
+            errors[name] = "Failed to load"
+        else:
+            parts.append(b'"' + name.encode() + b'":' + result)
+    parts.append(b'"errors":' + dumps(errors))
+    return Response(content=b"{" + b",".join(parts) + b"}", media_type="application/json")
+
+@router.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """Live feed of the caller's family chat.
+
+    Authenticate with `?token=<JWT>` (browsers cannot set headers on a
+    WebSocket handshake) or an `Authorization: Bearer` header. Every message
+    persisted for the family arrives as {"type": "message", "message": {...}}
+    in the /api/chat/history format; idle connections get {"type": "ping"}.
+    Close code 1013 means the client fell behind: reconnect and backfill with
+    /api/chat/history?after=<last cursor>.
+    """
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        token = authorization[7:] if authorization.lower().startswith("bearer ") else None
+    user = await authenticate(token) if token else None
+    if user is None or not user.family_id:
+        await websocket.close(code=WS_POLICY_VIOLATION)
+        return
+
+    # Subscribe before accepting so nothing published in between is missed
+    async with get_broker().subscribe(family_channel(user.family_id)) as subscription:
+        await websocket.accept()
+        await serve_subscription(websocket, subscription)
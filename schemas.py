@@ -20,11 +20,27 @@ class CollegeMatch(BaseModel):
     fitReason: Optional[str] = Field(None, alias="default_fit_reason")
     fitReasonStudent: Optional[str] = Field(None, alias="default_fit_reason_student")
     richMediaLinks: List[RichMediaLink] = Field(..., alias="rich_media_links")
+    # Cosine similarity between the student profile and the college, 0-1
+    fitScore: Optional[float] = Field(None, alias="fit_score")
+    acceptanceRatePct: Optional[float] = Field(None, alias="acceptance_rate_pct")
+    tuitionUsd: Optional[int] = Field(None, alias="tuition_usd")
 
     class Config:
         populate_by_name = True
         from_attributes = True
 
+class FacetBucket(BaseModel):
+    min: Optional[float] = None  # None for the bucket of unparseable values
+    max: Optional[float] = None
+    count: int
+
+class CollegeQueryResponse(BaseModel):
+    items: List[CollegeMatch]
+    total: int
+    page: int
+    page_size: int
+    facets: Dict[str, List[FacetBucket]]
+
 class SoulScanProfile(BaseModel):
     identity_traits: List[str] = []
     learning_style: List[str] = []
@@ -48,17 +64,56 @@ class FamilyHQData(BaseModel):
 class ChatMessageCreate(BaseModel):
     content: str
     metadata: Optional[Dict[str, Any]] = {}
+    # False skips the shared LLM reply cache, e.g. for a personalized prompt
+    cache: bool = True
 
 class ChatMessageResponse(BaseModel):
     id: Optional[PydanticObjectId] = Field(None, alias="_id")
     sender_role: str
     content: str
     timestamp: datetime
+    # Opaque keyset cursor; pass as `before`/`after` to /api/chat/history
+    cursor: Optional[str] = None
     
     class Config:
         populate_by_name = True
         from_attributes = True
 
+class ChatSearchHit(ChatMessageResponse):
+    score: float
+    # Excerpt around the first match, and [start, end) character offsets of
+    # the matched words within it
+    snippet: str
+    highlights: List[List[int]] = []
+
+class ChatSearchResponse(BaseModel):
+    results: List[ChatSearchHit]
+    offset: int
+    limit: int
+    has_more: bool
+
+class JobResponse(BaseModel):
+    id: Optional[PydanticObjectId] = Field(None, alias="_id")
+    kind: str
+    status: str  # "queued", "running", "succeeded", "failed"
+    attempts: int
+    # For chat.reply: {"message": <ChatMessageResponse>} once succeeded
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        populate_by_name = True
+
+class BootstrapResponse(BaseModel):
+    # Sections not requested, or that failed to load, are absent
+    dashboard: Optional[FamilyHQData] = None
+    matches: Optional[List[CollegeMatch]] = None
+    chat: Optional[List[ChatMessageResponse]] = None
+    # Section name -> message, for sections that failed
+    errors: Dict[str, str] = {}
+
 # --- Auth & User Schemas ---
 
 class UserBase(BaseModel):
@@ -0,0 +1,263 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from beanie import PydanticObjectId
+from dotenv import load_dotenv
+from pymongo.errors import OperationFailure
+
+from cache import TTLCache
+from chat import MAX_HISTORY_LIMIT, message_payload
+from chat_store import Key, get_chat_store
+from metrics import REGISTRY, span
+from models import ChatMessage
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+# Backend for /api/chat/search:
+#   "auto" (default)  Mongo $text over the chat_messages text index, falling back
+#                     to "memory" for bucketed storage or a server without $text
+#   "mongo"           always $text (CHAT_STORAGE=documents only)
+#   "memory"          a per-family inverted index built in this process from the
+#                     chat store, then kept current from the same feed as
+#                     /api/chat/history?after=; covers archived buckets too,
+#                     but only a family's newest SEARCH_INDEX_MAX_MESSAGES
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+# In-memory indexes kept (one per family, LRU) and how long before one is
+# rebuilt from scratch, which also drops messages deleted since it was built
+SEARCH_INDEX_FAMILIES = int(os.getenv("SEARCH_INDEX_FAMILIES", 1000))
+SEARCH_INDEX_TTL_SECONDS = float(os.getenv("SEARCH_INDEX_TTL_SECONDS", 3600))
+# Messages indexed per family: the newest ones, older ones drop out of the
+# in-memory index (and so out of "memory" search results) as new ones arrive
+SEARCH_INDEX_MAX_MESSAGES = int(os.getenv("SEARCH_INDEX_MAX_MESSAGES", 5000))
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", 160))
+SEARCH_MAX_OFFSET = 1000
+
+logger = logging.getLogger(__name__)
+
+searches_total = REGISTRY.counter("chat_searches_total", "Chat searches by backend", ["backend"])
+
+search_index_cache = TTLCache("search_index", maxsize=SEARCH_INDEX_FAMILIES, ttl=SEARCH_INDEX_TTL_SECONDS)
+
+_WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?")
+# A short list in the spirit of Mongo's English text index, so both backends
+# ignore roughly the same words
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from had has have how i if in is it its me my "
+    "no not of on or our so than that the their them then there they this to was we were "
+    "what when where which who why will with you your".split()
+)
+_EPOCH_KEY: Key = (datetime(1970, 1, 1), PydanticObjectId("0" * 24))
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+def _stem(word: str) -> str:
+    # Light plural folding only ("essays" finds "essay"); Mongo's stemmer goes further
+    if word.endswith("'s"):
+        word = word[:-2]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(text: str) -> List[str]:
+    """Normalized, stopword-free search terms of `text`, in order."""
+    words = (w.lower() for w in _WORD.findall(text))
+    return [_stem(w) for w in words if w not in STOPWORDS]
+
+
+def snippet(content: str, query_terms: Set[str], max_chars: int = SEARCH_SNIPPET_CHARS) -> Tuple[str, List[List[int]]]:
+    """Up to max_chars of `content` around the first match, plus [start, end) offsets of every match in it.
+
+    Offsets rather than markup, so clients can highlight without rendering
+    message text as HTML.
+    """
+    spans = [m.span() for m in _WORD.finditer(content) if _stem(m.group().lower()) in query_terms]
+    start, end = 0, len(content)
+    if len(content) > max_chars:
+        first = spans[0][0] if spans else 0
+        start = max(0, min(first - max_chars // 3, len(content) - max_chars))
+        end = start + max_chars
+        # Don't cut words in half
+        if start > 0:
+            space = content.find(" ", start, first + 1 if spans else end)
+            start = space + 1 if space != -1 else start
+        if end < len(content):
+            space = content.rfind(" ", start, end)
+            end = space if space > start else end
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(content) else ""
+    shift = len(prefix) - start
+    highlights = [[s + shift, e + shift] for s, e in spans if s >= start and e <= end]
+    return prefix + content[start:end] + suffix, highlights
+
+
+class IndexedMessage(NamedTuple):
+    """What the index keeps of a message: enough for message_payload and a snippet."""
+
+    id: PydanticObjectId
+    timestamp: datetime
+    sender_role: str
+    content: str
+
+
+class FamilyIndex:
+    """Inverted index over one family's newest `max_messages` messages, ranked with BM25."""
+
+    def __init__(self, max_messages: int = SEARCH_INDEX_MAX_MESSAGES):
+        self.max_messages = max_messages
+        self.postings: Dict[str, Dict[PydanticObjectId, int]] = {}
+        # In the order added, i.e. oldest first, so eviction pops from the front
+        self.messages: Dict[PydanticObjectId, IndexedMessage] = {}
+        self.lengths: Dict[PydanticObjectId, int] = {}
+        self.total_length = 0
+        # Newest (timestamp, _id) indexed; the next refresh reads after it
+        self.last_key: Key = _EPOCH_KEY
+        self.lock = asyncio.Lock()
+
+    def add(self, message: ChatMessage) -> None:
+        if message.id in self.messages:
+            return
+        tokens = terms(message.content)
+        for term, count in Counter(tokens).items():
+            self.postings.setdefault(term, {})[message.id] = count
+        self.messages[message.id] = IndexedMessage(message.id, message.timestamp, message.sender_role, message.content)
+        self.lengths[message.id] = len(tokens)
+        self.total_length += len(tokens)
+        self.last_key = max(self.last_key, (message.timestamp, message.id))
+        while len(self.messages) > self.max_messages:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        message_id, message = next(iter(self.messages.items()))
+        del self.messages[message_id]
+        self.total_length -= self.lengths.pop(message_id)
+        for term in set(terms(message.content)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(message_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query_terms: Set[str], count: int) -> List[Tuple[float, IndexedMessage]]:
+        """The `count` best matches for any of the terms, best first; ties go to the newer message."""
+        if not self.messages:
+            return []
+        total = len(self.messages)
+        average_length = self.total_length / total or 1
+        scores: Dict[PydanticObjectId, float] = {}
+        for term in query_terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for message_id, tf in postings.items():
+                norm = _K1 * (1 - _B + _B * self.lengths[message_id] / average_length)
+                scores[message_id] = scores.get(message_id, 0.0) + idf * tf * (_K1 + 1) / (tf + norm)
+        best = heapq.nlargest(count, scores.items(), key=lambda item: (item[1], self.messages[item[0]].timestamp))
+        return [(score, self.messages[message_id]) for message_id, score in best]
+
+
+async def _family_index(family_id: PydanticObjectId) -> FamilyIndex:
+    index = search_index_cache.get(family_id)
+    if index is None:
+        index = FamilyIndex()
+        search_index_cache.set(family_id, index)
+    # Concurrent searches share one catch-up read instead of each doing their own
+    async with index.lock:
+        store = get_chat_store()
+        while True:
+            page = await store.find(family_id, MAX_HISTORY_LIMIT, after=index.last_key)
+            for message in page:
+                index.add(message)
+            if len(page) < MAX_HISTORY_LIMIT:
+                break
+    return index
+
+
+async def _memory_search(family_id: PydanticObjectId, query_terms: Set[str], limit: int, offset: int):
+    index = await _family_index(family_id)
+    return index.search(query_terms, offset + limit + 1)[offset:]
+
+
+async def _mongo_search(family_id: PydanticObjectId, query: str, limit: int, offset: int):
+    # The text index is prefixed with family_id, so this only touches the family's entries
+    cursor = (
+        ChatMessage.get_motor_collection()
+        .find({"family_id": family_id, "$text": {"$search": query}}, {"score": {"$meta": "textScore"}})
+        .sort([("score", {"$meta": "textScore"}), ("timestamp", -1)])
+        .skip(offset)
+        .limit(limit + 1)
+    )
+    return [(doc.pop("score"), ChatMessage.model_validate(doc)) async for doc in cursor]
+
+
+# Clients (by id) found not to implement $text at all, e.g. mongomock
+_text_unsupported: Set[int] = set()
+
+
+def _client_key() -> int:
+    return id(ChatMessage.get_motor_collection().database.client)
+
+
+def search_backend() -> str:
+    if SEARCH_BACKEND == "mongo":
+        return "mongo"
+    if SEARCH_BACKEND == "memory" or get_chat_store().name != "documents" or _client_key() in _text_unsupported:
+        return "memory"
+    return "mongo"
+
+
+async def search_messages(family_id: PydanticObjectId, query: str, limit: int, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+    """One page of a family's messages matching any word of `query`, best first.
+
+    Returns (results, has_more); each result is message_payload plus its
+    score, a snippet and the snippet's highlight offsets.
+    """
+    query_terms = set(terms(query))
+    if not query_terms:
+        return [], False
+
+    backend = search_backend()
+    with span(f"search.{backend}"):
+        hits: Optional[list] = None
+        if backend == "mongo":
+            try:
+                hits = await _mongo_search(family_id, query, limit, offset)
+            except NotImplementedError:
+                if SEARCH_BACKEND == "mongo":
+                    raise
+                _text_unsupported.add(_client_key())
+                backend = "memory"
+            except OperationFailure:
+                # Most likely the text index isn't built yet (INDEX_CREATION=background)
+                if SEARCH_BACKEND == "mongo":
+                    raise
+                logger.warning("Text search failed, using the in-memory index", exc_info=True)
+                backend = "memory"
+        if hits is None:
+            hits = await _memory_search(family_id, query_terms, limit, offset)
+    searches_total.inc(backend=backend)
+
+    results = []
+    for score, message in hits[:limit]:
+        text, highlights = snippet(message.content, query_terms)
+        results.append({**message_payload(message), "score": round(score, 4), "snippet": text, "highlights": highlights})
+    return results, len(hits) > limit
+
+
+def search_stats() -> Dict[str, Any]:
+    return {"backend": SEARCH_BACKEND, "indexed_families": len(search_index_cache)}
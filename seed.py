@@ -1,17 +1,40 @@
 import asyncio
 from beanie import init_beanie
-from database import client
-from models import User, Family, College, Milestone, Tip, ChatMessage, RichMediaLink
+from pymongo import UpdateOne
+import database
+from load_catalog import to_upsert
+from models import DOCUMENT_MODELS, College, Milestone, Tip, RichMediaLink
 
-async def seed_data():
+_TAGLINES = [
+    "A close-knit community for independent thinkers.",
+    "Hands-on research with real-world impact.",
+    "Creative energy meets rigorous academics.",
+    "Big city opportunities, collaborative campus.",
+]
+
+def _synthetic_college(i: int) -> College:
+    return College(
+        name=f"Sample College {i:05d}",
+        acceptance_rate=f"{5 + i % 85}%",
+        tuition=f"${15 + i % 60},000/year",
+        emotional_tagline=_TAGLINES[i % len(_TAGLINES)],
+        default_fit_reason=_TAGLINES[(i + 1) % len(_TAGLINES)],
+        default_fit_reason_student=_TAGLINES[(i + 2) % len(_TAGLINES)],
+        rich_media_links=[RichMediaLink(type="Campus Tour", url="#")],
+    )
+
+async def seed_data(extra_colleges: int = 0):
     print("Initializing Beanie...")
-    await init_beanie(database=client.emma_advisor_db, document_models=[User, Family, College, Milestone, Tip, ChatMessage])
+    await database.connect()
+    await init_beanie(database=database.get_database(), document_models=DOCUMENT_MODELS)
+    await seed_catalog(extra_colleges)
 
-    print("Clearing existing data...")
-    await College.delete_all()
-    await Milestone.delete_all()
-    await Tip.delete_all()
+async def seed_catalog(extra_colleges: int = 0):
+    """Seed the catalog; `extra_colleges` adds synthetic colleges for load testing.
 
+    Everything is upserted (colleges by name, milestones and tips by text),
+    so seeding is repeatable and never removes existing data.
+    """
     print("Seeding Colleges...")
     colleges = [
         College(
@@ -52,7 +75,11 @@ async def seed_data():
             ]
         )
     ]
-    await College.insert_many(colleges)
+    colleges.extend(_synthetic_college(i) for i in range(extra_colleges))
+    for offset in range(0, len(colleges), 1000):
+        await College.get_motor_collection().bulk_write(
+            [to_upsert(c) for c in colleges[offset:offset + 1000]], ordered=False
+        )
 
     print("Seeding Milestones...")
     milestones = [
@@ -61,7 +88,7 @@ async def seed_data():
         Milestone(text="Brainstorm essay topics and outline first drafts.", month="Current"),
         Milestone(text="Schedule college visits or virtual tours.", month="Current"),
     ]
-    await Milestone.insert_many(milestones)
+    await _upsert_by_text(Milestone, milestones)
 
     print("Seeding Tips...")
     tips = [
@@ -70,9 +97,22 @@ async def seed_data():
         Tip(text="Insider Tip: Demonstrate interest by engaging with colleges online."),
         Tip(text="Insider Tip: Start your essays early to allow for multiple revisions."),
     ]
-    await Tip.insert_many(tips)
+    await _upsert_by_text(Tip, tips)
 
+    # Runs in its own process, so there are no server caches to clear here. A
+    # running server shows the new data once its dashboard cache expires
+    # (DASHBOARD_CACHE_TTL_SECONDS) and its match catalog next reloads
+    # (MATCH_CATALOG_REFRESH_SECONDS), or on restart.
     print("Seeding complete!")
 
+async def _upsert_by_text(model, docs):
+    await model.get_motor_collection().bulk_write(
+        [UpdateOne({"text": d.text}, {"$setOnInsert": d.model_dump(exclude={"id", "revision_id"})}, upsert=True) for d in docs],
+        ordered=False,
+    )
+
 if __name__ == "__main__":
-    asyncio.run(seed_data())
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Seed the college catalog, milestones and tips.")
+    parser.add_argument("--extra-colleges", type=int, default=0, help="synthetic colleges to add for load testing")
+    asyncio.run(seed_data(parser.parse_args().extra_colleges))
\ No newline at end of file
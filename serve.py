@@ -0,0 +1,104 @@
+"""Production server: several worker processes, each running main:app on uvicorn.
+
+    python serve.py
+
+Gunicorn manages WEB_CONCURRENCY workers (default: one per CPU this process
+may run on) and replaces any that die. The app is imported once here, before
+the workers are forked, so they start without re-importing anything and
+share those pages copy-on-write. Each worker then runs the app's lifespan:
+  - index setup runs in one worker while the others wait (migrate.py)
+  - cache invalidations and chat pub/sub messages are passed to the sibling
+    workers (cachebus.py), so a /ws/chat client sees replies any worker posts
+  - password hashing gets CPUs / workers threads per worker, not one per CPU
+  - rate limits are split across the workers, each enforcing 1/workers of
+    every configured budget (ratelimit.py)
+Other in-process state stays per worker, e.g. /metrics counters.
+
+`uvicorn main:app` still works for a single process (development).
+"""
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+# Load .env from the same directory as this file
+env_path = Path(__file__).parent / ".env"
+load_dotenv(dotenv_path=env_path)
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+PORT = int(os.getenv("PORT", 8000))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or available_cpus())
+# Seconds a worker may go without checking in before it is restarted, and
+# that workers get to finish in-flight requests on shutdown
+SERVE_TIMEOUT_SECONDS = int(os.getenv("SERVE_TIMEOUT_SECONDS", 120))
+SERVE_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("SERVE_GRACEFUL_TIMEOUT_SECONDS", 30))
+SERVE_KEEPALIVE_SECONDS = int(os.getenv("SERVE_KEEPALIVE_SECONDS", 5))
+# Restart a worker after this many requests (0 = never), give or take the jitter
+SERVE_MAX_REQUESTS = int(os.getenv("SERVE_MAX_REQUESTS", 0))
+SERVE_MAX_REQUESTS_JITTER = int(os.getenv("SERVE_MAX_REQUESTS_JITTER", 0))
+
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # With preload_app this runs once, in the master, before forking
+        from main import app
+        return app
+
+
+def prepare_environment(workers: int) -> Optional[str]:
+    """Settings every worker must share, set before the app is imported.
+
+    Returns the cache bus directory if this call created it.
+    """
+    os.environ.setdefault("SERVE_STARTED_AT", str(time.time()))
+    os.environ["SERVE_WORKERS"] = str(workers)
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, available_cpus() // workers)))
+    if workers > 1 and not os.getenv("CACHE_BUS_DIR"):
+        os.environ["CACHE_BUS_DIR"] = tempfile.mkdtemp(prefix="emma-cache-bus-")
+        return os.environ["CACHE_BUS_DIR"]
+    return None
+
+
+def main(workers: int = WEB_CONCURRENCY, port: int = PORT):
+    bus_dir = prepare_environment(workers)
+
+    def on_exit(server):
+        if bus_dir:
+            shutil.rmtree(bus_dir, ignore_errors=True)
+
+    Server({
+        "bind": f"0.0.0.0:{port}",
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": SERVE_TIMEOUT_SECONDS,
+        "graceful_timeout": SERVE_GRACEFUL_TIMEOUT_SECONDS,
+        "keepalive": SERVE_KEEPALIVE_SECONDS,
+        "max_requests": SERVE_MAX_REQUESTS,
+        "max_requests_jitter": SERVE_MAX_REQUESTS_JITTER,
+        "on_exit": on_exit,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()